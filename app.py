@@ -0,0 +1,22 @@
+######################################################
+#                     ML App
+######################################################
+# Entry point of the multi-page app: streamlit run app.py
+# Pages in the pages/ folder run in the same process, so the model/data caches
+# of functions.py are shared between them. Each page imports only what it uses.
+
+# Web rendering API
+import streamlit as st
+
+st.set_page_config(page_title='ML App', page_icon='📈', layout='wide')
+
+st.title('> Machine Learning App')
+st.caption('Modeling examples with [`Scikit-Learn`](https://scikit-learn.org/stable/) library')
+st.markdown('''
+Choose a page in the sidebar:
+- **Model Test**: try classifiers on sample or uploaded data, with metrics, cross-validation and hyperparameter search
+- **Create Model**: build a preprocessing + estimator pipeline and download the fitted model
+- **Deploy Model**: interpret XGBoost, LightGBM and random forest classifiers with SHAP, ELI5 and partial dependence
+- **Batch Predict**: score a large CSV/Parquet file with a downloaded model, in chunks
+- **Out-of-core Training**: train incremental estimators (SGD, naive Bayes) on files that don't fit in memory
+''')
@@ -0,0 +1,223 @@
+######################################################
+#                 Batch Prediction
+######################################################
+# Score a large CSV/Parquet file with a saved (pickled) pipeline, in fixed-size chunks
+# Chunks are predicted in parallel by worker processes, each one loading the model once,
+# and predictions are written to disk as soon as they are ready, in input order
+#
+# Usage: python batch_predict.py model.pkl input.csv predictions.csv [--chunksize N] [--workers N]
+# Only load pickled models from trusted sources
+
+import os
+import sys
+import time
+import pickle
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+
+# Peak memory is only reported where the resource module exists (Unix)
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Rows predicted per chunk
+BATCH_CHUNK_SIZE = 50_000
+# Chunks submitted to the workers ahead of the writer, per worker (bounds memory usage)
+BATCH_PREFETCH = 2
+# Folder the web pages read input files from and write predictions to (DATA_DIR environment variable)
+DATA_DIR = os.environ.get('DATA_DIR', 'data')
+
+# Model loaded in each worker process
+_worker_model = None
+
+# Load the model once per worker process
+def init_worker(model_path):
+    global _worker_model
+    _worker_model = load_model(model_path)
+
+# Load a pickled model
+def load_model(model_path):
+    with open(model_path, 'rb') as file:
+        return pickle.load(file)
+
+# File format from the file extension
+def get_file_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.parquet', '.pq'):
+        return 'parquet'
+    if extension in ('.csv', '.txt', '.gz'):
+        return 'csv'
+    raise ValueError(f'Unsupported file format: {path}')
+
+# Resolve a path typed in the web pages inside data_dir, symbolic links and '..' included
+# Raises ValueError for paths outside data_dir, the server's other files can't be read or overwritten
+def resolve_data_path(path, data_dir=DATA_DIR):
+    data_dir = os.path.realpath(data_dir)
+    resolved = os.path.realpath(os.path.join(data_dir, path))
+    if os.path.commonpath([data_dir, resolved]) != data_dir or resolved == data_dir:
+        raise ValueError(f'Path outside the data folder ({data_dir}): {path}')
+    return resolved
+
+# Read a CSV/Parquet file in chunks of chunksize rows
+def iter_chunks(path, chunksize=BATCH_CHUNK_SIZE, columns=None):
+    if get_file_format(path) == 'parquet':
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize, usecols=columns)
+
+# Predictions of one chunk: prediction column, and one probability column per class if available
+# Only the columns the model was fitted on are passed to it, other columns (e.g. an id) can be kept
+def predict_chunk(model, chunk, proba=True, keep_columns=()):
+    predictions = pd.DataFrame(index=chunk.index)
+    for column in keep_columns:
+        predictions[column] = chunk[column]
+    if hasattr(model, 'feature_names_in_'):
+        chunk = chunk[model.feature_names_in_]
+    if proba and hasattr(model, 'predict_proba'):
+        y_proba = model.predict_proba(chunk)
+        predictions['prediction'] = model.classes_[np.argmax(y_proba, axis=1)]
+        for i, label in enumerate(model.classes_):
+            predictions[f'proba_{label}'] = y_proba[:, i]
+    else:
+        predictions['prediction'] = model.predict(chunk)
+    return predictions
+
+# predict_chunk with the model of the worker process
+def predict_worker_chunk(chunk, proba=True, keep_columns=()):
+    return predict_chunk(_worker_model, chunk, proba, keep_columns)
+
+# Append predictions to a CSV/Parquet file, the writer is created with the first chunk
+class PredictionWriter:
+
+    def __init__(self, path):
+
+        self.path = path
+        self.file_format = get_file_format(path)
+        self.writer = None
+
+    def write(self, predictions):
+
+        if self.file_format == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(predictions, preserve_index=False)
+            if self.writer is None:
+                self.writer = pq.ParquetWriter(self.path, table.schema)
+            self.writer.write_table(table.cast(self.writer.schema))
+        else:
+            predictions.to_csv(self.path, mode='w' if self.writer is None else 'a',
+                            header=self.writer is None, index=False)
+            self.writer = True
+
+    def close(self):
+
+        if self.file_format == 'parquet' and self.writer is not None:
+            self.writer.close()
+
+# Peak resident memory of this process and of its finished children, in bytes
+def get_peak_memory():
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    unit = 1 if sys.platform == 'darwin' else 1024
+    return {
+        'main' : resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit,
+        'workers' : resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit,
+    }
+
+# Score input_path with the model saved at model_path and write predictions to output_path
+# - workers: number of worker processes, 0 predicts in this process
+#   (default: one per core, minus the core reading and writing chunks)
+# - start_method: multiprocessing start method of the workers ('spawn' from threaded programs like Streamlit)
+# - progress: optional callback called with the number of rows written so far
+# Returns rows, seconds, rows_per_second and peak_memory
+def batch_predict(model_path, input_path, output_path, chunksize=BATCH_CHUNK_SIZE, workers=None,
+                proba=True, keep_columns=(), start_method=None, progress=None):
+    workers = (os.cpu_count() or 1) - 1 if workers is None else workers
+    keep_columns = list(keep_columns)
+    writer = PredictionWriter(output_path)
+    n_rows = 0
+    start_time = time.perf_counter()
+
+    try:
+        if workers == 0:
+            model = load_model(model_path)
+            for chunk in iter_chunks(input_path, chunksize):
+                writer.write(predict_chunk(model, chunk, proba, keep_columns))
+                n_rows += len(chunk)
+                if progress:
+                    progress(n_rows)
+        else:
+            context = multiprocessing.get_context(start_method)
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                    initializer=init_worker, initargs=(model_path,)) as executor:
+                # Chunks in flight, written in input order
+                pending = deque()
+                for chunk in iter_chunks(input_path, chunksize):
+                    pending.append(executor.submit(predict_worker_chunk, chunk, proba, keep_columns))
+                    while len(pending) >= workers * BATCH_PREFETCH:
+                        predictions = pending.popleft().result()
+                        writer.write(predictions)
+                        n_rows += len(predictions)
+                        if progress:
+                            progress(n_rows)
+                while pending:
+                    predictions = pending.popleft().result()
+                    writer.write(predictions)
+                    n_rows += len(predictions)
+                    if progress:
+                        progress(n_rows)
+    finally:
+        writer.close()
+
+    seconds = time.perf_counter() - start_time
+    return {
+        'rows' : n_rows,
+        'seconds' : seconds,
+        'rows_per_second' : n_rows / seconds if seconds else float('nan'),
+        'peak_memory' : get_peak_memory(),
+    }
+
+# Format a number of bytes to a readable string (like functions.format_bytes, without importing streamlit)
+def format_bytes(n_bytes):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if n_bytes < 1024:
+            return f'{n_bytes:.1f}{unit}'
+        n_bytes /= 1024
+    return f'{n_bytes:.1f}TB'
+
+# Summary of batch_predict results
+# Peak memory is the process lifetime peak, only meaningful when batch_predict is the whole process (CLI)
+def format_stats(stats, peak_memory=True):
+    summary = f'{stats["rows"]:,} rows in {stats["seconds"]:.2f}s ({stats["rows_per_second"]:,.0f} rows/s)'
+    if peak_memory and stats['peak_memory']:
+        summary += (f', peak memory {format_bytes(stats["peak_memory"]["main"])} (main)'
+                    f' / {format_bytes(stats["peak_memory"]["workers"])} (largest worker)')
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description='Score a CSV/Parquet file with a saved pipeline, in chunks')
+    parser.add_argument('model', help='pickled fitted model/pipeline (Create Model > Download model)')
+    parser.add_argument('input', help='CSV or Parquet file to score')
+    parser.add_argument('output', help='CSV or Parquet file with the predictions')
+    parser.add_argument('--chunksize', type=int, default=BATCH_CHUNK_SIZE, help='rows predicted per chunk')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: cores - 1, 0: no workers)')
+    parser.add_argument('--no-proba', action='store_true', help='only write predicted labels/values')
+    parser.add_argument('--keep', nargs='*', default=(), help='input columns copied to the output (e.g. an id)')
+    args = parser.parse_args()
+
+    stats = batch_predict(args.model, args.input, args.output, chunksize=args.chunksize, workers=args.workers,
+                        proba=not args.no_proba, keep_columns=args.keep)
+    print(format_stats(stats))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+######################################################
+#   Benchmark: compiled model vs pickled pipeline
+######################################################
+# Usage: python benchmarks/bench_compiled_model.py [n_rows]
+# For several pipelines like the ones built by the app (imputers, scalers, encoders + estimator):
+# parity of predict/predict_proba on held out rows (exit status 1 if it fails), load time and scoring latency (1 row, batch)
+
+import io
+import os
+import sys
+import time
+import pickle
+import subprocess
+
+import numpy as np
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.pipeline import Pipeline
+from sklearn.impute import SimpleImputer
+from sklearn.preprocessing import StandardScaler, MinMaxScaler, OneHotEncoder, OrdinalEncoder
+from sklearn.linear_model import LogisticRegression, LinearRegression
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor, GradientBoostingClassifier, \
+                            GradientBoostingRegressor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from compiled_model import compile_model, load_compiled_model
+
+# Mixed numeric/categorical data with missing values, binary/multiclass/regression targets
+def make_data(n_rows, random_state=0):
+    rng = np.random.default_rng(random_state)
+    X = pd.DataFrame({f'num{i}' : rng.normal(size=n_rows) * (i + 1) for i in range(8)})
+    X['color'] = rng.choice(['red', 'green', 'blue', 'black'], n_rows)
+    X['size'] = rng.choice(['S', 'M', 'L'], n_rows)
+    score = X['num0'] + X['num1'] / 2 + (X['color'] == 'red') - (X['size'] == 'S')
+    X = X.mask(rng.random(X.shape) < 0.05)
+    targets = {
+        'binary' : np.where(score > 0, 'yes', 'no'),
+        'multiclass' : pd.cut(score, [-np.inf, -1, 1, np.inf], labels=['low', 'mid', 'high']).astype(str).to_numpy(),
+        'regression' : score.to_numpy() + rng.normal(size=n_rows) / 10,
+    }
+    return X, targets
+
+# Preprocessing like create_preprocess_pipeline
+def make_preprocessing(scaler, encoder):
+    return ColumnTransformer([
+        ('numeric_transformer', Pipeline([('impute_num', SimpleImputer(strategy='median')), ('scaler', scaler)]),
+        [f'num{i}' for i in range(8)]),
+        ('categorical_transformer', Pipeline([('impute_cat', SimpleImputer(strategy='constant', fill_value='unknow')),
+                                            ('encoder', encoder)]), ['color', 'size']),
+    ])
+
+PIPELINES = {
+    'logistic (binary)' : ('binary', StandardScaler(), OneHotEncoder(handle_unknown='ignore'), LogisticRegression(max_iter=1000)),
+    'logistic (multiclass)' : ('multiclass', MinMaxScaler(), OneHotEncoder(handle_unknown='ignore'), LogisticRegression(max_iter=1000)),
+    'random forest (multiclass)' : ('multiclass', StandardScaler(), OrdinalEncoder(), RandomForestClassifier(100, random_state=0)),
+    'gradient boosting (binary)' : ('binary', StandardScaler(), OneHotEncoder(handle_unknown='ignore'), GradientBoostingClassifier(random_state=0)),
+    'gradient boosting (multiclass)' : ('multiclass', MinMaxScaler(), OrdinalEncoder(), GradientBoostingClassifier(random_state=0)),
+    'linear regression' : ('regression', StandardScaler(), OneHotEncoder(handle_unknown='ignore'), LinearRegression()),
+    'random forest regression' : ('regression', MinMaxScaler(), OrdinalEncoder(), RandomForestRegressor(50, random_state=0)),
+    'gradient boosting regression' : ('regression', StandardScaler(), OneHotEncoder(handle_unknown='ignore'), GradientBoostingRegressor(random_state=0)),
+}
+
+# Best time of a few runs, in milliseconds
+def best_time(function, *args, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - start_time)
+    return min(times) * 1000
+
+# Time to load an artifact in a fresh interpreter, including imports, in milliseconds
+def cold_load_time(code):
+    output = subprocess.run([sys.executable, '-c', f'import time; start_time = time.perf_counter(); {code}; '
+                            'print((time.perf_counter() - start_time) * 1000)'],
+                            cwd=ROOT, capture_output=True, text=True, env={**os.environ, 'PYTHONPATH' : ROOT})
+    return float(output.stdout.strip().splitlines()[-1])
+
+def main(n_rows=20_000):
+    X, targets = make_data(n_rows + 10_000)
+    X_train, X_test = X.iloc[:n_rows], X.iloc[n_rows:]
+    all_passed = True
+
+    for name, (target, scaler, encoder, estimator) in PIPELINES.items():
+        y_train = targets[target][:n_rows]
+        pipeline = Pipeline([('pre_processing', make_preprocessing(scaler, encoder)), ('estimator', estimator)])
+        pipeline.fit(X_train, y_train)
+        compiled = load_compiled_model(io.BytesIO(compile_model(pipeline).to_bytes()))
+
+        # Parity
+        if target == 'regression':
+            difference = np.abs(pipeline.predict(X_test) - compiled.predict(X_test)).max()
+            agreement = 1.0
+        else:
+            difference = np.abs(pipeline.predict_proba(X_test) - compiled.predict_proba(X_test)).max()
+            agreement = (pipeline.predict(X_test) == compiled.predict(X_test)).mean()
+        passed = difference < 1e-9 and agreement == 1
+        all_passed &= passed
+
+        # Latency
+        predict = 'predict' if target == 'regression' else 'predict_proba'
+        row = X_test.iloc[:1]
+        pipeline_row = best_time(getattr(pipeline, predict), row)
+        compiled_row = best_time(getattr(compiled, predict), row)
+        pipeline_batch = best_time(getattr(pipeline, predict), X_test, repeat=3)
+        compiled_batch = best_time(getattr(compiled, predict), X_test, repeat=3)
+
+        print(f'{name}: {"OK" if passed else "FAILED"} (max difference {difference:.1e}, same predictions {agreement:.2%})')
+        print(f'    1 row: pipeline {pipeline_row:.2f}ms, compiled {compiled_row:.2f}ms ({pipeline_row / compiled_row:.1f}x)')
+        print(f'    {len(X_test):,} rows: pipeline {pipeline_batch:.1f}ms, compiled {compiled_batch:.1f}ms '
+            f'({pipeline_batch / compiled_batch:.1f}x)')
+
+    # Cold load of the last pipeline: unpickling imports sklearn, the artifact only needs numpy/pandas
+    pickle_path, compiled_path = os.path.join(ROOT, '.bench_model.pkl'), os.path.join(ROOT, '.bench_model.npz')
+    with open(pickle_path, 'wb') as file:
+        pickle.dump(pipeline, file)
+    compile_model(pipeline).save(compiled_path)
+    try:
+        pickle_load = cold_load_time(f'import pickle; pickle.load(open({pickle_path!r}, "rb"))')
+        compiled_load = cold_load_time(f'from compiled_model import load_compiled_model; load_compiled_model({compiled_path!r})')
+    finally:
+        os.remove(pickle_path)
+        os.remove(compiled_path)
+    print(f'cold load (fresh interpreter, with imports): pickle {pickle_load:.0f}ms, compiled {compiled_load:.0f}ms')
+    print('parity: all OK' if all_passed else 'parity: FAILED')
+    return all_passed
+
+
+if __name__ == '__main__':
+    # Non-zero exit status if predict/predict_proba differ
+    sys.exit(0 if main(*[int(arg) for arg in sys.argv[1:2]]) else 1)
@@ -0,0 +1,87 @@
+######################################################
+#   Benchmark: fused preprocessing vs ColumnTransformer
+######################################################
+# Usage: python benchmarks/bench_fused_preprocessing.py [n_rows]
+# Preprocessing built like create_preprocess_pipeline (imputer + scaler, imputer + encoder):
+# parity of FusedPreprocessor (dense and CSR output) with the ColumnTransformer, transform time
+# and peak memory allocated during transform (exit status 1 if parity fails)
+
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+from scipy import sparse
+from sklearn.impute import SimpleImputer
+from sklearn.preprocessing import StandardScaler, MinMaxScaler, OneHotEncoder, OrdinalEncoder
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from functions import create_preprocess_pipeline
+from bench_compiled_model import make_data
+
+SETTINGS = {
+    'median + standard, constant + one-hot' : (
+        [('impute_num', SimpleImputer(strategy='median')), ('std', StandardScaler())],
+        [('impute_cat', SimpleImputer(strategy='constant', fill_value='unknow')), ('onehot', OneHotEncoder(handle_unknown='ignore'))]),
+    'mean + min-max, constant + ordinal' : (
+        [('impute_num', SimpleImputer(strategy='mean')), ('mms', MinMaxScaler())],
+        [('impute_cat', SimpleImputer(strategy='constant', fill_value='unknow')), ('ordinal', OrdinalEncoder(handle_unknown='use_encoded_value', unknown_value=-1))]),
+    # NaN is a category of the encoder (OrdinalEncoder outputs encoded_missing_value for it)
+    'median + standard, ordinal without imputer' : (
+        [('impute_num', SimpleImputer(strategy='median')), ('std', StandardScaler())],
+        [('ordinal', OrdinalEncoder(handle_unknown='use_encoded_value', unknown_value=-1))]),
+    'median + standard, one-hot without imputer' : (
+        [('impute_num', SimpleImputer(strategy='median')), ('std', StandardScaler())],
+        [('onehot', OneHotEncoder(handle_unknown='ignore'))]),
+}
+
+# Best time of a few runs (ms) and peak memory allocated by one run (MB)
+def measure(function, X, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        function(X)
+        times.append(time.perf_counter() - start_time)
+    tracemalloc.start()
+    output = function(X)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return output, min(times) * 1000, peak / 2 ** 20
+
+def to_dense(features):
+    return features.toarray() if sparse.issparse(features) else features
+
+def main(n_rows=200_000):
+    X, _ = make_data(n_rows + 1000)
+    # Missing values in every column, categories unseen in training
+    X_train, X_test = X.iloc[:1000], X.iloc[1000:].copy()
+    X_test.loc[X_test.index[::97], 'color'] = 'purple'
+    all_passed = True
+
+    for name, (numeric_params, categorical_params) in SETTINGS.items():
+        print(f'{name} ({n_rows:,} rows):')
+        reference = None
+        for mode, fused, sparse_output in (('ColumnTransformer', False, False), ('fused dense', True, False),
+                                        ('fused CSR', True, True)):
+            preprocessor = create_preprocess_pipeline(X_train, numeric_params, categorical_params,
+                                                    fused=fused, sparse_output=sparse_output).fit(X_train)
+            features, milliseconds, peak = measure(preprocessor.transform, X_test)
+            if reference is None:
+                reference = to_dense(features)
+                parity = ''
+            else:
+                # NaN outputs (missing categories) must match too
+                passed = np.array_equal(to_dense(features), reference, equal_nan=True) \
+                        and sparse.issparse(features) == sparse_output
+                difference = np.nanmax(np.abs(to_dense(features) - reference))
+                all_passed &= passed
+                parity = f', {"OK" if passed else "FAILED"} (max difference {difference:.1e})'
+            print(f'    {mode}: {milliseconds:.1f}ms, peak {peak:.1f}MB, '
+                f'{"CSR" if sparse.issparse(features) else "dense"} {features.shape}{parity}')
+    print('parity: all OK' if all_passed else 'parity: FAILED')
+    return all_passed
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main(*[int(arg) for arg in sys.argv[1:2]]) else 1)
@@ -0,0 +1,114 @@
+######################################################
+#   Benchmark: prediction server, with/without batching
+######################################################
+# Usage: python benchmarks/bench_predict_server.py [clients] [requests_per_client]
+# Concurrent clients send single-row requests to a local server: without batching (one predict call
+# per request), then for several max-latency windows (0 only batches requests that are already waiting)
+# First checks that a request missing a feature is rejected, alone or batched with a valid request
+# (exit status 1 if it isn't)
+
+import os
+import sys
+import json
+import time
+import threading
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.datasets import make_classification
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.impute import SimpleImputer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from predict_server import create_server
+
+# Pipeline and rows to score
+def make_model(n_features=20, random_state=0):
+    X, y = make_classification(5000, n_features, random_state=random_state)
+    X = pd.DataFrame(X, columns=[f'x{i}' for i in range(n_features)])
+    model = make_pipeline(StandardScaler(), RandomForestClassifier(100, random_state=random_state))
+    return model.fit(X, y), X, y
+
+# One client: requests over a keep-alive connection, returns latencies in ms
+def run_client(port, rows):
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    latencies = []
+    for row in rows:
+        body = json.dumps([row])
+        start_time = time.perf_counter()
+        connection.request('POST', '/predict', body, {'Content-Type' : 'application/json'})
+        response = connection.getresponse()
+        response.read()
+        latencies.append((time.perf_counter() - start_time) * 1000)
+        assert response.status == 200
+    connection.close()
+    return latencies
+
+# Status of one request with a JSON body
+def post_rows(port, rows):
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    connection.request('POST', '/predict', json.dumps(rows), {'Content-Type' : 'application/json'})
+    response = connection.getresponse()
+    response.read()
+    connection.close()
+    return response.status
+
+# A row missing a feature gets 400 whether it is sent alone or batched with a valid row
+# (the window is long enough for both requests to be batched together), the imputer of the
+# model would otherwise fill the missing feature of the batched row
+def check_missing_columns(X, y):
+    model = make_pipeline(SimpleImputer(), LogisticRegression()).fit(X, y)
+    record = X.iloc[0].to_dict()
+    server = create_server(model, port=0, max_latency=0.2)
+    port = server.server_address[1]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    invalid = {column : value for column, value in record.items() if column != 'x0'}
+    alone = post_rows(port, [invalid])
+    with ThreadPoolExecutor(2) as executor:
+        batched = list(executor.map(lambda rows: post_rows(port, rows), ([record], [invalid])))
+    server.shutdown()
+    server.server_close()
+    passed = alone == 400 and batched == [200, 400]
+    print(f'missing columns: {"OK" if passed else "FAILED"} (alone {alone}, batched with a valid row {batched[1]})')
+    return passed
+
+def get_metrics(port):
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    connection.request('GET', '/metrics')
+    return json.loads(connection.getresponse().read())
+
+def main(n_clients=32, n_requests=50):
+    model, X, y = make_model()
+    records = X.to_dict(orient='records')
+    passed = check_missing_columns(X, y)
+
+    for max_latency, max_batch_size in ((0, 1), (0, 512), (0.002, 512), (0.005, 512)):
+        server = create_server(model, port=0, max_latency=max_latency, max_batch_size=max_batch_size)
+        port = server.server_address[1]
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(n_clients) as executor:
+            latencies = np.concatenate(list(executor.map(
+                lambda client: run_client(port, records[client * n_requests:(client + 1) * n_requests]),
+                range(n_clients))))
+        seconds = time.perf_counter() - start_time
+        metrics = get_metrics(port)
+        server.shutdown()
+        server.server_close()
+
+        setting = 'no batching' if max_batch_size == 1 else f'max latency {max_latency * 1000:.0f}ms'
+        print(f'{setting}: {len(latencies) / seconds:,.0f} requests/s, '
+            f'client p50 {np.percentile(latencies, 50):.1f}ms p99 {np.percentile(latencies, 99):.1f}ms, '
+            f'server p50 {metrics["latency_p50_ms"]:.1f}ms p99 {metrics["latency_p99_ms"]:.1f}ms, '
+            f'{metrics["batches"]} batches ({metrics["mean_batch_rows"]:.1f} rows)')
+    return passed
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main(*[int(arg) for arg in sys.argv[1:3]]) else 1)
@@ -0,0 +1,76 @@
+######################################################
+#   Benchmark: multiclass ROC AUC, loop vs batched
+######################################################
+# Usage: python benchmarks/bench_roc_auc_multiclass.py [n_samples] [n_classes]
+
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from sklearn.metrics import roc_curve, roc_auc_score, auc
+from sklearn.preprocessing import label_binarize
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from functions import calculate_roc_auc_multiclass
+
+
+# Previous implementation: one roc_curve/roc_auc_score call and one np.interp per class
+def calculate_roc_auc_multiclass_loop(y_true, y_scores, model):
+    y_onehot = label_binarize(y_true, classes=model.classes_)
+    n_classes = len(model.classes_)
+    fpr = dict(); tpr = dict(); roc_auc = dict();
+    for i in range(y_scores.shape[1]):
+        fpr[i], tpr[i], _ = roc_curve(y_onehot[:, i], y_scores[:, i])
+        roc_auc[i] = roc_auc_score(y_onehot[:, i], y_scores[:, i])
+    fpr['micro'], tpr['micro'], _ = roc_curve(y_onehot.ravel(), y_scores.ravel())
+    roc_auc['micro'] = auc(fpr['micro'], tpr['micro'])
+    all_fpr = np.unique(np.concatenate([fpr[i] for i in range(n_classes)]))
+    mean_tpr = np.zeros_like(all_fpr)
+    for i in range(n_classes):
+        mean_tpr += np.interp(all_fpr, fpr[i], tpr[i])
+    mean_tpr /= n_classes
+    fpr['macro'] = all_fpr
+    tpr['macro'] = mean_tpr
+    roc_auc['macro'] = auc(fpr['macro'], tpr['macro'])
+    return fpr, tpr, roc_auc
+
+# Random scores, slightly shifted towards the true class
+def make_scores(n_samples, n_classes, random_state=0):
+    rng = np.random.default_rng(random_state)
+    y_true = rng.integers(0, n_classes, n_samples)
+    y_scores = rng.random((n_samples, n_classes))
+    y_scores[np.arange(n_samples), y_true] += 0.5
+    return y_true, y_scores / y_scores.sum(axis=1, keepdims=True)
+
+# Best time of a few runs
+def best_time(function, *args, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - start_time)
+    return min(times)
+
+def main(n_samples=20_000, n_classes=100):
+    y_true, y_scores = make_scores(n_samples, n_classes)
+    model = SimpleNamespace(classes_=np.arange(n_classes))
+
+    _, _, roc_auc_loop = calculate_roc_auc_multiclass_loop(y_true, y_scores, model)
+    _, _, roc_auc_batch = calculate_roc_auc_multiclass(y_true, y_scores, model)
+    class_diff = max(abs(roc_auc_loop[i] - roc_auc_batch[i]) for i in range(n_classes))
+
+    loop_time = best_time(calculate_roc_auc_multiclass_loop, y_true, y_scores, model)
+    batch_time = best_time(calculate_roc_auc_multiclass, y_true, y_scores, model)
+
+    print(f'samples={n_samples} classes={n_classes}')
+    print(f'max per-class AUC difference: {class_diff:.2e}')
+    print(f'micro AUC difference: {abs(roc_auc_loop["micro"] - roc_auc_batch["micro"]):.2e}')
+    print(f'macro AUC difference: {abs(roc_auc_loop["macro"] - roc_auc_batch["macro"]):.2e}')
+    print(f'loop:    {loop_time:.3f}s')
+    print(f'batched: {batch_time:.3f}s ({loop_time / batch_time:.1f}x)')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
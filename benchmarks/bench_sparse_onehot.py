@@ -0,0 +1,57 @@
+######################################################
+#   Benchmark: dense vs sparse one-hot encoding
+######################################################
+# Usage: python benchmarks/bench_sparse_onehot.py [n_rows] [n_levels]
+# Data with an ID-like categorical column (n_levels levels), encoded like prepare_sample_data:
+# memory before/after encoding, encoding time and LogisticRegression fit time (skipped for the
+# uncapped dense frame, scikit-learn would convert it to a float64 matrix of n_rows x n_levels)
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LogisticRegression
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from functions import encode_onehot, get_memory_usage, format_bytes
+
+SETTINGS = {
+    'dense' : {'sparse' : False, 'max_categories' : None},
+    'dense, 50 categories' : {'sparse' : False, 'max_categories' : 50},
+    'sparse' : {'sparse' : True, 'max_categories' : None},
+    'sparse, 50 categories' : {'sparse' : True, 'max_categories' : 50},
+}
+
+# Numeric columns with missing values, a low and a high cardinality categorical column
+def make_data(n_rows, n_levels, random_state=0):
+    rng = np.random.default_rng(random_state)
+    X = pd.DataFrame({f'num{i}' : rng.normal(size=n_rows) for i in range(4)})
+    X['color'] = rng.choice(['red', 'green', 'blue'], n_rows)
+    # Zipf-like frequencies, a few frequent levels and a long tail
+    X['id'] = 'id' + pd.Series(rng.zipf(1.3, n_rows) % n_levels).astype(str)
+    X = X.mask(rng.random(X.shape) < 0.02)
+    y = (X['num0'].fillna(0) + (X['color'] == 'red') > 0.5).astype(int)
+    return X, y
+
+def main(n_rows=50_000, n_levels=10_000):
+    X, y = make_data(n_rows, n_levels)
+    print(f'{n_rows:,} rows, {X["id"].nunique():,} id levels, before encoding {format_bytes(get_memory_usage(X))}')
+
+    for name, params in SETTINGS.items():
+        start_time = time.perf_counter()
+        X_encoded = encode_onehot(X, **params)
+        encode_time = time.perf_counter() - start_time
+        line = (f'    {name}: {X_encoded.shape[1]:,} columns, after encoding {format_bytes(get_memory_usage(X_encoded))}, '
+                f'encoded in {encode_time * 1000:.0f}ms')
+        if params['sparse'] or params['max_categories']:
+            start_time = time.perf_counter()
+            LogisticRegression(max_iter=200).fit(X_encoded, y)
+            line += f', fit {(time.perf_counter() - start_time) * 1000:.0f}ms'
+        print(line)
+        del X_encoded
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,57 @@
+######################################################
+#        Benchmark: cold start of each app page
+######################################################
+# Usage: python benchmarks/bench_startup.py [repeat]
+# Each page runs once in a fresh interpreter (streamlit.testing AppTest):
+# time to import streamlit, time of the first script run, and heavy libraries loaded by the page
+
+import os
+import sys
+import json
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES = ['app.py', 'pages/1_Model_Test.py', 'pages/2_Create_Model.py', 'pages/3_Deploy_Model.py']
+# Libraries that should only be loaded by the pages that use them
+HEAVY_MODULES = ['sklearn', 'matplotlib', 'seaborn', 'altair', 'plotly', 'xgboost', 'lightgbm', 'shap', 'eli5',
+                'pdpbox', 'tkinter', 'isort', 'requests_cache']
+
+# Run in the child interpreter, prints one json line
+CHILD_SCRIPT = '''
+import sys, time, json
+start_time = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+import_time = time.perf_counter() - start_time
+app = AppTest.from_file(sys.argv[1], default_timeout=600)
+start_time = time.perf_counter()
+app.run()
+run_time = time.perf_counter() - start_time
+print(json.dumps({
+    'import_time' : import_time,
+    'run_time' : run_time,
+    'exceptions' : [exception.message for exception in app.exception],
+    'modules' : [name for name in sys.argv[2:] if name in sys.modules],
+}))
+'''
+
+# Cold start of one page, in a new interpreter
+def measure_page(page):
+    output = subprocess.run([sys.executable, '-c', CHILD_SCRIPT, os.path.join(ROOT, page), *HEAVY_MODULES],
+                            cwd=ROOT, capture_output=True, text=True, env={**os.environ, 'PYTHONPATH' : ROOT})
+    if output.returncode != 0:
+        raise RuntimeError(output.stderr)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+def main(repeat=3):
+    for page in PAGES:
+        results = [measure_page(page) for _ in range(repeat)]
+        run_time = min(result['run_time'] for result in results)
+        import_time = min(result['import_time'] for result in results)
+        print(f'{page}: first run {run_time:.2f}s (+ {import_time:.2f}s streamlit import)')
+        print(f'    loaded: {", ".join(results[0]["modules"]) or "-"}')
+        if results[0]['exceptions']:
+            print(f'    exception: {results[0]["exceptions"][0][:120]}')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
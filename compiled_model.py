@@ -0,0 +1,656 @@
+######################################################
+#                  Compiled Model
+######################################################
+# Export a fitted sklearn pipeline to a compact NumPy-only artifact, and score it without sklearn
+#
+# The artifact is a .npz file: numeric parameters (scaler params, fill values, coefficients,
+# packed tree nodes) as arrays, and a small JSON spec (columns, categories, steps, classes).
+# It is loaded with allow_pickle=False, so loading it can't run code, unlike pickle.
+#
+# Supported steps:
+# - ColumnTransformer (blocks of columns, remainder 'drop' or 'passthrough')
+# - SimpleImputer, StandardScaler, MinMaxScaler, OneHotEncoder, OrdinalEncoder
+# - LogisticRegression and linear regressors (coef_/intercept_)
+# - DecisionTree, RandomForest, ExtraTrees (classifiers and regressors)
+# - GradientBoostingClassifier/Regressor with the default (constant) init
+# Other estimators raise a ValueError when exported.
+#
+# Export works on the fitted objects (duck typing), sklearn is never imported by this module.
+#
+# The preprocessing kernels (FusedTransform) are also used on their own by FusedPreprocessor
+# (functions.py), a fitted ColumnTransformer transformed in one fused pass.
+
+import io
+import json
+
+import numpy as np
+import pandas as pd
+
+# Version of the artifact layout
+COMPILED_FORMAT_VERSION = 1
+# Maximum number of leaf values (rows x trees x values) gathered at once when scoring tree ensembles
+TREE_BLOCK_SIZE = 2 ** 22
+
+######################################################
+#                      Export
+######################################################
+
+# Convert numpy scalars of an array/list to plain Python values for JSON
+def to_json_list(values):
+    return [value.item() if isinstance(value, np.generic) else value for value in values]
+
+# Check if missing values are NaN (the only missing marker supported)
+def is_nan_marker(value):
+    return value is None or (isinstance(value, float) and np.isnan(value))
+
+# Store an array and return its name in the artifact
+def add_array(arrays, name, value):
+    arrays[name] = np.asarray(value)
+    return name
+
+# Spec of one fitted preprocessing step, numeric arrays are stored in arrays with the prefix
+def compile_step(step, arrays, prefix):
+    name = type(step).__name__
+    if step in ('passthrough', None):
+        return None
+    if name == 'SimpleImputer':
+        if not is_nan_marker(step.missing_values) or step.add_indicator:
+            raise ValueError('SimpleImputer: only missing_values=np.nan without indicator can be compiled')
+        statistics = step.statistics_
+        if statistics.dtype == object:
+            return {'op' : 'impute', 'values' : to_json_list(statistics)}
+        # mean/median/most_frequent drop columns without any value in training
+        keep = ~np.isnan(statistics) if step.strategy != 'constant' else np.ones(len(statistics), bool)
+        return {
+            'op' : 'impute',
+            'fill' : add_array(arrays, f'{prefix}fill', statistics),
+            'keep' : add_array(arrays, f'{prefix}keep', np.flatnonzero(keep)) if not keep.all() else None,
+        }
+    if name == 'StandardScaler':
+        return {
+            'op' : 'standardize',
+            'mean' : add_array(arrays, f'{prefix}mean', step.mean_) if step.with_mean else None,
+            'scale' : add_array(arrays, f'{prefix}scale', step.scale_) if step.with_std else None,
+        }
+    if name == 'MinMaxScaler':
+        return {
+            'op' : 'minmax',
+            'scale' : add_array(arrays, f'{prefix}scale', step.scale_),
+            'min' : add_array(arrays, f'{prefix}min', step.min_),
+            'clip' : list(step.feature_range) if getattr(step, 'clip', False) else None,
+        }
+    if name == 'OneHotEncoder':
+        if getattr(step, '_infrequent_enabled', False):
+            raise ValueError('OneHotEncoder: infrequent categories can\'t be compiled')
+        drop_idx = getattr(step, 'drop_idx_', None)
+        return {
+            'op' : 'onehot',
+            'categories' : [to_json_list(categories) for categories in step.categories_],
+            'drop' : None if drop_idx is None else [None if index is None else int(index) for index in drop_idx],
+            'handle_unknown' : step.handle_unknown,
+        }
+    if name == 'OrdinalEncoder':
+        return {
+            'op' : 'ordinal',
+            'categories' : [to_json_list(categories) for categories in step.categories_],
+            'handle_unknown' : step.handle_unknown,
+            'unknown_value' : None if step.unknown_value is None else float(step.unknown_value),
+            # Value of the NaN category (sklearn >= 1.1), None if NaN is encoded by its index
+            'encoded_missing_value' : None if getattr(step, 'encoded_missing_value', None) is None
+                                    else float(step.encoded_missing_value),
+        }
+    raise ValueError(f'{name} can\'t be compiled')
+
+# Spec of a block: columns and steps, values are read as float unless an encoder/text imputer needs the raw values
+def compile_block(columns, transformer, arrays, prefix):
+    steps = transformer.steps if hasattr(transformer, 'steps') else [(None, transformer)]
+    specs = [compile_step(step, arrays, f'{prefix}{i}_') for i, (_, step) in enumerate(steps)]
+    specs = [spec for spec in specs if spec is not None]
+    numeric = not any(spec['op'] in ('onehot', 'ordinal') or 'values' in spec for spec in specs)
+    return {'columns' : list(columns), 'numeric' : numeric, 'steps' : specs}
+
+# Column names of a ColumnTransformer block
+def get_block_columns(columns, input_columns):
+    if isinstance(columns, slice) or np.asarray(columns).dtype == bool or all(isinstance(column, (int, np.integer)) for column in columns):
+        return list(np.asarray(input_columns, dtype=object)[columns])
+    return list(columns)
+
+# Blocks of a ColumnTransformer, in output order
+def compile_column_transformer(transformer, input_columns, arrays):
+    blocks = []
+    for i, (name, step, columns) in enumerate(transformer.transformers_):
+        if step == 'drop' or len(get_block_columns(columns, input_columns)) == 0:
+            continue
+        columns = get_block_columns(columns, input_columns)
+        blocks.append(compile_block(columns, step, arrays, f'block{i}_'))
+    return blocks
+
+# Pack the nodes of several fitted sklearn trees into flat arrays
+# - leaf_values: values of each node, (n_nodes, n_values) per tree
+# - outputs: output column of each tree when trees have one value (gradient boosting), None if trees output every column
+def pack_trees(trees, leaf_values, arrays, outputs=None):
+    offsets = np.cumsum([0] + [tree.node_count for tree in trees])[:-1]
+    nodes = [np.arange(tree.node_count) + offset for tree, offset in zip(trees, offsets)]
+    return {
+        'roots' : add_array(arrays, 'tree_roots', offsets.astype(np.int64)),
+        # Leaves point to themselves
+        'left' : add_array(arrays, 'tree_left', np.concatenate(
+            [np.where(tree.children_left == -1, node, tree.children_left + offset) for tree, node, offset in zip(trees, nodes, offsets)])),
+        'right' : add_array(arrays, 'tree_right', np.concatenate(
+            [np.where(tree.children_right == -1, node, tree.children_right + offset) for tree, node, offset in zip(trees, nodes, offsets)])),
+        'feature' : add_array(arrays, 'tree_feature', np.concatenate(
+            [np.maximum(tree.feature, 0) for tree in trees]).astype(np.int64)),
+        'threshold' : add_array(arrays, 'tree_threshold', np.concatenate([tree.threshold for tree in trees])),
+        'value' : add_array(arrays, 'tree_value', np.concatenate(leaf_values)),
+        'outputs' : add_array(arrays, 'tree_outputs', outputs) if outputs is not None else None,
+    }
+
+# Leaf values of a classification tree as class probabilities
+def tree_class_proba(tree):
+    value = tree.value[:, 0, :]
+    totals = value.sum(axis=1, keepdims=True)
+    return value / np.where(totals == 0, 1, totals)
+
+# Spec of a fitted estimator
+def compile_estimator(estimator, arrays):
+    name = type(estimator).__name__
+    classifier = getattr(estimator, '_estimator_type', None) == 'classifier'
+    spec = {'name' : name, 'classes' : to_json_list(estimator.classes_) if classifier else None}
+
+    if name in ('RandomForestClassifier', 'ExtraTreesClassifier', 'RandomForestRegressor', 'ExtraTreesRegressor',
+                'DecisionTreeClassifier', 'DecisionTreeRegressor'):
+        estimators = getattr(estimator, 'estimators_', [estimator])
+        trees = [tree.tree_ for tree in estimators]
+        if trees[0].n_outputs != 1:
+            raise ValueError(f'{name}: multi-output trees can\'t be compiled')
+        leaf_values = [tree_class_proba(tree) if classifier else tree.value[:, 0, :] for tree in trees]
+        spec.update(kind='trees', combine='mean', trees=pack_trees(trees, leaf_values, arrays), link='identity')
+        return spec
+
+    if name in ('GradientBoostingClassifier', 'GradientBoostingRegressor'):
+        init = estimator.init_
+        if not (init == 'zero' or type(init).__name__ in ('DummyClassifier', 'DummyRegressor')):
+            raise ValueError(f'{name}: only the default init estimator can be compiled')
+        n_stages, n_outputs = estimator.estimators_.shape
+        # Trees in stage order, each one adds learning_rate * leaf value to its output column
+        trees = [estimator.estimators_[stage, k].tree_ for stage in range(n_stages) for k in range(n_outputs)]
+        leaf_values = [estimator.learning_rate * tree.value[:, 0, :1] for tree in trees]
+        outputs = np.tile(np.arange(n_outputs), n_stages)
+        init_raw = estimator._raw_predict_init(np.zeros((1, estimator.n_features_in_), dtype=np.float32))[0]
+        loss = type(getattr(estimator, '_loss', None)).__name__
+        if not classifier:
+            link = 'identity'
+        elif n_outputs > 1:
+            link = 'softmax'
+        else:
+            link = 'sigmoid2' if 'Exponential' in loss else 'sigmoid'
+        spec.update(kind='trees', combine='sum', trees=pack_trees(trees, leaf_values, arrays, outputs), link=link,
+                    init=add_array(arrays, 'init_raw', init_raw))
+        return spec
+
+    if name == 'LogisticRegression':
+        n_classes = len(estimator.classes_)
+        multi_class = estimator.multi_class
+        if multi_class == 'auto':
+            multi_class = 'ovr' if n_classes == 2 or estimator.solver == 'liblinear' else 'multinomial'
+        spec.update(kind='linear', coef=add_array(arrays, 'coef', estimator.coef_),
+                    intercept=add_array(arrays, 'intercept', np.atleast_1d(estimator.intercept_)),
+                    link='logistic_ovr' if multi_class == 'ovr' else 'softmax')
+        return spec
+
+    if not classifier and hasattr(estimator, 'coef_') and hasattr(estimator, 'intercept_'):
+        spec.update(kind='linear', coef=add_array(arrays, 'coef', np.atleast_2d(estimator.coef_)),
+                    intercept=add_array(arrays, 'intercept', np.atleast_1d(estimator.intercept_)), link='identity')
+        return spec
+
+    raise ValueError(f'{name} can\'t be compiled')
+
+# Compile a fitted model or pipeline to a CompiledModel
+def compile_model(model):
+    steps = model.steps if hasattr(model, 'steps') else [('estimator', model)]
+    estimator = steps[-1][1]
+    input_columns = list(getattr(model, 'feature_names_in_', range(model.n_features_in_)))
+    arrays = {}
+
+    blocks, post_steps = None, []
+    for i, (_, step) in enumerate(steps[:-1]):
+        # Fused preprocessing (see compile_preprocessor) is exported as its ColumnTransformer
+        if type(step).__name__ == 'FusedPreprocessor':
+            step = step.transformer_
+        if type(step).__name__ == 'ColumnTransformer':
+            if blocks is not None or post_steps:
+                raise ValueError('Only one ColumnTransformer, as the first step, can be compiled')
+            blocks = compile_column_transformer(step, input_columns, arrays)
+        else:
+            spec = compile_step(step, arrays, f'step{i}_')
+            if spec is not None:
+                post_steps.append(spec)
+    if blocks is None:
+        # No ColumnTransformer: every input column, as floats
+        blocks = [{'columns' : input_columns, 'numeric' : True, 'steps' : []}]
+    if any(spec['op'] in ('onehot', 'ordinal') or 'values' in spec for spec in post_steps):
+        raise ValueError('Encoders must be inside a ColumnTransformer to be compiled')
+
+    spec = {
+        'version' : COMPILED_FORMAT_VERSION,
+        'input_columns' : to_json_list(input_columns),
+        'blocks' : blocks,
+        'steps' : post_steps,
+        'estimator' : compile_estimator(estimator, arrays),
+    }
+    return CompiledModel(spec, arrays)
+
+
+######################################################
+#                      Runtime
+######################################################
+
+# Indices of values in categories, -1 for unknown values (NaN matches a NaN category)
+def encode_categories(values, categories):
+    return pd.Index(categories).get_indexer(values)
+
+# Ordinal value of each category code: the code itself, encoded_missing_value for the NaN category
+def get_ordinal_values(step, categories):
+    values = np.arange(len(categories), dtype=np.float64)
+    if step.get('encoded_missing_value') is not None:
+        values[pd.isna(pd.Index(categories))] = step['encoded_missing_value']
+    return values
+
+# Apply one preprocessing step to a 2d block of values
+def apply_step(step, values, arrays):
+    op = step['op']
+    if op == 'impute':
+        if 'values' in step:
+            values = values.copy()
+            missing = pd.isna(values)
+            rows, columns = np.nonzero(missing)
+            values[rows, columns] = np.asarray(step['values'], dtype=object)[columns]
+            return values
+        values = np.where(np.isnan(values), arrays[step['fill']], values)
+        return values if step['keep'] is None else values[:, arrays[step['keep']]]
+    if op == 'standardize':
+        values = np.array(values, dtype=np.float64)
+        if step['mean'] is not None:
+            values -= arrays[step['mean']]
+        if step['scale'] is not None:
+            values /= arrays[step['scale']]
+        return values
+    if op == 'minmax':
+        values = np.array(values, dtype=np.float64)
+        values *= arrays[step['scale']]
+        values += arrays[step['min']]
+        if step['clip'] is not None:
+            np.clip(values, *step['clip'], out=values)
+        return values
+    if op == 'onehot':
+        widths, codes = [], []
+        for j, categories in enumerate(step['categories']):
+            code = encode_categories(values[:, j], categories)
+            if step['handle_unknown'] == 'error' and (code < 0).any():
+                raise ValueError(f'Unknown categories in column {j}')
+            width = len(categories)
+            drop = step['drop'][j] if step['drop'] is not None else None
+            if drop is not None:
+                code = np.where(code == drop, -1, np.where(code > drop, code - 1, code))
+                width -= 1
+            widths.append(width)
+            codes.append(code)
+        encoded = np.zeros((len(values), sum(widths)))
+        offset = 0
+        for code, width in zip(codes, widths):
+            rows = np.flatnonzero(code >= 0)
+            encoded[rows, offset + code[rows]] = 1
+            offset += width
+        return encoded
+    if op == 'ordinal':
+        encoded = np.empty(values.shape)
+        for j, categories in enumerate(step['categories']):
+            code = encode_categories(values[:, j], categories)
+            known = code >= 0
+            if not known.all() and step['handle_unknown'] != 'use_encoded_value':
+                raise ValueError(f'Unknown categories in column {j}')
+            unknown_value = step['unknown_value'] if step['unknown_value'] is not None else np.nan
+            encoded[:, j] = np.where(known, get_ordinal_values(step, categories)[code], unknown_value)
+        return encoded
+    raise ValueError(f'Unknown step: {op}')
+
+######################################################
+#                Fused Preprocessing
+######################################################
+# Blocks of a ColumnTransformer written straight into one preallocated output, without the
+# intermediate array of each step or the final hstack:
+# - imputer/scaler blocks: columns are copied into their output slice, then imputed and scaled in place
+#   (same operations, in the same order, as SimpleImputer/StandardScaler/MinMaxScaler)
+# - imputer + encoder blocks: one lookup table per column, from category code to output column (one-hot)
+#   or value (ordinal), missing values are mapped to the code of the imputer fill value (without an imputer,
+#   the NaN category of an OrdinalEncoder gives its encoded_missing_value)
+# - other blocks: steps applied one after the other (apply_step), then copied
+# The sparse output is a CSR matrix with a fixed number of slots per row (one per numeric column,
+# one per encoded column), so it is built without any dense intermediate either
+
+# Width of the output of a step, for a block of width columns
+def get_step_width(step, width, arrays):
+    if step['op'] == 'impute' and step.get('keep') is not None:
+        return len(arrays[step['keep']])
+    if step['op'] == 'onehot':
+        drop = step['drop'] or [None] * len(step['categories'])
+        return sum(len(categories) - (index is not None) for categories, index in zip(step['categories'], drop))
+    return width
+
+# Compile the steps of a block (see compile_block) into a kernel
+def compile_block_kernel(block, arrays):
+    steps = block['steps']
+    width = len(block['columns'])
+    for step in steps:
+        width = get_step_width(step, width, arrays)
+    kernel = {'columns' : block['columns'], 'width' : width}
+
+    # Imputer/scalers, an imputer dropping all-missing columns must come first
+    if block['numeric'] and all(step['op'] in ('impute', 'standardize', 'minmax') and
+                                (step['op'] != 'impute' or step['keep'] is None or i == 0) for i, step in enumerate(steps)):
+        operations = []
+        for step in steps:
+            if step['op'] == 'impute':
+                fill = arrays[step['fill']]
+                if step['keep'] is not None:
+                    kernel['columns'] = [block['columns'][i] for i in arrays[step['keep']]]
+                    fill = fill[arrays[step['keep']]]
+                operations.append(('fill', fill))
+            elif step['op'] == 'standardize':
+                if step['mean'] is not None:
+                    operations.append(('subtract', arrays[step['mean']]))
+                if step['scale'] is not None:
+                    operations.append(('divide', arrays[step['scale']]))
+            else:
+                operations.append(('multiply', arrays[step['scale']]))
+                operations.append(('add', arrays[step['min']]))
+                if step['clip'] is not None:
+                    operations.append(('clip', step['clip']))
+        kernel.update(kind='numeric', operations=operations, slots=width)
+        return kernel
+
+    # Optional text imputer, then an encoder
+    imputer = steps[0] if len(steps) == 2 and steps[0]['op'] == 'impute' and 'values' in steps[0] else None
+    encoder = steps[-1] if steps and steps[-1]['op'] in ('onehot', 'ordinal') else None
+    if encoder is not None and (imputer is not None or len(steps) == 1):
+        onehot = encoder['op'] == 'onehot'
+        tables, offsets, offset = [], [], 0
+        for j, categories in enumerate(encoder['categories']):
+            index = pd.Index(categories)
+            # Code of missing values, None if they are looked up like any other value
+            missing_code = index.get_indexer([imputer['values'][j]])[0] if imputer is not None else None
+            if onehot:
+                drop = encoder['drop'][j] if encoder['drop'] is not None else None
+                positions = np.arange(len(categories))
+                if drop is not None:
+                    positions = np.where(positions == drop, -1, np.where(positions > drop, positions - 1, positions))
+                # Unknown categories (code -1) read the last entry
+                table = np.append(np.where(positions >= 0, positions + offset, -1), -1)
+                offsets.append(offset)
+                offset += len(categories) - (drop is not None)
+            else:
+                unknown_value = encoder['unknown_value'] if encoder['unknown_value'] is not None else np.nan
+                table = np.append(get_ordinal_values(encoder, categories), unknown_value)
+            tables.append((index, missing_code, table))
+        kernel.update(kind='onehot' if onehot else 'ordinal', tables=tables, offsets=offsets,
+                    slots=len(encoder['categories']), handle_unknown=encoder['handle_unknown'])
+        return kernel
+
+    kernel.update(kind='steps', steps=steps, numeric=block['numeric'], slots=width)
+    return kernel
+
+# Fitted ColumnTransformer blocks compiled into kernels writing into one output
+class FusedTransform:
+
+    def __init__(self, blocks, arrays, input_columns):
+
+        self.arrays = arrays
+        self.input_columns = list(input_columns)
+        self.kernels = [compile_block_kernel(block, arrays) for block in blocks]
+        self.width = sum(kernel['width'] for kernel in self.kernels)
+        self.slots = sum(kernel['slots'] for kernel in self.kernels)
+
+    # One input column, from a DataFrame (by name) or an array (by position)
+    def get_column(self, X, column, dtype=None):
+        if hasattr(X, 'iloc'):
+            return X[column].to_numpy(dtype=dtype)
+        return np.asarray(X)[:, self.input_columns.index(column)].astype(dtype)
+
+    # Category codes of one column, -1 for unknown values
+    def lookup(self, X, column, index, missing_code, table, handle_unknown):
+        values = self.get_column(X, column)
+        codes = index.get_indexer(values)
+        if missing_code is not None:
+            codes[pd.isna(values)] = missing_code
+        if handle_unknown == 'error' and (codes < 0).any():
+            raise ValueError(f'Unknown categories in column {column}')
+        return table[codes]
+
+    # Write the values of a numeric kernel into out (a view of the output), in place
+    def write_numeric(self, kernel, X, out):
+        for j, column in enumerate(kernel['columns']):
+            out[:, j] = self.get_column(X, column, np.float64)
+        for operation, values in kernel['operations']:
+            if operation == 'fill':
+                missing = np.isnan(out)
+                if missing.any():
+                    np.copyto(out, values, where=missing)
+            elif operation == 'subtract':
+                out -= values
+            elif operation == 'divide':
+                out /= values
+            elif operation == 'multiply':
+                out *= values
+            elif operation == 'add':
+                out += values
+            else:
+                np.clip(out, *values, out=out)
+
+    # Output of a kernel applying its steps one by one
+    def apply_steps(self, kernel, X):
+        dtype = np.float64 if kernel['numeric'] else object
+        values = np.column_stack([self.get_column(X, column, dtype) for column in kernel['columns']])
+        for step in kernel['steps']:
+            values = apply_step(step, values, self.arrays)
+        return values
+
+    # Preprocessed features, dense (written into out if given) or CSR
+    def transform(self, X, sparse=False, out=None):
+        if sparse:
+            return self.transform_sparse(X)
+        n_rows = len(X)
+        if out is None:
+            out = np.empty((n_rows, self.width))
+        elif out.shape != (n_rows, self.width):
+            raise ValueError(f'Output buffer must have shape {(n_rows, self.width)}, got {out.shape}')
+        start = 0
+        for kernel in self.kernels:
+            view = out[:, start:start + kernel['width']]
+            if kernel['kind'] == 'numeric':
+                self.write_numeric(kernel, X, view)
+            elif kernel['kind'] == 'onehot':
+                view[:] = 0
+                for j, (index, missing_code, table) in enumerate(kernel['tables']):
+                    positions = self.lookup(X, kernel['columns'][j], index, missing_code, table, kernel['handle_unknown'])
+                    rows = np.flatnonzero(positions >= 0)
+                    view[rows, positions[rows]] = 1
+            elif kernel['kind'] == 'ordinal':
+                for j, (index, missing_code, table) in enumerate(kernel['tables']):
+                    view[:, j] = self.lookup(X, kernel['columns'][j], index, missing_code, table, kernel['handle_unknown'])
+            else:
+                view[:] = self.apply_steps(kernel, X)
+            start += kernel['width']
+        return out
+
+    # CSR output: data and column indices of every row are written in slots, in column order
+    def transform_sparse(self, X):
+        from scipy import sparse
+
+        n_rows = len(X)
+        data = np.empty((n_rows, self.slots))
+        indices = np.empty((n_rows, self.slots), dtype=np.int32 if self.width < 2 ** 31 else np.int64)
+        start, slot = 0, 0
+        for kernel in self.kernels:
+            data_view = data[:, slot:slot + kernel['slots']]
+            indices_view = indices[:, slot:slot + kernel['slots']]
+            if kernel['kind'] == 'onehot':
+                for j, (index, missing_code, table) in enumerate(kernel['tables']):
+                    positions = self.lookup(X, kernel['columns'][j], index, missing_code, table, kernel['handle_unknown'])
+                    # Unknown categories: explicit zero on the first column of the feature, removed below
+                    data_view[:, j] = positions >= 0
+                    indices_view[:, j] = start + np.where(positions >= 0, positions, kernel['offsets'][j])
+            else:
+                if kernel['kind'] == 'numeric':
+                    self.write_numeric(kernel, X, data_view)
+                elif kernel['kind'] == 'ordinal':
+                    for j, (index, missing_code, table) in enumerate(kernel['tables']):
+                        data_view[:, j] = self.lookup(X, kernel['columns'][j], index, missing_code, table, kernel['handle_unknown'])
+                else:
+                    data_view[:] = self.apply_steps(kernel, X)
+                indices_view[:] = start + np.arange(kernel['slots'])
+            start += kernel['width']
+            slot += kernel['slots']
+        indptr = np.arange(0, n_rows * self.slots + 1, self.slots, dtype=indices.dtype)
+        features = sparse.csr_matrix((data.ravel(), indices.ravel(), indptr), shape=(n_rows, self.width))
+        features.eliminate_zeros()
+        return features
+
+# Fitted ColumnTransformer compiled into a FusedTransform (ValueError for steps that can't be compiled)
+def compile_preprocessor(transformer, input_columns):
+    arrays = {}
+    blocks = compile_column_transformer(transformer, input_columns, arrays)
+    return FusedTransform(blocks, arrays, input_columns)
+
+# Fitted pipeline as arrays and a spec, scored with NumPy
+class CompiledModel:
+
+    def __init__(self, spec, arrays):
+
+        self.spec = spec
+        self.arrays = arrays
+        self.input_columns = spec['input_columns']
+        classes = spec['estimator']['classes']
+        self.classes_ = np.asarray(classes) if classes is not None else None
+        self.preprocessor = FusedTransform(spec['blocks'], arrays, self.input_columns)
+
+    # Preprocessed feature matrix, ColumnTransformer blocks are written into one preallocated matrix
+    def transform(self, X):
+        features = self.preprocessor.transform(X)
+        for step in self.spec['steps']:
+            features = apply_step(step, features, self.arrays)
+        return features
+
+    # Leaf reached in every tree by every row, (n_rows, n_trees)
+    # All (row, tree) pairs move down one level at a time, pairs that reached a leaf are dropped
+    # once they are the majority (deep forests have leaves at very different depths)
+    def find_leaves(self, features):
+        trees = self.spec['estimator']['trees']
+        left, right = self.arrays[trees['left']], self.arrays[trees['right']]
+        feature, threshold = self.arrays[trees['feature']], self.arrays[trees['threshold']]
+        roots = self.arrays[trees['roots']]
+        n_rows, n_features = features.shape
+        nodes = np.tile(roots, n_rows)
+        # Position of the row of each (row, tree) pair in the flattened features
+        row_start = np.repeat(np.arange(n_rows) * n_features, len(roots))
+        flat_features = features.ravel()
+        active = None
+        while True:
+            node = nodes if active is None else nodes[active]
+            position = row_start if active is None else row_start[active]
+            next_node = np.where(flat_features[position + feature[node]] <= threshold[node], left[node], right[node])
+            moved = next_node != node
+            if active is None:
+                nodes = next_node
+            else:
+                nodes[active] = next_node
+            n_moved = np.count_nonzero(moved)
+            if n_moved == 0:
+                return nodes.reshape(n_rows, len(roots))
+            if n_moved < len(node) // 2:
+                active = np.flatnonzero(moved) if active is None else active[moved]
+
+    # Leaf values of every tree, summed (gradient boosting, plus init) or averaged (forests)
+    # Trees are added one after the other, in the same order as sklearn
+    def score_trees(self, features):
+        estimator = self.spec['estimator']
+        trees = estimator['trees']
+        value = self.arrays[trees['value']]
+        n_trees = len(self.arrays[trees['roots']])
+        # Trees compare float32 features, like sklearn
+        features = np.ascontiguousarray(features, dtype=np.float32)
+        outputs = self.arrays[trees['outputs']] if trees['outputs'] is not None else None
+        n_outputs = len(self.arrays[estimator['init']]) if outputs is not None else value.shape[1]
+        output = np.empty((len(features), n_outputs))
+        block_rows = max(1, TREE_BLOCK_SIZE // (n_trees * value.shape[1]))
+        for start in range(0, len(features), block_rows):
+            leaves = self.find_leaves(features[start:start + block_rows])
+            # (n_trees, rows, values): reductions over the first axis add trees sequentially
+            leaf_values = value[leaves.T]
+            if outputs is None:
+                output[start:start + block_rows] = leaf_values.sum(axis=0) / n_trees
+            else:
+                init = self.arrays[estimator['init']]
+                for k in range(n_outputs):
+                    tree_values = leaf_values[outputs == k, :, 0]
+                    output[start:start + block_rows, k] = np.concatenate(
+                        [np.full((1, len(leaves)), init[k]), tree_values]).sum(axis=0)
+        return output
+
+    # Raw output of the estimator (decision function, or probabilities for averaged trees)
+    def decision_function(self, X):
+        estimator = self.spec['estimator']
+        features = self.transform(X)
+        if estimator['kind'] == 'trees':
+            return self.score_trees(features)
+        return features @ self.arrays[estimator['coef']].T + self.arrays[estimator['intercept']]
+
+    def predict_proba(self, X):
+
+        estimator = self.spec['estimator']
+        if self.classes_ is None:
+            raise AttributeError('predict_proba is only available for classifiers')
+        raw = self.decision_function(X)
+        link = estimator['link']
+        if link == 'identity':
+            return raw
+        if link in ('sigmoid', 'sigmoid2') or (link == 'logistic_ovr' and raw.shape[1] == 1):
+            proba = 1 / (1 + np.exp(-(2 * raw[:, 0] if link == 'sigmoid2' else raw[:, 0])))
+            return np.column_stack([1 - proba, proba])
+        if link == 'logistic_ovr':
+            proba = 1 / (1 + np.exp(-raw))
+            return proba / proba.sum(axis=1, keepdims=True)
+        # softmax, binary multinomial models have one column of decision values
+        if raw.shape[1] == 1:
+            raw = np.column_stack([-raw[:, 0], raw[:, 0]])
+        raw = raw - raw.max(axis=1, keepdims=True)
+        proba = np.exp(raw)
+        return proba / proba.sum(axis=1, keepdims=True)
+
+    def predict(self, X):
+
+        if self.classes_ is not None:
+            return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+        raw = self.decision_function(X)
+        return raw[:, 0] if raw.shape[1] == 1 else raw
+
+    # Write the artifact (.npz) to a path or file object
+    def save(self, file):
+
+        spec = np.frombuffer(json.dumps(self.spec).encode(), dtype=np.uint8)
+        np.savez_compressed(file, __spec__=spec, **self.arrays)
+
+    # Artifact as bytes, e.g. for a download button
+    def to_bytes(self):
+
+        buffer = io.BytesIO()
+        self.save(buffer)
+        return buffer.getvalue()
+
+# Load an artifact written by CompiledModel.save
+def load_compiled_model(file):
+    with np.load(file, allow_pickle=False) as artifact:
+        arrays = {name : artifact[name] for name in artifact.files if name != '__spec__'}
+        spec = json.loads(artifact['__spec__'].tobytes())
+    if spec['version'] != COMPILED_FORMAT_VERSION:
+        raise ValueError(f'Unsupported compiled model version: {spec["version"]}')
+    return CompiledModel(spec, arrays)
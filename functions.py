@@ -7,43 +7,59 @@ from typing import Union, Optional, Tuple, Any
 
 # Date handling
 from datetime import datetime
+import time
+
+# Background jobs
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 
 # Data manipulation and math operations
 import numpy as np
 import pandas as pd
+from scipy.stats import randint, uniform, loguniform, t as student_t
 import re
 import pickle
+import json
+import copy
+import heapq
+
+# Caching
+import os
+import importlib
+import importlib.util
+import hashlib
+import joblib
+from joblib import Parallel, delayed
+from collections import OrderedDict
 
 # Data Visualization
-import matplotlib.pyplot as plt
-import seaborn as sns
 import plotly.express as px
 import plotly.graph_objects as go
-import altair as alt
 
 # Web rendering API
 import streamlit as st
 
 # Machine Learning with Sklearn
 ## Preprocessing
-from sklearn.base import BaseEstimator, TransformerMixin
-from sklearn.model_selection import train_test_split, StratifiedKFold, GridSearchCV, RandomizedSearchCV, cross_validate
+from sklearn.base import BaseEstimator, TransformerMixin, clone, is_classifier
+from sklearn.model_selection import train_test_split, KFold, StratifiedKFold, GridSearchCV, RandomizedSearchCV, cross_validate, ParameterSampler
 from sklearn.pipeline import Pipeline
 from sklearn.impute import SimpleImputer
 from sklearn.preprocessing import StandardScaler, MinMaxScaler, PolynomialFeatures, OneHotEncoder, OrdinalEncoder, label_binarize
 from sklearn.compose import ColumnTransformer
-## Models
-from sklearn.linear_model import LogisticRegression, SGDClassifier, LinearRegression, ElasticNet
-from sklearn.neighbors import KNeighborsClassifier
-from sklearn.ensemble import AdaBoostClassifier, RandomForestClassifier, GradientBoostingClassifier
-from sklearn.naive_bayes import MultinomialNB, CategoricalNB
-from sklearn.svm import SVC
+## Models (estimators are imported on first use, see ESTIMATORS)
 from sklearn.multiclass import OneVsRestClassifier
 ## Metrics
 from sklearn.metrics import r2_score, mean_absolute_error, mean_squared_error,\
-	confusion_matrix, classification_report, roc_auc_score, auc, f1_score, roc_curve, plot_roc_curve, precision_recall_curve
+	confusion_matrix, classification_report, roc_auc_score, auc, f1_score, roc_curve, plot_roc_curve, precision_recall_curve, \
+	average_precision_score
 ## Handling errors
 from sklearn.exceptions import NotFittedError
+## Fused preprocessing kernels
+from compiled_model import compile_preprocessor, FusedTransform, add_array
+## Chunked csv/parquet reader, paths typed in the pages are kept inside DATA_DIR
+from batch_predict import iter_chunks, resolve_data_path, DATA_DIR
 
 # Create class to drop columns, used in feature engineering pipeline
 class ColumnDropper(BaseEstimator, TransformerMixin):
@@ -60,6 +76,41 @@ class ColumnDropper(BaseEstimator, TransformerMixin):
         
         return X.drop(columns = self.columns_to_drop)
 
+# ColumnTransformer compiled after fit into one fused pass (see compiled_model.FusedTransform):
+# imputer+scaler blocks are computed in place and imputer+encoder blocks with lookup tables,
+# directly into one preallocated output, dense or CSR (sparse_output)
+# Steps that can't be compiled fall back to the fitted ColumnTransformer
+class FusedPreprocessor(BaseEstimator, TransformerMixin):
+
+    def __init__(self, transformer, sparse_output=False):
+
+        self.transformer = transformer
+        self.sparse_output = sparse_output
+
+    def fit(self, X, y=None):
+
+        self.transformer_ = clone(self.transformer).fit(X, y)
+        self.n_features_in_ = self.transformer_.n_features_in_
+        # Exposed like any fitted transformer, compile_model and batch_predict select input columns by it
+        if hasattr(self.transformer_, 'feature_names_in_'):
+            self.feature_names_in_ = self.transformer_.feature_names_in_
+        input_columns = getattr(self.transformer_, 'feature_names_in_', range(self.n_features_in_))
+        try:
+            self.kernel_ = compile_preprocessor(self.transformer_, input_columns)
+        except ValueError:
+            self.kernel_ = None
+        return self
+
+    def transform(self, X, y=None):
+
+        if self.kernel_ is None:
+            return self.transformer_.transform(X)
+        return self.kernel_.transform(X, sparse=self.sparse_output)
+
+    def get_feature_names_out(self, input_features=None):
+
+        return self.transformer_.get_feature_names_out(input_features)
+
 # Control train/test slider
 def train_to_test():
     st.session_state.test_size = 1 - st.session_state.train_size
@@ -95,8 +146,14 @@ def apply_feature_engineering(feat_eng_pipe_params, y_train, X_train, X_test):
 
 		return X_train, X_test
 
+# ColumnTransformer of the preprocess pipeline, compiled into a fused pass after fit if fused
+def create_column_transformer(transformers, fused=False, sparse_output=False):
+    if fused:
+        return FusedPreprocessor(ColumnTransformer(transformers), sparse_output=sparse_output)
+    return ColumnTransformer(transformers)
+
 # Create preprocess pipeline
-def create_preprocess_pipeline(X_train, numeric_params, categorical_params):
+def create_preprocess_pipeline(X_train, numeric_params, categorical_params, fused=False, sparse_output=False):
     # Define numeric/categorical features
     numeric_features     = X_train.select_dtypes(include=np.number).columns.tolist()
     categorical_features = X_train.select_dtypes(exclude=np.number).columns.tolist()
@@ -104,29 +161,27 @@ def create_preprocess_pipeline(X_train, numeric_params, categorical_params):
     pipeline = []
 
     # Create Column transformer with respective parameters
-    if len(numeric_features): # No numerical features on dataframe
+    if not len(numeric_features): # No numerical features on dataframe
         if categorical_params: # has transformer
             pipeline.append( ('categorical_transformer', Pipeline(categorical_params) ,categorical_features) )
-            return ColumnTransformer(pipeline)
-    elif len(categorical_features): # No categorical features on dataframe
+            return create_column_transformer(pipeline, fused, sparse_output)
+    elif not len(categorical_features): # No categorical features on dataframe
         if numeric_params: # has transformer
             pipeline.append( ('numeric_transformer', Pipeline(numeric_params), numeric_features) )
-            return ColumnTransformer(pipeline)
+            return create_column_transformer(pipeline, fused, sparse_output)
     else: # Both types of features and transformers
         if numeric_params:
             pipeline.append( ('numeric_transformer', Pipeline(numeric_params), numeric_features) )
         if categorical_params:
             pipeline.append( ('categorical_transformer', Pipeline(categorical_params) ,categorical_features) )
         if len(pipeline):
-            return ColumnTransformer(pipeline)
+            return create_column_transformer(pipeline, fused, sparse_output)
     # no transformers
     return None
 
-# Create final pipeline and fit model
-def create_pipeline(X, y, pp_pipeline, estimator, default_params={}, multi_class=False):
+# Create final pipeline, the model is fitted later by fit_pipeline/submit_training_job
+def create_pipeline(pp_pipeline, estimator, default_params={}, multi_class=False):
 		
-    start_time =  datetime.now()
-    print(f'Fitting model: ')
     if pp_pipeline:
         pipeline = Pipeline([
             ('pre_processing', pp_pipeline),
@@ -142,6 +197,13 @@ def create_pipeline(X, y, pp_pipeline, estimator, default_params={}, multi_class
                 ('estimator', estimator(**default_params))
             ])
 
+    return pipeline
+
+# Fit pipeline and print time to fit
+def fit_pipeline(pipeline, X, y):
+
+    start_time =  datetime.now()
+    print(f'Fitting model: ')
     pipeline.fit(X, y)
     end_time = datetime.now()
     print(f'Time to fit model: ', str(end_time - start_time).split(".")[0])
@@ -156,7 +218,8 @@ def run_model(df:str, target_name:str, estimator:Any, metric_type:str,
 			estimator_params:dict={}, stratify:bool=False, multi_class=False,
 			eval_df:Optional[str]=None, id_column:Optional[str]=None,
 			features_creator:Optional[Any]=None, cols_to_drop:Optional[list[str]]=None, 
-			plot_metrics:bool=True, save_model:bool=False, submit_file:bool=False, random_state=42):
+			plot_metrics:bool=True, save_model:bool=False, submit_file:bool=False, random_state=42,
+			fused_preprocessing:bool=False, sparse_output:bool=False):
 
     # Set Features
     X = df.drop(columns=target_name) 
@@ -187,18 +250,20 @@ def run_model(df:str, target_name:str, estimator:Any, metric_type:str,
     # Create Pre-processing Pipeline
     pre_processing_pipeline = create_preprocess_pipeline(X_train=X_train,
                                                     numeric_params=numeric_pipeline,
-                                                    categorical_params=categorical_pipeline)
+                                                    categorical_params=categorical_pipeline,
+                                                    fused=fused_preprocessing,
+                                                    sparse_output=sparse_output)
     # Make pipeline
-    pipeline = create_pipeline(X=X_train, y=y_train, 
-                            pp_pipeline=pre_processing_pipeline, 
+    pipeline = create_pipeline(pp_pipeline=pre_processing_pipeline, 
                             estimator=estimator, default_params=estimator_params,
-                            multi_class=multi_class,random_state=random_state)
+                            multi_class=multi_class)
     # Fit model
-    pipeline.fit(X_train, y_train)
+    pipeline = fit_pipeline(pipeline, X_train, y_train)
 
     # Success
     return {
         'pipeline': pipeline,
+        'fingerprint' : get_model_fingerprint(pipeline, X_train, y_train, target_name=target_name),
         'X' : X, 'y' : y,
         'X_train' : X_train, 'X_test' : X_test, 
         'y_train' : y_train, 'y_test' : y_test,
@@ -214,6 +279,173 @@ def print_regression_metrics(y_train, y_test, y_pred_train, y_pred_test):
 		for metric in [r2_score, mean_absolute_error, mean_squared_error]:
 			st.text(f'{metric.__name__}: {metric(y_test, y_pred_test):.3f}')
 
+######################################################
+#                  Cache Functions
+######################################################
+
+# Maximum number of prepared datasets kept in memory
+DATASET_CACHE_SIZE = 8
+# Prepared sample datasets, keyed by file/content and preparation options
+_dataset_cache = OrderedDict()
+# Content hashes, keyed by (path, mtime, size) so unchanged files are hashed once
+_file_hash_cache = {}
+
+# Return a cached value and mark it as most recently used
+def lru_get(cache, key):
+    if key not in cache:
+        return None
+    cache.move_to_end(key)
+    return cache[key]
+
+# Store a value, evicting the least recently used entries above maxsize
+def lru_put(cache, key, value, maxsize):
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > maxsize:
+        cache.popitem(last=False)
+    return value
+
+# Hash the content of a file, reading it in blocks
+def get_file_hash(file_path, block_size=1 << 20):
+    file_hash = hashlib.md5()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+# Build the cache key for a file on disk: path, modification time and content hash
+def get_file_key(file_path):
+    stat = os.stat(file_path)
+    stat_key = (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+    if stat_key not in _file_hash_cache:
+        _file_hash_cache[stat_key] = get_file_hash(file_path)
+    return stat_key + (_file_hash_cache[stat_key],)
+
+# Maximum number of fitted models kept in memory
+MODEL_CACHE_SIZE = 16
+# Optional on-disk tier for fitted models, set MODEL_CACHE_DIR to None to disable it
+MODEL_CACHE_DIR = '.model_cache'
+# Maximum size of the on-disk tier, oldest files are removed first
+MODEL_CACHE_DISK_LIMIT = 500 * 1024 ** 2
+# Fitted models, keyed by fingerprint
+_model_cache = OrderedDict()
+# Training job histories (validation scores per epoch), keyed by model fingerprint
+_history_cache = OrderedDict()
+# Cross-validation scores, keyed by model fingerprint and cv settings
+_cv_cache = OrderedDict()
+# Maximum number of models with predictions/metrics kept in memory
+METRICS_CACHE_SIZE = 8
+# Predictions, keyed by model fingerprint and split name
+_predictions_cache = OrderedDict()
+# Train/test metrics and figures, keyed by model fingerprint and curve points
+_metrics_cache = OrderedDict()
+# Permutation importances, keyed by model fingerprint, split name and importance settings
+_importance_cache = OrderedDict()
+# Maximum number of partial dependence results kept in memory
+PDP_CACHE_SIZE = 256
+# Partial dependence results, keyed by model fingerprint, feature and settings
+_pdp_cache = OrderedDict()
+# Lock for _pdp_cache (also filled by background jobs) and _pdp_jobs
+_pdp_lock = threading.Lock()
+# Maximum number of models with a SHAP explainer, and of (model, split) entries with SHAP values, kept in memory
+SHAP_CACHE_SIZE = 4
+# SHAP explainers, keyed by model fingerprint
+_shap_explainers = OrderedDict()
+# SHAP values by row block, keyed by model fingerprint, split name and rows hash
+_shap_values = OrderedDict()
+# Maximum number of booster datasets (DMatrix) kept in memory
+BOOSTER_DATA_CACHE_SIZE = 4
+# Booster datasets, keyed by data hash, split and binning settings
+_booster_data_cache = OrderedDict()
+
+# Hash the content of DataFrames, Series and arrays
+def get_data_hash(*data):
+    data_hash = hashlib.md5()
+    for values in data:
+        if isinstance(values, (pd.DataFrame, pd.Series)):
+            data_hash.update(pd.util.hash_pandas_object(values, index=True).values.tobytes())
+            if isinstance(values, pd.DataFrame):
+                data_hash.update(repr(values.columns.tolist()).encode())
+        else:
+            values = np.ascontiguousarray(values)
+            data_hash.update(repr((values.shape, values.dtype.str)).encode())
+            data_hash.update(values.tobytes())
+    return data_hash.hexdigest()
+
+# Convert estimator parameters into a stable, hashable representation
+def get_params_spec(value):
+    # estimators and transformers are represented by their class, their params are already expanded by get_params(deep=True)
+    if hasattr(value, 'get_params'):
+        return f'{type(value).__module__}.{type(value).__qualname__}'
+    if isinstance(value, type) or callable(value):
+        return f'{getattr(value, "__module__", "")}.{getattr(value, "__qualname__", repr(value))}'
+    if isinstance(value, dict):
+        return {str(key): get_params_spec(item) for key, item in sorted(value.items(), key=lambda item: str(item[0]))}
+    if isinstance(value, (list, tuple)):
+        return [get_params_spec(item) for item in value]
+    return repr(value)
+
+# Stable fingerprint of a model configuration and the data used to fit it
+def get_model_fingerprint(model, X, y, **kwargs):
+    '''
+    Fingerprint used as key for the fitted-model cache.\n
+    Combines the data hash, the estimator class and every parameter returned by
+    `get_params(deep=True)` (transformers, hyper params, random_state), plus any
+    extra settings passed as keyword arguments (target, split params, etc).
+    '''
+    spec = {
+        'data' : get_data_hash(X, y),
+        'model' : get_params_spec(model),
+        'params' : get_params_spec(model.get_params(deep=True)),
+        'settings' : get_params_spec(kwargs),
+    }
+    return hashlib.md5(repr(spec).encode()).hexdigest()
+
+# Remove the oldest files from the on-disk model cache until it fits the size limit
+def evict_model_disk_cache(cache_dir=None, size_limit=None):
+    cache_dir = cache_dir or MODEL_CACHE_DIR
+    size_limit = MODEL_CACHE_DISK_LIMIT if size_limit is None else size_limit
+    if not cache_dir or not os.path.isdir(cache_dir):
+        return
+    files = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir) if name.endswith('.joblib')]
+    files = sorted(files, key=os.path.getmtime)
+    total_size = sum(os.path.getsize(file) for file in files)
+    while files and total_size > size_limit:
+        file = files.pop(0)
+        total_size -= os.path.getsize(file)
+        os.remove(file)
+
+# Return a fitted model from memory or disk, None if it was never cached
+def get_cached_model(fingerprint):
+    model = lru_get(_model_cache, fingerprint)
+    if model is not None or not MODEL_CACHE_DIR:
+        return model
+    file_path = os.path.join(MODEL_CACHE_DIR, f'{fingerprint}.joblib')
+    if os.path.isfile(file_path):
+        try:
+            model = joblib.load(file_path)
+        except Exception:
+            # unreadable entry (partial write, library upgrade), fit again
+            os.remove(file_path)
+            return None
+        # mark as recently used for the disk eviction
+        os.utime(file_path)
+        lru_put(_model_cache, fingerprint, model, maxsize=MODEL_CACHE_SIZE)
+    return model
+
+# Store a fitted model in memory and, if enabled, on disk
+def cache_model(fingerprint, model):
+    lru_put(_model_cache, fingerprint, model, maxsize=MODEL_CACHE_SIZE)
+    if MODEL_CACHE_DIR:
+        try:
+            os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
+            joblib.dump(model, os.path.join(MODEL_CACHE_DIR, f'{fingerprint}.joblib'))
+            evict_model_disk_cache()
+        except (OSError, pickle.PicklingError) as error:
+            print(f'Model not saved to disk cache: {error}')
+    return model
+
+
 ######################################################
 #             Data Engineering Functions
 ######################################################
@@ -221,7 +453,7 @@ def print_regression_metrics(y_train, y_test, y_pred_train, y_pred_test):
 # Extract a short docstring, all characters between the Parameters and Attributes section
 def get_docstring_params(estimator):
 	# get full docstring
-	doc_string = estimator().__doc__
+	doc_string = estimator.__doc__
 	doc_string = doc_string.split('\n')
 	# select only values with Parameters(start) and Attributes(end)
 	r = re.compile("(.*Parameters)|(.*Attributes)")
@@ -240,9 +472,8 @@ def get_param_options(estimator):
 	# empty dictionary for only parameters with multiple options
 	opt_param_dict = {}
 
-	param_section = get_docstring_params(estimator)
 	# search all docstring for parameters with a list of options
-	options_params = re.findall('    .* : {.*}',estimator().__doc__)
+	options_params = re.findall('    .* : {.*}',estimator.__doc__)
 	for param in options_params:
 		# divine between key and values	
 		param_split = param.split(':')
@@ -258,10 +489,19 @@ def get_param_options(estimator):
 
 	return opt_param_dict
 
+# Parameters with a simple type, editable in the sidebar
+def is_simple_param(value):
+	return value is None or isinstance(value, (bool, int, float, str))
+
 # Returns a dictionary with all parameters set with default options
+# Estimators whose docstring has no numpydoc Parameters/Attributes sections (e.g. lightgbm)
+# get the simple defaults of get_params()
 def get_default_params(estimator):
 	# get section of parameters from full docstring
-	param_docs = get_docstring_params(estimator)
+	try:
+		param_docs = get_docstring_params(estimator)
+	except (IndexError, ValueError):
+		return {key:value for key, value in estimator().get_params().items() if is_simple_param(value)}
 	# get each parameter
 	params = re.findall('    .* : ', param_docs)
 	# clean empty characters and :
@@ -272,9 +512,13 @@ def get_default_params(estimator):
 	opt_values = get_param_options(estimator)
 	# update default params
 	for key, value in opt_values.items():
+		# options documented for a parameter that isn't an attribute of the estimator
+		if key not in default_values:
+			continue
 		if default_values[key]:
-			# change position of default value to first index
-			value.remove(default_values[key])
+			# change position of default value to first index (it can be a number not listed in the options)
+			if default_values[key] in value:
+				value.remove(default_values[key])
 			value.insert(0,default_values[key])
 			# update value
 			default_values[key] = value
@@ -285,36 +529,220 @@ def get_default_params(estimator):
 
 	return default_values
 
+# Parameter schemas (get_default_params results), keyed by estimator class and version of its package
+_param_schemas = {}
+# JSON file where schemas are persisted between runs, None to disable
+PARAM_SCHEMA_FILE = '.param_schema.json'
+# Persisted schemas are loaded once, on first use
+_param_schemas_loaded = False
+
+# Key of an estimator in the schema registry
+# Versioned by the package that owns the class (sklearn, lightgbm, xgboost...), upgrading it renews the schema
+def get_param_schema_key(estimator):
+	package = importlib.import_module(estimator.__module__.split('.')[0])
+	return f'{estimator.__module__}.{estimator.__qualname__}@{getattr(package, "__version__", "")}'
+
+# Check if a schema can be saved to JSON and loaded back unchanged
+def is_json_schema(schema):
+	scalar = (bool, int, float, str, type(None))
+	return all(isinstance(value, scalar) or (isinstance(value, list) and all(isinstance(item, scalar) for item in value))
+			for value in schema.values())
+
+# Load persisted schemas into the registry
+def load_param_schemas(file_path=PARAM_SCHEMA_FILE):
+	global _param_schemas_loaded
+	_param_schemas_loaded = True
+	if not file_path or not os.path.isfile(file_path):
+		return
+	try:
+		with open(file_path) as file:
+			_param_schemas.update(json.load(file))
+	except (OSError, ValueError) as error:
+		print(f'Parameter schemas not loaded: {error}')
+
+# Save schemas of the registry that are JSON serializable
+def save_param_schemas(file_path=PARAM_SCHEMA_FILE):
+	if not file_path:
+		return
+	schemas = {key: schema for key, schema in _param_schemas.items() if is_json_schema(schema)}
+	try:
+		with open(file_path, 'w') as file:
+			json.dump(schemas, file, indent=1)
+	except OSError as error:
+		print(f'Parameter schemas not saved: {error}')
+
+# Cached get_default_params: docstrings are parsed once per estimator class and sklearn version
+def get_param_schema(estimator):
+	if not _param_schemas_loaded:
+		load_param_schemas()
+	key = get_param_schema_key(estimator)
+	if key not in _param_schemas:
+		_param_schemas[key] = get_default_params(estimator)
+		save_param_schemas()
+	# copy, so callers can't change the registry
+	return copy.deepcopy(_param_schemas[key])
+
 
 ######################################################
 #             Input/Output Functions
 ######################################################
 
+# Folder with the sample datasets
+SAMPLE_DATA_DIR = 'sample_data'
+# Columnar format materialized next to each csv: 'parquet' or 'feather'
+COLUMNAR_FORMAT = 'parquet'
+# Target column of each sample dataset
+SAMPLE_DATA_TARGETS = {
+    'iris' : 'species',
+    'penguins' : 'species',
+    'diamonds' : 'cut',
+    'tips' : 'sex',
+}
+
+# List sample datasets, by name of the csv files
+def list_sample_datasets(folder=SAMPLE_DATA_DIR):
+    return sorted([os.path.splitext(file)[0] for file in os.listdir(folder) if file.endswith('.csv')])
+
+# Path of the columnar copy of a csv file
+def get_columnar_path(csv_path, file_format=COLUMNAR_FORMAT):
+    return os.path.splitext(csv_path)[0] + f'.{file_format}'
+
+# Check if the columnar copy exists and is newer than the csv
+def is_columnar_updated(csv_path, file_format=COLUMNAR_FORMAT):
+    columnar_path = get_columnar_path(csv_path, file_format)
+    return os.path.isfile(columnar_path) and os.path.getmtime(columnar_path) >= os.path.getmtime(csv_path)
+
+# Materialize every csv of the sample data folder in a columnar format
+def convert_sample_data(folder=SAMPLE_DATA_DIR, file_format=COLUMNAR_FORMAT):
+    converted = []
+    for dataset_name in list_sample_datasets(folder):
+        csv_path = os.path.join(folder, f'{dataset_name}.csv')
+        # skip files already converted
+        if is_columnar_updated(csv_path, file_format):
+            continue
+        df = pd.read_csv(csv_path)
+        try:
+            if file_format == 'parquet':
+                df.to_parquet(get_columnar_path(csv_path, file_format), index=False)
+            else:
+                df.to_feather(get_columnar_path(csv_path, file_format))
+        # pyarrow not installed, loaders will keep reading the csv files
+        except ImportError as error:
+            print(f'Sample data not converted to {file_format}: {error}')
+            return converted
+        converted.append(dataset_name)
+    return converted
+
+# Read a sample dataset, preferring the columnar copy and reading only the selected columns
+def read_sample_frame(dataset_name, columns=None, folder=SAMPLE_DATA_DIR, file_format=COLUMNAR_FORMAT):
+    csv_path = os.path.join(folder, f'{dataset_name}.csv')
+    columns = list(columns) if columns is not None else None
+
+    if is_columnar_updated(csv_path, file_format):
+        try:
+            if file_format == 'parquet':
+                return pd.read_parquet(get_columnar_path(csv_path, file_format), columns=columns)
+            return pd.read_feather(get_columnar_path(csv_path, file_format), columns=columns)
+        except ImportError:
+            pass
+
+    df = pd.read_csv(csv_path, usecols=columns)
+    # usecols keeps the file order
+    return df[columns] if columns is not None else df
+
+# Column names of a sample dataset, without reading its values
+def get_sample_columns(dataset_name, folder=SAMPLE_DATA_DIR):
+    return pd.read_csv(os.path.join(folder, f'{dataset_name}.csv'), nrows=0).columns.tolist()
+
 # Read sample data
-def read_sample_data(dataset_name):
+def read_sample_data(dataset_name, columns=None, memmap=False, sparse=False, max_categories=None):
+
+    target_name = SAMPLE_DATA_TARGETS[dataset_name]
 
-    if dataset_name == 'iris':
-        target_name = 'species'
-    elif dataset_name == 'penguins':
-        target_name = 'species'
-    elif dataset_name == 'diamonds':
-        target_name = 'cut'
-    elif dataset_name == 'tips':
-        target_name = 'sex'
+    return cached_prepare_sample_data(dataset_name, target_name, columns=columns, memmap=memmap,
+                                    sparse=sparse, max_categories=max_categories)
 
-    return prepare_sample_data(dataset_name, target_name)
+# Memoize prepare_sample_data, keyed by file content and preparation options
+def cached_prepare_sample_data(dataset_name, target_name, add_noise=True, seed=42, columns=None, memmap=False,
+                                sparse=False, max_categories=None):
+    '''
+    Return the `prepare_sample_data` results from an in-memory LRU cache.\n
+    The key includes the file modification time and content hash, so editing
+    the csv invalidates the entry. A shallow copy of the results is returned,
+    callers can update the dictionary without changing the cached entry.
+    '''
+    file_path = os.path.join(SAMPLE_DATA_DIR, f'{dataset_name}.csv')
+    columns = tuple(columns) if columns is not None else None
+    key = (get_file_key(file_path), target_name, add_noise, seed, columns, memmap, sparse, max_categories)
+
+    results = lru_get(_dataset_cache, key)
+    if results is None:
+        results = prepare_sample_data(dataset_name, target_name, add_noise=add_noise, seed=seed,
+                                    columns=columns, memmap=memmap, sparse=sparse, max_categories=max_categories)
+        lru_put(_dataset_cache, key, results, maxsize=DATASET_CACHE_SIZE)
+
+    return dict(results)
+
+# Default maximum number of levels one-hot encoded per categorical column
+ONEHOT_MAX_CATEGORIES = 50
+# Level replacing the rarer levels of capped columns
+ONEHOT_OTHER_LABEL = 'other'
+
+# Keep the max_categories most frequent levels of each categorical column, the others become other_label
+# Missing values are kept, they are filled after encoding
+def cap_categories(X, max_categories=ONEHOT_MAX_CATEGORIES, other_label=ONEHOT_OTHER_LABEL):
+    X = X.copy()
+    for column in X.select_dtypes(include=['object', 'category']).columns:
+        counts = X[column].value_counts()
+        if len(counts) > max_categories:
+            values = X[column].astype(object)
+            X[column] = values.where(values.isin(counts.index[:max_categories]) | values.isna(), other_label)
+    return X
+
+# Check if every column of a DataFrame has a sparse dtype
+def is_sparse_frame(X):
+    return isinstance(X, pd.DataFrame) and X.shape[1] > 0 and all(isinstance(dtype, pd.SparseDtype) for dtype in X.dtypes)
+
+# Onehot encoding for categorical features, and fill null values
+# - sparse : all columns as Sparse[float64, 0], one dtype so scikit-learn estimators convert the frame to CSR
+#   (estimators that need dense input, see 'dense_only' in ESTIMATORS, get densify_data)
+# - max_categories : cap of levels per column, see cap_categories, no cap if None
+def encode_onehot(X, sparse=False, max_categories=None, other_label=ONEHOT_OTHER_LABEL):
+    if max_categories is not None:
+        X = cap_categories(X, max_categories, other_label)
+    if not sparse:
+        return pd.get_dummies(X).fillna(0)
+    categorical_columns = X.select_dtypes(include=['object', 'category']).columns
+    # dummies are created as Sparse[float64, 0], only the other columns are converted
+    dummies = pd.get_dummies(X[categorical_columns], sparse=True, dtype=np.float64) if len(categorical_columns) else None
+    X = X.drop(columns=categorical_columns).fillna(0).astype(pd.SparseDtype(np.float64, 0))
+    return X if dummies is None else pd.concat([X, dummies], axis=1)
+
+# Dense copies of the sparse feature frames of prepare_sample_data results
+def densify_data(results):
+    results = dict(results)
+    for key in ('X', 'X_train', 'X_test'):
+        if is_sparse_frame(results[key]):
+            results[key] = results[key].sparse.to_dense()
+    return results
 
 # Prepare sample data to modeling
-def prepare_sample_data(dataset_name, target_name, add_noise=True):
+def prepare_sample_data(dataset_name, target_name, add_noise=True, seed=42, columns=None, memmap=False,
+                        sparse=False, max_categories=None):
     """  
     \nPreprocess data\n---\n
     Apply every transformation need in order to fil models, like onehot encoding and fill null values\n
     - df : `pd.DataFrame`, used to apply changes  
     - target_name : `str`, column to be predicted  
+    - columns : `list`, features to read, all columns if None  
+    - memmap : `bool`, store the feature matrix as a memory-mapped file, see `memmap_train_test`  
+    - sparse : `bool`, sparse one-hot encoding, see `encode_onehot` (not memory-mapped)  
+    - max_categories : `int`, levels encoded per categorical column, rarer levels are grouped  
     \nReturns\n---\n
     - X :  `pd.Dataframe`, transformed features
     - y :  `pd.Series`, target values
     - target_labels : `dict`, mapping of categorical values 
+    - memory : `dict`, memory usage of the features before and after encoding 
     \nExample\n---\n
     >>> import pandas as pd
     >>> import seaborn as sns
@@ -322,8 +750,10 @@ def prepare_sample_data(dataset_name, target_name, add_noise=True):
     >>> X, y, target_labels = prepare_data(df, target_name='species')
     """
 
-    # Read csv with pandas
-    df = pd.read_csv(f'sample_data/' + dataset_name + '.csv')
+    # Read dataset (columnar copy if available), only target and selected features
+    if columns is not None:
+        columns = [target_name] + [column for column in columns if column != target_name]
+    df = read_sample_frame(dataset_name, columns=columns)
 
     # Drop target column
     X = df.drop(target_name, axis=1)
@@ -331,7 +761,7 @@ def prepare_sample_data(dataset_name, target_name, add_noise=True):
     # Add noisy features to make the problem harder
     if add_noise:
         X_noise = X.select_dtypes(include=(int, float)).copy()
-        np.random.seed(42)
+        np.random.seed(seed)
         mu, sigma = 0, 5
         noise = np.random.normal(mu, sigma, [X_noise.shape[0], X_noise.shape[1]]) 
         X = pd.concat([
@@ -341,7 +771,9 @@ def prepare_sample_data(dataset_name, target_name, add_noise=True):
                     axis=1)
 
     # Onehot encoding for categorical features, and fill null values
-    X = pd.get_dummies(X).fillna(0)
+    memory = {'before' : get_memory_usage(X)}
+    X = encode_onehot(X, sparse=sparse, max_categories=max_categories)
+    memory['after'] = get_memory_usage(X)
     # For all columns, replace non alphanumeric characters with "_"
     X.columns = [''.join(char if char.isalnum() else "_" for char in str(column)) for column in X.columns]
 
@@ -355,13 +787,22 @@ def prepare_sample_data(dataset_name, target_name, add_noise=True):
         y = df[target_name]
         target_labels = None
 
-    # Split into train/test dataset
-    X_train, X_test, y_train, y_test = train_test_split(X, y, train_size=0.8, stratify=y, random_state=42)
-
     # Join X an y
     df = pd.concat([y, X], axis=1)
     df.rename(columns={0:target_name}, inplace=True)
 
+    # Split into train/test dataset
+    if memmap and not sparse:
+        # split row positions, train/test are views over one memory-mapped matrix
+        train_index, test_index = train_test_split(np.arange(len(X)), train_size=0.8, stratify=y, random_state=seed)
+        X, X_train, X_test = memmap_train_test(X, train_index, test_index)
+        y_train, y_test = y.iloc[train_index], y.iloc[test_index]
+        # X rows are in train + test order, y and df follow the same order
+        order = np.concatenate([train_index, test_index])
+        y, df = y.iloc[order], df.iloc[order]
+    else:
+        X_train, X_test, y_train, y_test = train_test_split(X, y, train_size=0.8, stratify=y, random_state=seed)
+
     # Build dictionary with all variables to return
     results = {
         'X' : X, 'y' : y, 
@@ -369,20 +810,361 @@ def prepare_sample_data(dataset_name, target_name, add_noise=True):
         'target_name' : target_name,
         'X_train' : X_train, 'X_test' : X_test, 
         'y_train' : y_train, 'y_test' : y_test,
-        'df' : df
+        'df' : df,
+        'memory' : memory
     }
 
     return results  
 
+# Folder for the memory-mapped feature matrices
+MEMMAP_DIR = '.feature_cache'
+# Rows written per block when creating a memory-mapped matrix
+MEMMAP_BLOCK_SIZE = 50_000
+# Number of matrices kept in MEMMAP_DIR, least recently used files are removed first
+MEMMAP_CACHE_FILES = 8
+
+# Keep the max_files most recently modified files of folder (ending with suffix), remove the others
+# Files removed meanwhile by another process are skipped, files that can't be removed are kept
+# (on Linux a matrix still mapped by a session stays readable until it is released, Windows refuses)
+def remove_oldest_files(folder, max_files, suffix=''):
+    files = []
+    for name in os.listdir(folder):
+        try:
+            if name.endswith(suffix):
+                files.append((os.path.getmtime(os.path.join(folder, name)), name))
+        except FileNotFoundError:
+            pass
+    for _, name in sorted(files)[:-max_files]:
+        try:
+            os.remove(os.path.join(folder, name))
+        except OSError:
+            pass
+
+# Write a numeric feature matrix once to disk and return memory-mapped train/test views
+def memmap_train_test(X, train_index, test_index, folder=MEMMAP_DIR, dtype='float64', max_files=MEMMAP_CACHE_FILES):
+    '''
+    Materialize X as a `.npy` file opened with `mmap_mode='r'`.\n
+    Rows are written in train + test order, so X_train and X_test are slices
+    (views) of the same mapping, not copies. The file name is a hash of the
+    data and of the split, every session/process using the same data shares
+    one physical copy through the OS page cache. Only the `max_files` most
+    recently used matrices are kept in `folder`.\n
+    \nReturns\n---\n
+    - X : `pd.DataFrame`, full matrix (train rows first)  
+    - X_train, X_test : `pd.DataFrame`, views over the memory-mapped matrix  
+    '''
+    order = np.concatenate([train_index, test_index])
+    file_path = os.path.join(folder, f'{get_data_hash(X, order)}.npy')
+
+    # a matrix already written is reused and marked as recently used
+    try:
+        os.utime(file_path)
+    # write the matrix in blocks, to a temporary file renamed when complete
+    except FileNotFoundError:
+        os.makedirs(folder, exist_ok=True)
+        temp_path = f'{file_path}.{os.getpid()}.tmp'
+        matrix = np.lib.format.open_memmap(temp_path, mode='w+', dtype=dtype, shape=(len(order), X.shape[1]))
+        for start in range(0, len(order), MEMMAP_BLOCK_SIZE):
+            block = order[start:start + MEMMAP_BLOCK_SIZE]
+            matrix[start:start + len(block)] = X.iloc[block].to_numpy(dtype=dtype)
+        matrix.flush()
+        del matrix
+        os.replace(temp_path, file_path)
+        remove_oldest_files(folder, max_files, suffix='.npy')
+
+    matrix = np.load(file_path, mmap_mode='r')
+    n_train = len(train_index)
+    X_full = pd.DataFrame(matrix, index=X.index[order], columns=X.columns, copy=False)
+    X_train = pd.DataFrame(matrix[:n_train], index=X.index[train_index], columns=X.columns, copy=False)
+    X_test = pd.DataFrame(matrix[n_train:], index=X.index[test_index], columns=X.columns, copy=False)
+
+    return X_full, X_train, X_test
+
+# Default number of rows read per chunk
+CSV_CHUNK_SIZE = 100_000
+# Text columns with a ratio of unique values below this threshold are stored as category
+CATEGORY_RATIO = 0.5
+
+# Select text columns with low cardinality, from a sample of rows
+def infer_category_columns(sample, category_ratio=CATEGORY_RATIO):
+    text_columns = sample.select_dtypes(include='object').columns
+    return [column for column in text_columns
+            if sample[column].nunique(dropna=True) <= category_ratio * max(len(sample), 1)]
+
+# Convert columns to compact dtypes: category for low cardinality text, downcasted ints/floats
+# Floats are only downcasted when float32 holds their values exactly, unless downcast_floats (lossy) is set
+def downcast_dataframe(df, category_columns=(), downcast_floats=False):
+    for column in df.columns:
+        if column in category_columns:
+            df[column] = df[column].astype('category')
+        elif pd.api.types.is_integer_dtype(df[column]):
+            df[column] = pd.to_numeric(df[column], downcast='integer')
+        elif pd.api.types.is_float_dtype(df[column]):
+            values = pd.to_numeric(df[column], downcast='float')
+            if downcast_floats or values.dtype == df[column].dtype or \
+                    np.array_equal(values.to_numpy(dtype=np.float64), df[column].to_numpy(), equal_nan=True):
+                df[column] = values
+    return df
+
+# Categories of a category column as object dtype
+# Chunks where a column is all NaN (or all numbers) have float/int categories, union_categoricals needs one dtype
+def to_object_categories(values):
+    if pd.api.types.is_object_dtype(values.cat.categories):
+        return values
+    return values.cat.set_categories(values.cat.categories.astype(object))
+
+# Concatenate chunks, merging the categories of each category column
+def concat_chunks(chunks, category_columns=()):
+    columns = chunks[0].columns
+    df = pd.concat([chunk.drop(columns=category_columns) for chunk in chunks], ignore_index=True)
+    for column in category_columns:
+        df[column] = pd.api.types.union_categoricals([to_object_categories(chunk[column]) for chunk in chunks],
+                                                    ignore_order=True)
+    return df[columns]
+
+# Read a csv file in chunks, with compact dtypes and optional row cap or random sample
+def read_csv_optimized(file, chunksize=CSV_CHUNK_SIZE, max_rows=None, sample_size=None,
+                    category_ratio=CATEGORY_RATIO, downcast_floats=False, random_state=42, **kwargs):
+    '''
+    Stream a csv file into a DataFrame with compact dtypes.\n
+    Category columns are inferred from the first chunk, numeric columns are
+    downcasted chunk by chunk, so the full float64/object frame never exists in memory.
+    Values are unchanged: floats are only downcasted when float32 is exact.\n
+    - max_rows : `int`, stop reading after this number of rows  
+    - sample_size : `int`, keep a uniform random sample of this size from the whole file  
+    - downcast_floats : `bool`, downcast every float column to float32 (lossy)  
+    '''
+    rng = np.random.default_rng(random_state)
+    category_columns = None
+    chunks, sample, sample_keys = [], None, None
+    n_rows = 0
+
+    for chunk in pd.read_csv(file, chunksize=chunksize, **kwargs):
+        # row cap
+        if max_rows:
+            chunk = chunk.iloc[:max_rows - n_rows]
+        n_rows += len(chunk)
+        # infer dtypes from the first chunk
+        if category_columns is None:
+            category_columns = infer_category_columns(chunk, category_ratio)
+        chunk = downcast_dataframe(chunk, category_columns, downcast_floats)
+
+        # random sample: keep the rows with the smallest random keys (bottom-k reservoir)
+        if sample_size:
+            keys = rng.random(len(chunk))
+            if sample is not None:
+                chunk = concat_chunks([sample, chunk], category_columns)
+                keys = np.concatenate([sample_keys, keys])
+            keep = np.sort(np.argsort(keys, kind='stable')[:sample_size])
+            sample, sample_keys = chunk.iloc[keep].reset_index(drop=True), keys[keep]
+        else:
+            chunks.append(chunk)
+
+        if max_rows and n_rows >= max_rows:
+            break
+
+    if sample is not None:
+        return sample
+    if not chunks:
+        return pd.DataFrame()
+    return concat_chunks(chunks, category_columns)
+
+# Total memory used by a DataFrame, in bytes
+def get_memory_usage(df):
+    return int(df.memory_usage(deep=True).sum())
+
+# Format a number of bytes to a readable string
+def format_bytes(n_bytes):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(n_bytes) < 1024:
+            return f'{n_bytes:.1f} {unit}'
+        n_bytes /= 1024
+    return f'{n_bytes:.1f} TB'
+
 # Read file from user input
-def read_upload_file(file):
-    # read with pandas
-    df = pd.read_csv(file, encoding='utf-8')
+# Parsed files are cached by content and read options, so reruns don't parse the file again
+def read_upload_file(file, max_rows=None, sample_size=None):
+    key = ('upload', hashlib.md5(file.getbuffer()).hexdigest(), max_rows, sample_size)
+    df = lru_get(_dataset_cache, key)
+    if df is None:
+        file.seek(0)
+        # read with pandas, in chunks and with compact dtypes
+        df = read_csv_optimized(file, max_rows=max_rows, sample_size=sample_size, encoding='utf-8')
+        lru_put(_dataset_cache, key, df, maxsize=DATASET_CACHE_SIZE)
     # reorders the last column to the second position (target is usually in the first or last column)
     column_selector = df.columns[:-1].insert(1, df.columns[-1])
     return df, column_selector
 
 
+######################################################
+#                Estimator Registry
+######################################################
+
+# Estimators available in the app, by name:
+# - path: import path of the class, imported on first use
+# - type: 'Classification' or 'Regression'
+# - proba: has predict_proba
+# - n_jobs: parameter setting the number of cores/threads, None if not supported
+# - categorical: native support of categorical features
+# - encoded_labels: classes must be integer encoded (0..n_classes-1)
+# - partial_fit: can be trained chunk by chunk (out-of-core training), False if missing
+# - non_negative: features must be non-negative, False if missing
+# - booster: 'xgboost' or 'lightgbm', default params from BOOSTER_PARAMS, None if missing
+# - dense_only: sparse input is not supported, False if missing
+ESTIMATORS = {
+    'LogisticRegression' : {'path' : 'sklearn.linear_model.LogisticRegression', 'type' : 'Classification',
+                            'proba' : True, 'n_jobs' : 'n_jobs', 'categorical' : False, 'encoded_labels' : False},
+    'RandomForestClassifier' : {'path' : 'sklearn.ensemble.RandomForestClassifier', 'type' : 'Classification',
+                                'proba' : True, 'n_jobs' : 'n_jobs', 'categorical' : False, 'encoded_labels' : False},
+    'GradientBoostingClassifier' : {'path' : 'sklearn.ensemble.GradientBoostingClassifier', 'type' : 'Classification',
+                                    'proba' : True, 'n_jobs' : None, 'categorical' : False, 'encoded_labels' : False},
+    'AdaBoostClassifier' : {'path' : 'sklearn.ensemble.AdaBoostClassifier', 'type' : 'Classification',
+                            'proba' : True, 'n_jobs' : None, 'categorical' : False, 'encoded_labels' : False},
+    # Uses all cores through OpenMP, there is no n_jobs parameter
+    'HistGradientBoostingClassifier' : {'path' : 'sklearn.ensemble.HistGradientBoostingClassifier', 'type' : 'Classification',
+                                        'proba' : True, 'n_jobs' : None, 'categorical' : True, 'encoded_labels' : False,
+                                        'dense_only' : True},
+    'LGBMClassifier' : {'path' : 'lightgbm.LGBMClassifier', 'type' : 'Classification',
+                        'proba' : True, 'n_jobs' : 'n_jobs', 'categorical' : True, 'encoded_labels' : False,
+                        'booster' : 'lightgbm'},
+    'SVC' : {'path' : 'sklearn.svm.SVC', 'type' : 'Classification',
+            'proba' : False, 'n_jobs' : None, 'categorical' : False, 'encoded_labels' : False},
+    'XGBClassifier' : {'path' : 'xgboost.XGBClassifier', 'type' : 'Classification',
+                        'proba' : True, 'n_jobs' : 'n_jobs', 'categorical' : True, 'encoded_labels' : True,
+                        'booster' : 'xgboost'},
+    # predict_proba depends on the loss (log_loss, modified_huber)
+    'SGDClassifier' : {'path' : 'sklearn.linear_model.SGDClassifier', 'type' : 'Classification',
+                        'proba' : False, 'n_jobs' : 'n_jobs', 'categorical' : False, 'encoded_labels' : False,
+                        'partial_fit' : True},
+    'MultinomialNB' : {'path' : 'sklearn.naive_bayes.MultinomialNB', 'type' : 'Classification',
+                        'proba' : True, 'n_jobs' : None, 'categorical' : False, 'encoded_labels' : False,
+                        'partial_fit' : True, 'non_negative' : True},
+    'LinearRegression' : {'path' : 'sklearn.linear_model.LinearRegression', 'type' : 'Regression',
+                        'proba' : False, 'n_jobs' : 'n_jobs', 'categorical' : False, 'encoded_labels' : False},
+    'RandomForestRegressor' : {'path' : 'sklearn.ensemble.RandomForestRegressor', 'type' : 'Regression',
+                                'proba' : False, 'n_jobs' : 'n_jobs', 'categorical' : False, 'encoded_labels' : False},
+    'HistGradientBoostingRegressor' : {'path' : 'sklearn.ensemble.HistGradientBoostingRegressor', 'type' : 'Regression',
+                                        'proba' : False, 'n_jobs' : None, 'categorical' : True, 'encoded_labels' : False,
+                                        'dense_only' : True},
+    'LGBMRegressor' : {'path' : 'lightgbm.LGBMRegressor', 'type' : 'Regression',
+                        'proba' : False, 'n_jobs' : 'n_jobs', 'categorical' : True, 'encoded_labels' : False,
+                        'booster' : 'lightgbm'},
+    'SVR' : {'path' : 'sklearn.svm.SVR', 'type' : 'Regression',
+            'proba' : False, 'n_jobs' : None, 'categorical' : False, 'encoded_labels' : False},
+    'XGBRegressor' : {'path' : 'xgboost.XGBRegressor', 'type' : 'Regression',
+                    'proba' : False, 'n_jobs' : 'n_jobs', 'categorical' : True, 'encoded_labels' : False,
+                    'booster' : 'xgboost'},
+    'SGDRegressor' : {'path' : 'sklearn.linear_model.SGDRegressor', 'type' : 'Regression',
+                    'proba' : False, 'n_jobs' : None, 'categorical' : False, 'encoded_labels' : False,
+                    'partial_fit' : True},
+}
+
+# Import a module, or one of its attributes, on first use
+# Optional backends (xgboost, lightgbm, shap, eli5) are only loaded by the pages that use them
+def lazy_import(module_name, attribute=None):
+    module = importlib.import_module(module_name)
+    return getattr(module, attribute) if attribute else module
+
+# Check if the package of an estimator is installed, without importing it
+def is_estimator_available(name):
+    package = ESTIMATORS[name]['path'].split('.')[0]
+    return importlib.util.find_spec(package) is not None
+
+# Names of the installed estimators of a problem type, filtered by capabilities (e.g. proba=True)
+# Used as sidebar options, in registry order
+def list_estimators(problem_type=None, **capabilities):
+    return [name for name, spec in ESTIMATORS.items()
+            if problem_type in (None, spec['type'])
+            and all(spec.get(key, False) == value for key, value in capabilities.items())
+            and is_estimator_available(name)]
+
+# Estimator class from its registry name, imported on first use
+def get_estimator(name):
+    module_name, class_name = ESTIMATORS[name]['path'].rsplit('.', 1)
+    return lazy_import(module_name, class_name)
+
+# XGBoost tree method: 'hist' bins features once (max_bin quantiles) and builds trees from histograms,
+# 'approx' re-sketches the bins every iteration, 'exact' enumerates all split points (no categorical support)
+XGB_TREE_METHOD = 'hist'
+# Maximum number of bins per feature of the histogram tree methods (XGBoost hist, LightGBM)
+BOOSTER_MAX_BIN = 256
+# Threads used by XGBoost/LightGBM, -1 uses all cores
+BOOSTER_THREADS = -1
+# Default params of the boosters, used when they are not set by the user
+BOOSTER_PARAMS = {
+    'xgboost' : {'tree_method' : XGB_TREE_METHOD, 'max_bin' : BOOSTER_MAX_BIN},
+    'lightgbm' : {'max_bin' : BOOSTER_MAX_BIN},
+}
+
+# Estimator params: params chosen by the user, training on all cores where supported if n_jobs is not set
+# Boosters get BOOSTER_PARAMS for the params that are not set
+def get_estimator_params(name, params=None, n_jobs=-1):
+    params = dict(params or {})
+    n_jobs_param = ESTIMATORS[name]['n_jobs']
+    if n_jobs_param and params.get(n_jobs_param) is None:
+        params[n_jobs_param] = n_jobs
+    for key, value in BOOSTER_PARAMS.get(ESTIMATORS[name].get('booster'), {}).items():
+        if params.get(key) is None:
+            params[key] = value
+    return params
+
+# Create an estimator from its registry name
+def make_estimator(name, params=None, **kwargs):
+    return get_estimator(name)(**get_estimator_params(name, params), **kwargs)
+
+
+######################################################
+#                   Booster Data
+######################################################
+# Native XGBoost datasets, built once per split and cached across reruns:
+# building (and quantizing) a DMatrix costs more than predicting with it
+
+# Categorical columns as integer codes (NaN for missing values), numeric columns unchanged
+# Encoded before the train/test split so both splits share the codes; the boosters split
+# these columns as categories (see get_xgb_data) instead of one-hot columns
+def encode_categorical_codes(X):
+    X = X.copy()
+    categorical_features = X.select_dtypes(exclude=np.number).columns.tolist()
+    for column in categorical_features:
+        codes = X[column].astype('category').cat.codes
+        X[column] = codes.where(codes >= 0).astype(np.float32)
+    return X, categorical_features
+
+# Feature types of a DMatrix: 'c' for categorical columns, 'q' for numeric ones
+def get_feature_types(X, categorical_features=()):
+    return ['c' if column in categorical_features else 'q' for column in X.columns]
+
+# DMatrix of a split for xgboost.train/Booster.predict, cached by data, split and settings
+# With the hist method, QuantileDMatrix (xgboost >= 1.7) keeps the quantized features only; a test
+# split uses the bins of its train split (reference), so it must be built after it
+def get_xgb_data(X, y=None, split='train', categorical_features=(), reference=None,
+                tree_method=XGB_TREE_METHOD, max_bin=BOOSTER_MAX_BIN, n_threads=BOOSTER_THREADS):
+    key = (get_data_hash(X) if y is None else get_data_hash(X, y), split, tuple(categorical_features), tree_method, max_bin)
+    data = lru_get(_booster_data_cache, key)
+    if data is not None:
+        return data
+    xgb = lazy_import('xgboost')
+    # One conversion to a float32 array (CSR for sparse one-hot frames), the DataFrame is not read again
+    data_params = {'label' : y, 'feature_names' : list(X.columns), 'nthread' : n_threads,
+                'feature_types' : get_feature_types(X, categorical_features),
+                'enable_categorical' : bool(categorical_features)}
+    values = X.sparse.to_coo().tocsr().astype(np.float32) if is_sparse_frame(X) else X.to_numpy(dtype=np.float32)
+    if tree_method == 'hist' and hasattr(xgb, 'QuantileDMatrix'):
+        data = xgb.QuantileDMatrix(values, max_bin=max_bin, ref=reference, **data_params)
+    else:
+        data = xgb.DMatrix(values, **data_params)
+    return lru_put(_booster_data_cache, key, data, maxsize=BOOSTER_DATA_CACHE_SIZE)
+
+# Predictions of a native XGBoost booster on a cached split, cached like get_predictions
+def get_booster_predictions(booster, X, fingerprint, split, **data_params):
+    key = (fingerprint, split)
+    predictions = lru_get(_predictions_cache, key)
+    if predictions is None:
+        y_pred = booster.predict(get_xgb_data(X, split=split, **data_params))
+        predictions = lru_put(_predictions_cache, key, {'y_pred' : y_pred, 'y_proba' : None}, maxsize=METRICS_CACHE_SIZE)
+    return predictions
+
+
 ######################################################
 #             Machine Learning Functions
 ######################################################
@@ -419,15 +1201,62 @@ def create_confusion_matrix(y_true, y_pred, target_labels, name):
     # Return PX figure to st.plotly_chart()
     return fig
 
+# Maximum number of points of each curve sent to Plotly
+CURVE_MAX_POINTS = 200
+# Curve simplification method: 'grid' (fixed x grid interpolation) or 'rdp' (Ramer-Douglas-Peucker)
+CURVE_METHOD = 'rdp'
+
+# Keep the max_points points of a curve that best preserve its shape (Ramer-Douglas-Peucker with a point budget)
+def rdp_simplify(x, y, max_points):
+    # distance of the points between i and j to the segment (i, j)
+    def max_distance(i, j):
+        if j - i < 2:
+            return 0.0, None
+        dx, dy = x[j] - x[i], y[j] - y[i]
+        distances = np.abs(dy * (x[i+1:j] - x[i]) - dx * (y[i+1:j] - y[i])) / (np.hypot(dx, dy) or 1.0)
+        k = int(np.argmax(distances))
+        return distances[k], i + 1 + k
+
+    keep = [0, len(x) - 1]
+    distance, k = max_distance(0, len(x) - 1)
+    # split the segment with the farthest point first, until the budget is reached
+    heap = [(-distance, 0, len(x) - 1, k)]
+    while heap and len(keep) < max_points:
+        distance, i, j, k = heapq.heappop(heap)
+        if k is None or distance == 0:
+            break
+        keep.append(k)
+        for start, end in ((i, k), (k, j)):
+            distance, middle = max_distance(start, end)
+            heapq.heappush(heap, (-distance, start, end, middle))
+    keep = np.sort(keep)
+    return x[keep], y[keep]
+
+# Reduce the number of points of a curve, only for rendering (scores use the full curve)
+def simplify_curve(x, y, max_points=CURVE_MAX_POINTS, method=CURVE_METHOD):
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    if not max_points or len(x) <= max_points:
+        return x, y
+    if method == 'rdp':
+        return rdp_simplify(x, y, max_points)
+    # fixed grid over x, np.interp needs increasing x values (recall is decreasing)
+    if x[0] > x[-1]:
+        x, y = x[::-1], y[::-1]
+    x_grid = np.linspace(x[0], x[-1], max_points)
+    return x_grid, np.interp(x_grid, x, y)
+
 # Generate a Plotly figure to plot ROC curve for binary classification
-def plot_binary_roc_auc(y_true, y_score):
+def plot_binary_roc_auc(y_true, y_score, max_points=CURVE_MAX_POINTS):
         
     fpr, tpr, _ = roc_curve(y_true, y_score)
+    # AUC on the full curve, plot a simplified one
+    roc_auc = auc(fpr, tpr)
+    fpr, tpr = simplify_curve(fpr, tpr, max_points)
 
     # Draw area under the curve
     fig = px.area(
         x=fpr, y=tpr,
-        title=f'ROC Curve (AUC={auc(fpr, tpr):.4f})',
+        title=f'ROC Curve (AUC={roc_auc:.4f})',
         labels=dict(x='False Positive Rate', y='True Positive Rate'),
         width=700, height=500
     )
@@ -442,10 +1271,60 @@ def plot_binary_roc_auc(y_true, y_score):
 
     return fig
 
+# Maximum number of points interpolated at once for the macro ROC curve
+INTERP_BLOCK_SIZE = 2 ** 22
+
+# ROC curves for every column of a score matrix, computed in one NumPy pass
+def batch_roc_curves(y_true, y_scores):
+    '''
+    Calculate ROC curves for all columns at once\n
+    Each column is sorted once, TP/FP counts are cumulative sums over the
+    sorted labels, and tied scores are moved to the end of their tie group
+    (as `roc_curve` does), so every column is a valid curve of n+1 points.\n
+    - y_true : `np.ndarray`, (n_samples, n_curves) binary labels  
+    - y_scores : `np.ndarray`, (n_samples, n_curves) scores  
+    \nReturn\n---\n 
+    - fpr, tpr : `np.ndarray`, (n_samples + 1, n_curves) non-decreasing rates  
+    - roc_auc : `np.ndarray`, (n_curves,) ROC AUC scores  
+    '''
+    n_samples, n_curves = y_scores.shape
+    # work on one contiguous row per curve
+    y_scores, y_true = np.ascontiguousarray(y_scores.T), np.ascontiguousarray(y_true.T)
+    positions = np.arange(n_samples)
+    # sort each curve by descending score
+    order = np.argsort(-y_scores, axis=1)
+    scores_sorted = np.take_along_axis(y_scores, order, axis=1)
+    tps = np.cumsum(np.take_along_axis(y_true, order, axis=1), axis=1, dtype=float)
+    fps = positions + 1 - tps
+    # replace each position of a tie group with the counts at the end of the group
+    is_end = np.ones((n_curves, n_samples), dtype=bool)
+    is_end[:, :-1] = scores_sorted[:, :-1] != scores_sorted[:, 1:]
+    end_index = np.minimum.accumulate(np.where(is_end, positions, n_samples)[:, ::-1], axis=1)[:, ::-1]
+    tps = np.take_along_axis(tps, end_index, axis=1)
+    fps = np.take_along_axis(fps, end_index, axis=1)
+    # add (0, 0) and normalize
+    zeros = np.zeros((n_curves, 1))
+    tps, fps = np.hstack([zeros, tps]), np.hstack([zeros, fps])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tpr, fpr = tps / tps[:, -1:], fps / fps[:, -1:]
+    # trapezoidal rule along each curve
+    roc_auc = np.sum(np.diff(fpr, axis=1) * (tpr[:, 1:] + tpr[:, :-1]) / 2, axis=1)
+    return fpr.T, tpr.T, roc_auc
+
+# Remove points that don't change the shape of a curve (repeated or collinear), like drop_intermediate in roc_curve
+# Rates are ratios of counts, differences below tol are rounding errors
+def drop_intermediate_points(x, y, tol=1e-12):
+    keep = np.ones(len(x), dtype=bool)
+    keep[1:-1] = (np.abs(np.diff(x, 2)) > tol) | (np.abs(np.diff(y, 2)) > tol)
+    return x[keep], y[keep]
+
 # Calculate metrics for multiple classification problem
 def calculate_roc_auc_multiclass(y_true, y_scores, model):
     '''
     Calculate FPR, TPR and ROC AUC score for a multiclass problem\n
+    Per class, micro and macro curves are derived from `batch_roc_curves`,
+    see `benchmarks/bench_roc_auc_multiclass.py` for a comparison with the
+    previous per-class `roc_curve` loop.
     
     \nReturn\n---\n 
     - fpr : False positive rate  
@@ -454,43 +1333,46 @@ def calculate_roc_auc_multiclass(y_true, y_scores, model):
     '''
     # Encode labels
     y_onehot = label_binarize(y_true, classes=model.classes_)
+    y_scores = np.asarray(y_scores, dtype=float)
     # Number of classes
-    n_classes = len(model.classes_)
+    n_classes = y_scores.shape[1]
+    # Get FP/TP and ROC AUC Score for all classes at once
+    fpr_matrix, tpr_matrix, auc_values = batch_roc_curves(y_onehot, y_scores)
     # dictionary instances
-    fpr = dict(); tpr = dict(); roc_auc = dict();
-    # Get FP/TP and ROC AUC Score for each class
-    for i in range(y_scores.shape[1]):
-        y_true = y_onehot[:, i]
-        y_score = y_scores[:, i]
-        # false positives and true positives
-        fpr[i], tpr[i], _ = roc_curve(y_true, y_score)
-        # roc auc score
-        roc_auc[i] = roc_auc_score(y_true, y_score)
+    fpr = dict(); tpr = dict(); roc_auc = dict(enumerate(auc_values));
+    for i in range(n_classes):
+        fpr[i], tpr[i] = drop_intermediate_points(fpr_matrix[:, i], tpr_matrix[:, i])
 
     # Compute micro-average ROC curve and ROC area from prediction scores
-    fpr['micro'], tpr['micro'], _ = roc_curve(y_onehot.ravel(), y_scores.ravel())
-    roc_auc['micro'] = auc(fpr['micro'], tpr['micro'])
+    fpr_micro, tpr_micro, auc_micro = batch_roc_curves(y_onehot.reshape(-1, 1), y_scores.reshape(-1, 1))
+    fpr['micro'], tpr['micro'] = drop_intermediate_points(fpr_micro[:, 0], tpr_micro[:, 0])
+    roc_auc['micro'] = auc_micro[0]
 
     # Aggregate all false positive rates
     all_fpr = np.unique(np.concatenate([fpr[i] for i in range(n_classes)]))
 
-    # Interpolate all ROC curves at this points
+    # Interpolate all ROC curves at this points, one np.interp call per block of classes:
+    # curve i is shifted by 2*i, so the curves of a block form one increasing x axis
+    offsets = 2 * np.arange(n_classes)
+    xp = np.concatenate([fpr[i] + offsets[i] for i in range(n_classes)])
+    fp = np.concatenate([tpr[i] for i in range(n_classes)])
     mean_tpr = np.zeros_like(all_fpr)
-    for i in range(n_classes):
-        mean_tpr += np.interp(all_fpr, fpr[i], tpr[i])
+    block_size = max(1, INTERP_BLOCK_SIZE // len(all_fpr))
+    for start in range(0, n_classes, block_size):
+        block = offsets[start:start + block_size]
+        mean_tpr += np.interp((all_fpr[None, :] + block[:, None]).ravel(), xp, fp).reshape(len(block), -1).sum(axis=0)
 
     # Average it and compute AUC
-    mean_tpr /= n_classes
     fpr['macro'] = all_fpr
-    tpr['macro'] = mean_tpr
+    tpr['macro'] = mean_tpr / n_classes
     roc_auc['macro'] = auc(fpr['macro'], tpr['macro'])
 
     return fpr, tpr, roc_auc
 
 # Generate a Plotly figure to plot ROC curve for multiclass
-def plot_multiclass_roc_auc(y_true, y_scores, model, target_labels):
+def plot_multiclass_roc_auc(y_true, y_scores, model, target_labels, max_points=CURVE_MAX_POINTS):
 
-    # get values
+    # get values, AUC is calculated on the full curves
     fpr, tpr, roc_auc = calculate_roc_auc_multiclass(y_true, y_scores, model)
     labels = model.classes_
     # Create an empty figure, and iteratively add new lines
@@ -501,7 +1383,8 @@ def plot_multiclass_roc_auc(y_true, y_scores, model, target_labels):
     # Add new line for each class
     for label_index in labels:
         name = f'{target_labels[label_index]} (AUC={roc_auc[label_index]:.2f})'
-        fig.add_trace(go.Scatter(x=fpr[label_index], y=tpr[label_index], name=name, mode='lines'))
+        x, y = simplify_curve(fpr[label_index], tpr[label_index], max_points)
+        fig.add_trace(go.Scatter(x=x, y=y, name=name, mode='lines'))
         
     # Customize layout
     fig.update_layout(
@@ -514,26 +1397,109 @@ def plot_multiclass_roc_auc(y_true, y_scores, model, target_labels):
 
     return fig
 
+# Generate a Plotly figure to plot Precision-Recall curve for binary classification
+def plot_binary_precision_recall(y_true, y_score, max_points=CURVE_MAX_POINTS):
+
+    precision, recall, _ = precision_recall_curve(y_true, y_score)
+    # Average precision on the full curve, plot a simplified one
+    average_precision = average_precision_score(y_true, y_score)
+    recall, precision = simplify_curve(recall, precision, max_points)
+
+    fig = px.area(
+        x=recall, y=precision,
+        title=f'Precision-Recall Curve (AP={average_precision:.4f})',
+        labels=dict(x='Recall', y='Precision'),
+        width=700, height=500
+    )
+    fig.update_yaxes(range=[0, 1.05])
+    fig.update_xaxes(constrain='domain')
+
+    return fig
+
+# Generate a Plotly figure to plot Precision-Recall curve for multiclass (one vs rest)
+def plot_multiclass_precision_recall(y_true, y_scores, model, target_labels, max_points=CURVE_MAX_POINTS):
+
+    y_onehot = label_binarize(y_true, classes=model.classes_)
+    fig = go.Figure()
+
+    # Add new line for each class
+    for i, label_index in enumerate(model.classes_):
+        precision, recall, _ = precision_recall_curve(y_onehot[:, i], y_scores[:, i])
+        average_precision = average_precision_score(y_onehot[:, i], y_scores[:, i])
+        name = f'{target_labels[label_index]} (AP={average_precision:.2f})'
+        x, y = simplify_curve(recall, precision, max_points)
+        fig.add_trace(go.Scatter(x=x, y=y, name=name, mode='lines'))
+
+    fig.update_layout(
+        xaxis_title='Recall',
+        yaxis_title='Precision',
+        yaxis=dict(range=[0, 1.05]),
+        xaxis=dict(constrain='domain'),
+        width=700, height=500
+    )
+
+    return fig
+
+# One inference pass over X: probabilities when available, predictions derived with argmax
+def predict_split(model, X):
+    if hasattr(model, 'predict_proba'):
+        y_proba = model.predict_proba(X)
+        y_pred = model.classes_[np.argmax(y_proba, axis=1)]
+    else:
+        y_proba = None
+        y_pred = model.predict(X)
+    return {'y_pred' : y_pred, 'y_proba' : y_proba}
+
+# predict_split results, cached by model fingerprint and split name
+def get_predictions(model, X, fingerprint=None, split=None):
+    if fingerprint is None:
+        return predict_split(model, X)
+    key = (fingerprint, split)
+    predictions = lru_get(_predictions_cache, key)
+    if predictions is None:
+        predictions = lru_put(_predictions_cache, key, predict_split(model, X), maxsize=METRICS_CACHE_SIZE)
+    return predictions
+
+# Train/test metrics and figures, cached by model fingerprint
+def compute_metrics(model, X_train, X_test, y_train, y_test, target_labels, fingerprint=None, max_points=CURVE_MAX_POINTS):
+    key = (fingerprint, max_points)
+    metrics = lru_get(_metrics_cache, key) if fingerprint else None
+    if metrics is None:
+        metrics = {
+            split : calculate_metrics(X, y_true, model, target_labels, split_type=split,
+                                    predictions=get_predictions(model, X, fingerprint, split),
+                                    max_points=max_points)
+            for split, X, y_true in (('Train', X_train, y_train), ('Test', X_test, y_test))
+        }
+        if fingerprint:
+            lru_put(_metrics_cache, key, metrics, maxsize=METRICS_CACHE_SIZE)
+    return metrics['Train'], metrics['Test']
+
 # This is the 'main metrics' function, which calls all the above
 # Calculate all metrics and figure objects for classification problem (binary/multiclass)
-def calculate_metrics(X, y_true, model, target_labels, split_type):
+# Predictions (from predict_split) are computed once and shared by every metric and figure
+def calculate_metrics(X, y_true, model, target_labels, split_type, predictions=None, max_points=CURVE_MAX_POINTS):
 
     # Predictions
-    y_pred = model.predict(X)
+    if predictions is None:
+        predictions = predict_split(model, X)
+    y_pred = predictions['y_pred']
 
     # Proba scores, ROC AUC score, F1 score, ROC curve
     # Binary classification
     if len(target_labels) < 3: 
-        y_proba = model.predict_proba(X)[:,1]
+        y_proba = predictions['y_proba'][:,1]
         roc_auc_score_ = roc_auc_score(y_true, y_proba, multi_class="raise")
         f1_score_ = f1_score(y_true, y_pred, average="binary")
-        roc_curve_fig = plot_binary_roc_auc(y_true, y_proba)
+        roc_curve_fig = plot_binary_roc_auc(y_true, y_proba, max_points)
+        pr_curve_fig = plot_binary_precision_recall(y_true, y_proba, max_points)
     # Multiclass
     else:   
-        y_proba = model.predict_proba(X)
+        y_proba = predictions['y_proba']
         roc_auc_score_ = roc_auc_score(y_true, y_proba, multi_class="ovr")
         f1_score_ = f1_score(y_true, y_pred, average="weighted")
-        roc_curve_fig = plot_multiclass_roc_auc(y_true, y_proba, model, target_labels)
+        roc_curve_fig = plot_multiclass_roc_auc(y_true, y_proba, model, target_labels, max_points)
+        pr_curve_fig = plot_multiclass_precision_recall(y_true, y_proba, model, target_labels, max_points)
     
     # Confusion Matrix
     cf_matrix_fig = create_confusion_matrix(y_true, y_pred, target_labels, name=split_type)
@@ -546,27 +1512,723 @@ def calculate_metrics(X, y_true, model, target_labels, split_type):
         'f1_score_' : f1_score_,
         'cf_matrix_fig' : cf_matrix_fig,
         'roc_curve_fig' : roc_curve_fig,
+        'pr_curve_fig' : pr_curve_fig,
     }
     return metrics_results
 
-# Fit model for sample data
-def fit_model(model, X, y):
+# Score predictions of a fitted model: ROC AUC/F1 for classification, R2/MAE/MSE for regression
+def score_model(model, X, y_true):
+    if not is_classifier(model):
+        y_pred = model.predict(X)
+        return {metric.__name__ : metric(y_true, y_pred) for metric in [r2_score, mean_absolute_error, mean_squared_error]}
+
+    predictions = predict_split(model, X)
+    y_pred, y_proba = predictions['y_pred'], predictions['y_proba']
+    # Binary classification
+    if y_proba.shape[1] < 3:
+        return {
+            'roc_auc_score' : roc_auc_score(y_true, y_proba[:,1]),
+            'f1_score' : f1_score(y_true, y_pred, average='binary'),
+        }
+    # Multiclass
+    return {
+        'roc_auc_score' : roc_auc_score(y_true, y_proba, multi_class='ovr', labels=model.classes_),
+        'f1_score' : f1_score(y_true, y_pred, average='weighted'),
+    }
+
+# Fit a copy of the model on one fold and score it on the held out rows
+def fit_score_fold(model, X, y, train_index, test_index, fold):
+    model = clone(model)
+    start_time = datetime.now()
+    model.fit(X.iloc[train_index], y.iloc[train_index])
+    fit_time = (datetime.now() - start_time).total_seconds()
+    scores = score_model(model, X.iloc[test_index], y.iloc[test_index])
+    return {'fold' : fold, **scores, 'fit_time' : fit_time}
+
+# Run k-fold cross-validation in parallel, yielding the scores of each fold as soon as it finishes
+def cross_validate_folds(model, X, y, n_splits=5, n_jobs=-1, backend='loky', random_state=42):
+    '''
+    Parallel k-fold evaluation.\n
+    Folds are stratified for classifiers. Unlike `cross_validate`, which only
+    returns when every fold is done, this is a generator: each fold's scores
+    are yielded when its worker finishes, so they can be rendered while the
+    remaining folds are still running.
+    '''
+    if is_classifier(model):
+        cv = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=random_state)
+    else:
+        cv = KFold(n_splits=n_splits, shuffle=True, random_state=random_state)
+
+    tasks = (delayed(fit_score_fold)(model, X, y, train_index, test_index, fold)
+            for fold, (train_index, test_index) in enumerate(cv.split(X, y), start=1))
+    yield from Parallel(n_jobs=n_jobs, backend=backend, return_as='generator_unordered')(tasks)
+
+# Convert a search space spec into lists and scipy distributions for ParameterSampler
+def build_param_distributions(search_space):
+    '''
+    Search space spec, as returned by `configure_search_space`:\n
+    - list : options to sample from  
+    - ('int', low, high) : uniform integers in [low, high]  
+    - ('float', low, high, log) : uniform (or log-uniform) floats in [low, high]  
+    '''
+    param_distributions = {}
+    for key, value in search_space.items():
+        if isinstance(value, tuple) and value[0] == 'int':
+            param_distributions[key] = randint(value[1], value[2] + 1)
+        elif isinstance(value, tuple) and value[0] == 'float':
+            _, low, high, log = value
+            param_distributions[key] = loguniform(low, high) if log else uniform(low, high - low)
+        else:
+            param_distributions[key] = list(value)
+    return param_distributions
+
+# Prefix used to set params of the final estimator, for pipelines and OneVsRestClassifier
+def get_estimator_param_prefix(model):
+    prefix = ''
+    if isinstance(model, Pipeline):
+        prefix, model = 'estimator__', model.named_steps['estimator']
+    if isinstance(model, OneVsRestClassifier):
+        prefix += 'estimator__'
+    return prefix
+
+# Fit and score one candidate on one fold, failed fits are scored as NaN (like error_score=np.nan)
+def fit_score_candidate(model, params, X, y, train_index, test_index, candidate, fold):
     try:
-        # start timerasas
-        start_time =  datetime.now()
-        # fit model
+        model = clone(model).set_params(**params)
+        scores = fit_score_fold(model, X, y, train_index, test_index, fold)
+        # first metric after the fold number
+        score = list(scores.values())[1]
+    except (ValueError, TypeError) as error:
+        print(f'Candidate {candidate} failed: {error}')
+        score = np.nan
+    return candidate, fold, score
+
+# Randomized or successive-halving search, yielding a leaderboard each time a fit finishes
+def search_hyperparameters(model, search_space, X, y, method='halving', n_candidates=16, factor=3,
+                        cv=3, n_jobs=-1, backend='loky', random_state=42):
+    '''
+    Parallel hyperparameter search over `search_space`.\n
+    Every (candidate, fold) pair is a joblib task. With `method='halving'`,
+    candidates start with a small subsample of X and only the best 1/factor
+    of them move to the next round, with factor times more rows, so bad
+    configurations are stopped early. With `method='random'` all candidates
+    are evaluated once on all rows.\n
+    Yields `(leaderboard, best_params)` after every finished task, the score is
+    the first metric of `score_model` (ROC AUC or R2).
+    '''
+    prefix = get_estimator_param_prefix(model)
+    candidates = list(ParameterSampler(build_param_distributions(search_space), n_candidates, random_state=random_state))
+    candidates = [{prefix + key : value for key, value in params.items()} for params in candidates]
+    splitter = StratifiedKFold if is_classifier(model) else KFold
+
+    # rows used in each round
+    n_samples = len(X)
+    n_rounds = 1
+    if method == 'halving':
+        n_rounds = max(1, int(np.ceil(np.log(max(len(candidates), 1)) / np.log(factor))) + 1)
+    permutation = np.random.default_rng(random_state).permutation(n_samples)
+
+    leaderboard = pd.DataFrame({'params' : [str(params) for params in candidates], 'round' : 0,
+                                'n_samples' : 0, 'score' : np.nan, 'std' : np.nan})
+    alive = list(range(len(candidates)))
+
+    for round_ in range(n_rounds):
+        n_resources = min(n_samples, max(cv * 10, n_samples // factor ** (n_rounds - 1 - round_)))
+        rows = np.sort(permutation[:n_resources])
+        X_round, y_round = X.iloc[rows], y.iloc[rows]
+        folds = list(splitter(n_splits=cv, shuffle=True, random_state=random_state).split(X_round, y_round))
+
+        fold_scores = {candidate : [] for candidate in alive}
+        leaderboard.loc[alive, 'round'] = round_ + 1
+        leaderboard.loc[alive, 'n_samples'] = n_resources
+        tasks = (delayed(fit_score_candidate)(model, candidates[candidate], X_round, y_round,
+                                            train_index, test_index, candidate, fold)
+                for candidate in alive for fold, (train_index, test_index) in enumerate(folds))
+        for candidate, fold, score in Parallel(n_jobs=n_jobs, backend=backend, return_as='generator_unordered')(tasks):
+            fold_scores[candidate].append(score)
+            leaderboard.loc[candidate, 'score'] = np.mean(fold_scores[candidate])
+            leaderboard.loc[candidate, 'std'] = np.std(fold_scores[candidate])
+            # best candidate among the ones still running
+            best = leaderboard.loc[alive, 'score'].fillna(-np.inf).idxmax()
+            yield leaderboard.sort_values(['round', 'score'], ascending=False), candidates[best]
+
+        # keep the best candidates for the next round
+        if n_resources == n_samples or len(alive) == 1:
+            break
+        ranked = leaderboard.loc[alive, 'score'].fillna(-np.inf).sort_values(ascending=False)
+        alive = ranked.index[:max(1, int(np.ceil(len(alive) / factor)))].tolist()
+
+# Rows used to compute permutation importance (stratified by target), None uses all rows
+IMPORTANCE_SAMPLE_SIZE = 2000
+# Number of shuffles of each feature
+IMPORTANCE_REPEATS = 5
+
+# Select rows of a DataFrame, Series or array by position
+def take_rows(data, rows):
+    return data.iloc[rows] if hasattr(data, 'iloc') else data[rows]
+
+# Random sample of rows with the same target proportions, plain random sample if y can't be stratified
+def stratified_sample(X, y, sample_size, random_state=42):
+    if sample_size is None or sample_size >= len(y):
+        return X, y
+    try:
+        rows, _ = train_test_split(np.arange(len(y)), train_size=sample_size, stratify=y, random_state=random_state)
+    except ValueError:
+        # Regression targets or classes with a single row
+        rows = np.random.default_rng(random_state).choice(len(y), sample_size, replace=False)
+    rows = np.sort(rows)
+    return take_rows(X, rows), take_rows(y, rows)
+
+# Score of a fitted model, with model.score (accuracy/R2) when no scoring function is passed
+def importance_score(model, X, y, scoring=None):
+    return scoring(model, X, y) if scoring else model.score(X, y)
+
+# Scores of the model with one feature shuffled, n_repeats times
+def permutation_scores(model, X, y, column, n_repeats, random_state, scoring=None):
+    rng = np.random.default_rng(random_state)
+    X_permuted = X.copy()
+    scores = []
+    for _ in range(n_repeats):
+        if hasattr(X, 'iloc'):
+            X_permuted[X.columns[column]] = rng.permutation(X.iloc[:, column].to_numpy())
+        else:
+            X_permuted[:, column] = rng.permutation(X[:, column])
+        scores.append(importance_score(model, X_permuted, y, scoring))
+    return scores
+
+# Permutation importance of each feature: decrease of the score when the feature is shuffled
+# Features are shuffled in parallel (one task per feature), on a stratified sample of rows
+# Returns a DataFrame with feature, weight (mean decrease), std and confidence interval, sorted by weight
+def permutation_importance(model, X, y, sample_size=IMPORTANCE_SAMPLE_SIZE, n_repeats=IMPORTANCE_REPEATS,
+                            scoring=None, confidence=0.95, feature_names=None, n_jobs=-1, backend='loky', random_state=42):
+    X_sample, y_sample = stratified_sample(X, y, sample_size, random_state)
+    baseline = importance_score(model, X_sample, y_sample, scoring)
+    n_features = X.shape[1]
+    # Seed per feature, results don't depend on the order tasks finish
+    scores = Parallel(n_jobs=n_jobs, backend=backend)(
+        delayed(permutation_scores)(model, X_sample, y_sample, column, n_repeats, random_state + column, scoring)
+        for column in range(n_features)
+    )
+    decrease = baseline - np.array(scores, dtype=float).reshape(n_features, n_repeats)
+
+    weight = decrease.mean(axis=1)
+    std = decrease.std(axis=1, ddof=1) if n_repeats > 1 else np.zeros(n_features)
+    # Student's t interval of the mean decrease
+    margin = student_t.ppf((1 + confidence) / 2, max(n_repeats - 1, 1)) * std / np.sqrt(n_repeats)
+    if feature_names is None:
+        feature_names = X.columns if hasattr(X, 'columns') else [f'x{i}' for i in range(n_features)]
+    importances = pd.DataFrame({
+        'feature' : list(feature_names),
+        'weight' : weight,
+        'std' : std,
+        'ci_low' : weight - margin,
+        'ci_high' : weight + margin,
+    })
+    return importances.sort_values('weight', ascending=False, ignore_index=True)
+
+# permutation_importance results, cached by model fingerprint, split name and settings
+def get_permutation_importance(model, X, y, fingerprint=None, split=None, **importance_params):
+    if fingerprint is None:
+        return permutation_importance(model, X, y, **importance_params)
+    key = (fingerprint, split, tuple(sorted(importance_params.items())))
+    importances = lru_get(_importance_cache, key)
+    if importances is None:
+        importances = lru_put(_importance_cache, key, permutation_importance(model, X, y, **importance_params),
+                            maxsize=METRICS_CACHE_SIZE)
+    return importances
+
+# Number of grid points of a partial dependence curve
+PDP_GRID_POINTS = 20
+# Rows averaged for partial dependence, None uses all rows
+PDP_SAMPLE_SIZE = 5000
+# Rows drawn as ICE (individual conditional expectation) lines
+PDP_ICE_SAMPLES = 50
+# Maximum number of rows (sample rows x grid points) predicted in one call
+PDP_BATCH_ROWS = 2 ** 18
+
+# Values of a feature where partial dependence is evaluated: unique values, or percentiles if there are too many
+def get_feature_grid(values, grid_points=PDP_GRID_POINTS):
+    values = pd.Series(values).dropna()
+    unique_values = np.sort(values.unique())
+    if len(unique_values) <= grid_points or not pd.api.types.is_numeric_dtype(values):
+        return unique_values
+    return np.unique(np.percentile(values, np.linspace(0, 100, grid_points)))
+
+# Predicted probabilities (predictions for regressors) as a 2d array
+def predict_output(model, X):
+    if hasattr(model, 'predict_proba'):
+        return model.predict_proba(X)
+    return np.asarray(model.predict(X)).reshape(len(X), -1)
+
+# Partial dependence and ICE lines of one feature
+# The sample is stacked once per grid point and predicted in batches, instead of one call per grid point
+# Returns grid (n_grid), average (n_grid x n_outputs) and ice (n_grid x n_ice x n_outputs)
+def partial_dependence(model, X, feature, grid_points=PDP_GRID_POINTS, sample_size=PDP_SAMPLE_SIZE,
+                    ice_samples=PDP_ICE_SAMPLES, random_state=42):
+    column = X[feature] if hasattr(X, 'iloc') else X[:, feature]
+    grid = get_feature_grid(column, grid_points)
+    # Shuffled sample, ICE lines are the first rows
+    n_rows = len(X) if sample_size is None else min(sample_size, len(X))
+    rows = np.random.default_rng(random_state).permutation(len(X))[:n_rows]
+    X_sample = take_rows(X, rows)
+
+    # Grid points predicted per call
+    batch_points = max(1, PDP_BATCH_ROWS // n_rows)
+    outputs = []
+    for start in range(0, len(grid), batch_points):
+        grid_batch = grid[start:start + batch_points]
+        if hasattr(X_sample, 'iloc'):
+            X_stacked = pd.concat([X_sample] * len(grid_batch), ignore_index=True)
+            X_stacked[feature] = np.repeat(grid_batch, n_rows)
+        else:
+            X_stacked = np.tile(X_sample, (len(grid_batch), 1))
+            X_stacked[:, feature] = np.repeat(grid_batch, n_rows)
+        outputs.append(predict_output(model, X_stacked).reshape(len(grid_batch), n_rows, -1))
+    outputs = np.concatenate(outputs)
+
+    return {
+        'feature' : feature,
+        'grid' : grid,
+        'average' : outputs.mean(axis=1),
+        'ice' : outputs[:, :ice_samples],
+    }
+
+# partial_dependence results, cached by model fingerprint, feature and settings
+def get_partial_dependence(model, X, feature, fingerprint=None, **pdp_params):
+    if fingerprint is None:
+        return partial_dependence(model, X, feature, **pdp_params)
+    key = (fingerprint, feature, tuple(sorted(pdp_params.items())))
+    with _pdp_lock:
+        result = lru_get(_pdp_cache, key)
+    if result is None:
+        result = partial_dependence(model, X, feature, **pdp_params)
+        with _pdp_lock:
+            lru_put(_pdp_cache, key, result, maxsize=PDP_CACHE_SIZE)
+    return result
+
+# Compute partial dependence of every feature in the background, once per model fingerprint
+# Returns the future of the job, results are read with get_partial_dependence
+def precompute_partial_dependence(model, X, features, fingerprint, **pdp_params):
+    key = (fingerprint, tuple(features), tuple(sorted(pdp_params.items())))
+    with _pdp_lock:
+        future = lru_get(_pdp_jobs, key)
+        if future is not None:
+            return future
+        future = _pdp_jobs[key] = get_pdp_executor().submit(
+            lambda: [get_partial_dependence(model, X, feature, fingerprint, **pdp_params) for feature in features]
+        )
+        # Oldest jobs above PDP_JOBS_SIZE are dropped
+        evicted = [_pdp_jobs.popitem(last=False)[1] for _ in range(len(_pdp_jobs) - PDP_JOBS_SIZE)]
+    # and cancelled if they haven't started (outside the lock, cancel runs release_pdp_job)
+    for job in evicted:
+        job.cancel()
+    # Results are in _pdp_cache, finished jobs are dropped
+    future.add_done_callback(lambda _: release_pdp_job(key, future))
+    return future
+
+# Remove a finished precompute job
+def release_pdp_job(key, future):
+    with _pdp_lock:
+        if _pdp_jobs.get(key) is future:
+            del _pdp_jobs[key]
+
+# Rows explained per call of explainer.shap_values
+SHAP_BLOCK_SIZE = 1000
+
+# One TreeExplainer per fitted model
+def get_shap_explainer(model, fingerprint):
+    explainer = lru_get(_shap_explainers, fingerprint)
+    if explainer is None:
+        import shap
+        explainer = lru_put(_shap_explainers, fingerprint, shap.TreeExplainer(model), maxsize=SHAP_CACHE_SIZE)
+    return explainer
+
+# Concatenate SHAP values of row blocks, per class for multiclass outputs
+def stack_shap_blocks(blocks):
+    if isinstance(blocks[0], list):
+        return [np.concatenate([block[i] for block in blocks]) for i in range(len(blocks[0]))]
+    return np.concatenate(blocks)
+
+# SHAP values of the selected rows (all rows if None)
+# Values are computed lazily by blocks of SHAP_BLOCK_SIZE rows and cached, only missing blocks are explained
+def get_shap_values(model, fingerprint, X, split, rows=None):
+    key = (fingerprint, split, get_data_hash(X.index.to_numpy()))
+    blocks = lru_get(_shap_values, key)
+    if blocks is None:
+        blocks = lru_put(_shap_values, key, {}, maxsize=SHAP_CACHE_SIZE)
+
+    rows = np.arange(X.shape[0]) if rows is None else np.atleast_1d(rows)
+    needed = np.unique(rows // SHAP_BLOCK_SIZE)
+    explainer = get_shap_explainer(model, fingerprint)
+    for block in needed:
+        if block not in blocks:
+            start = block * SHAP_BLOCK_SIZE
+            blocks[block] = explainer.shap_values(X.iloc[start:start + SHAP_BLOCK_SIZE])
+
+    values = stack_shap_blocks([blocks[block] for block in needed])
+    # Position of each row in the stacked blocks
+    block_start = {block : i * SHAP_BLOCK_SIZE for i, block in enumerate(needed)}
+    positions = [block_start[row // SHAP_BLOCK_SIZE] + row % SHAP_BLOCK_SIZE for row in rows]
+    if isinstance(values, list):
+        return [class_values[positions] for class_values in values]
+    return values[positions]
+
+######################################################
+#               Background Training
+######################################################
+
+# Number of models trained at the same time
+TRAINING_WORKERS = 2
+# Estimators with warm_start are fitted in this number of steps, to report progress and allow cancellation
+TRAINING_PROGRESS_STEPS = 10
+# Seconds between two status checks of a running job in the UI
+TRAINING_POLL_INTERVAL = 0.5
+# Executor shared by all sessions, created on first use
+_training_executor = None
+# Training jobs, keyed by job id
+_training_jobs = {}
+# Number of partial dependence precompute jobs running at the same time
+PDP_WORKERS = 1
+# Maximum number of pending/running precompute jobs, each one keeps its model and data alive
+PDP_JOBS_SIZE = 4
+# Executor of the precompute jobs, separate from training so it can't delay training jobs
+_pdp_executor = None
+# Partial dependence precompute jobs, keyed by model fingerprint, features and settings
+_pdp_jobs = OrderedDict()
+
+# Raised inside a training job when it is cancelled
+class TrainingCancelled(Exception):
+    pass
+
+# Return the executor used to train models in the background
+def get_training_executor():
+    global _training_executor
+    if _training_executor is None:
+        _training_executor = ThreadPoolExecutor(max_workers=TRAINING_WORKERS, thread_name_prefix='training')
+    return _training_executor
+
+# Return the executor used to precompute partial dependence in the background
+def get_pdp_executor():
+    global _pdp_executor
+    if _pdp_executor is None:
+        _pdp_executor = ThreadPoolExecutor(max_workers=PDP_WORKERS, thread_name_prefix='pdp')
+    return _pdp_executor
+
+# Fit model, step by step if the final estimator supports warm_start, updating job progress
+def train_model(model, X, y, job):
+    '''
+    Fit `model` inside a background job (no Streamlit calls here).\n
+    Ensembles with `warm_start` and `n_estimators` are grown in
+    TRAINING_PROGRESS_STEPS steps, between steps the job progress is updated
+    and a cancellation request stops the fit. Other estimators are fitted in
+    one call, and can only be cancelled before they start.
+    '''
+    estimator = model.named_steps['estimator'] if isinstance(model, Pipeline) else model
+    params = estimator.get_params()
+
+    if job['cancel_event'].is_set():
+        raise TrainingCancelled
+    if 'warm_start' not in params or 'n_estimators' not in params:
         model.fit(X, y)
-        # calculate total time
-        end_time = datetime.now()
-        total_time = f'Time to fit: ' + str(end_time - start_time).split(".")[0]
-        st.sidebar.success(total_time)
+        job['progress'] = 1.0
+        return model
 
+    # fit pre-processing steps once, then grow the ensemble
+    if isinstance(model, Pipeline) and len(model.steps) > 1:
+        X = model[:-1].fit_transform(X, y)
+    n_estimators = params['n_estimators']
+    steps = np.unique(np.linspace(1, n_estimators, min(TRAINING_PROGRESS_STEPS, n_estimators)).astype(int))
+    for n_step in steps:
+        estimator.set_params(warm_start=True, n_estimators=int(n_step))
+        estimator.fit(X, y)
+        job['progress'] = n_step / n_estimators
+        if job['cancel_event'].is_set():
+            raise TrainingCancelled
+    estimator.set_params(warm_start=params['warm_start'])
+    return model
+
+# Run a training job with a train function (train_model, train_out_of_core), storing the fitted model in the cache
+def run_training_job(job, train, *args, **kwargs):
+    job['status'] = 'running'
+    job['start_time'] = datetime.now()
+    try:
+        model = train(*args, job=job, **kwargs)
+        if job['fingerprint']:
+            cache_model(job['fingerprint'], model)
+            lru_put(_history_cache, job['fingerprint'], job['history'], maxsize=MODEL_CACHE_SIZE)
+        job['status'] = 'done'
         return model
+    except TrainingCancelled:
+        job['status'] = 'cancelled'
+    except Exception as error:
+        job['status'] = 'failed'
+        job['error'] = error
+    finally:
+        job['end_time'] = datetime.now()
+
+# Register a new job, done right away if the configuration was already fitted
+# history: scores appended during training (validation score per epoch for out-of-core training)
+def create_training_job(fingerprint=None):
+    job_id = uuid.uuid4().hex
+    job = {
+        'id' : job_id, 'fingerprint' : fingerprint,
+        'status' : 'pending', 'progress' : 0.0, 'error' : None, 'history' : [],
+        'start_time' : None, 'end_time' : None,
+        'cancel_event' : threading.Event(), 'future' : None,
+    }
+    _training_jobs[job_id] = job
+
+    # already fitted configuration
+    cached_model = get_cached_model(fingerprint) if fingerprint else None
+    if cached_model is not None:
+        job.update(status='done', progress=1.0, model=cached_model, start_time=datetime.now(), end_time=datetime.now(),
+                history=lru_get(_history_cache, fingerprint) or [])
+    return job
+
+# Start training a model in the background, returns the job id
+def submit_training_job(model, X, y, fingerprint=None):
+    job = create_training_job(fingerprint)
+    if job['status'] == 'pending':
+        job['future'] = get_training_executor().submit(run_training_job, job, train_model, model, X, y)
+    return job['id']
+
+# Return the job status, with elapsed time and the fitted model when done
+def get_training_job(job_id):
+    job = _training_jobs.get(job_id)
+    if job is None:
+        return None
+    if job['status'] == 'done' and 'model' not in job:
+        job['model'] = job['future'].result()
+    job['elapsed'] = (job['end_time'] or datetime.now()) - (job['start_time'] or datetime.now())
+    return job
+
+# Request cancellation of a job, pending jobs never start
+def cancel_training_job(job_id):
+    job = _training_jobs.get(job_id)
+    if job is None:
+        return
+    job['cancel_event'].set()
+    if job['future'] is not None and job['future'].cancel():
+        job['status'] = 'cancelled'
+
+# Remove a finished job from the registry
+def remove_training_job(job_id):
+    return _training_jobs.pop(job_id, None)
+
+
+######################################################
+#               Out-of-core Training
+######################################################
+
+# Uploads above this size are better trained out-of-core than loaded in memory
+# Kept below Streamlit's default upload limit (server.maxUploadSize, 200MB), larger files
+# can't be uploaded and are read with the server file path option of the Out-of-core page
+OUT_OF_CORE_THRESHOLD = 100 * 1024 ** 2
+# Rows read and fitted per chunk
+OUT_OF_CORE_CHUNK_SIZE = 50_000
+# Passes of partial_fit over the training rows
+OUT_OF_CORE_EPOCHS = 5
+# Fraction of rows held out for validation
+OUT_OF_CORE_VALIDATION_FRACTION = 0.1
+# Maximum number of validation rows kept in memory
+OUT_OF_CORE_VALIDATION_ROWS = 50_000
+# Folder where uploaded files are written, to be read in chunks from disk
+UPLOAD_DIR = '.upload_cache'
+# Number of uploaded files kept in UPLOAD_DIR, oldest files are removed first
+UPLOAD_CACHE_FILES = 4
+
+# Preprocessing fitted chunk by chunk: scaler statistics are updated with partial_fit and categories are collected
+# Missing numbers are filled with the mean, missing categories with fill_value, unknown categories are ignored
+# Columns are numeric/categorical by the dtypes of the first chunk if features are not set
+# Transform uses the fused kernels of compiled_model, dense or CSR (sparse_output)
+class IncrementalPreprocessor(BaseEstimator, TransformerMixin):
+
+    def __init__(self, numeric_features=None, categorical_features=None, scaler='standard', encoder='onehot',
+                fill_value='unknow', sparse_output=True):
+
+        self.numeric_features = numeric_features
+        self.categorical_features = categorical_features
+        self.scaler = scaler
+        self.encoder = encoder
+        self.fill_value = fill_value
+        self.sparse_output = sparse_output
+
+    # Numeric columns as floats and categorical columns as text, chunks of a csv can have different dtypes
+    def prepare(self, X):
+
+        X = X[self.numeric_features_ + self.categorical_features_].copy()
+        for column in self.numeric_features_:
+            X[column] = pd.to_numeric(X[column], errors='coerce').astype(np.float64)
+        for column in self.categorical_features_:
+            X[column] = X[column].where(X[column].isna(), X[column].astype(str))
+        return X
+
+    def partial_fit(self, X, y=None):
+
+        if not hasattr(self, 'n_samples_seen_'):
+            numeric_features = X.select_dtypes(include=np.number).columns.tolist()
+            self.numeric_features_ = list(self.numeric_features if self.numeric_features is not None else numeric_features)
+            self.categorical_features_ = list(self.categorical_features if self.categorical_features is not None
+                                            else [column for column in X.columns if column not in numeric_features])
+            self.scaler_ = {'standard' : StandardScaler(), 'minmax' : MinMaxScaler(clip=True)}.get(self.scaler)
+            self.sum_ = np.zeros(len(self.numeric_features_))
+            self.count_ = np.zeros(len(self.numeric_features_))
+            self.categories_ = {column : set() for column in self.categorical_features_}
+            self.n_samples_seen_ = 0
+        X = self.prepare(X)
+        if self.numeric_features_:
+            # NaN are ignored by the statistics
+            numeric = X[self.numeric_features_].to_numpy()
+            self.sum_ += np.nansum(numeric, axis=0)
+            self.count_ += np.count_nonzero(~np.isnan(numeric), axis=0)
+            if self.scaler_ is not None:
+                self.scaler_.partial_fit(numeric)
+        for column in self.categorical_features_:
+            self.categories_[column].update(X[column].dropna().unique())
+        self.n_samples_seen_ += len(X)
+        self.kernel_ = None
+        return self
+
+    def fit(self, X, y=None):
+
+        if hasattr(self, 'n_samples_seen_'):
+            del self.n_samples_seen_
+        return self.partial_fit(X, y)
+
+    # Fused kernel with the current statistics, built once after the last partial_fit
+    def get_kernel(self):
+
+        if self.kernel_ is not None:
+            return self.kernel_
+        arrays, blocks = {}, []
+        if self.numeric_features_:
+            means = np.divide(self.sum_, self.count_, out=np.zeros_like(self.sum_), where=self.count_ > 0)
+            steps = [{'op' : 'impute', 'fill' : add_array(arrays, 'fill', means), 'keep' : None}]
+            # Columns without any value have NaN statistics
+            if self.scaler == 'standard':
+                steps.append({'op' : 'standardize', 'mean' : add_array(arrays, 'mean', np.nan_to_num(self.scaler_.mean_)),
+                            'scale' : add_array(arrays, 'scale', np.nan_to_num(self.scaler_.scale_, nan=1.0))})
+            elif self.scaler == 'minmax':
+                steps.append({'op' : 'minmax', 'scale' : add_array(arrays, 'scale', np.nan_to_num(self.scaler_.scale_, nan=1.0)),
+                            'min' : add_array(arrays, 'min', np.nan_to_num(self.scaler_.min_)),
+                            'clip' : list(self.scaler_.feature_range)})
+            blocks.append({'columns' : self.numeric_features_, 'numeric' : True, 'steps' : steps})
+        if self.categorical_features_:
+            categories = [sorted(self.categories_[column] | {self.fill_value}) for column in self.categorical_features_]
+            if self.encoder == 'onehot':
+                encoder = {'op' : 'onehot', 'categories' : categories, 'drop' : None, 'handle_unknown' : 'ignore'}
+            else:
+                encoder = {'op' : 'ordinal', 'categories' : categories, 'handle_unknown' : 'use_encoded_value',
+                        'unknown_value' : -1.0}
+            imputer = {'op' : 'impute', 'values' : [self.fill_value] * len(categories)}
+            blocks.append({'columns' : self.categorical_features_, 'numeric' : False, 'steps' : [imputer, encoder]})
+        self.kernel_ = FusedTransform(blocks, arrays, self.numeric_features_ + self.categorical_features_)
+        return self.kernel_
+
+    def transform(self, X, y=None):
+
+        return self.get_kernel().transform(self.prepare(X), sparse=self.sparse_output)
+
+# Write an uploaded file to disk once, so it can be read in chunks, and return its path
+# The upload itself is held in memory by Streamlit, the copy on disk only bounds later reads
+def save_upload_file(file, folder=UPLOAD_DIR, max_files=UPLOAD_CACHE_FILES):
+    os.makedirs(folder, exist_ok=True)
+    file_path = os.path.join(folder, f'{file.file_id}_{os.path.basename(file.name)}')
+    if not os.path.isfile(file_path):
+        with open(file_path, 'wb') as output:
+            output.write(file.getbuffer())
+        files = sorted((os.path.join(folder, name) for name in os.listdir(folder)), key=os.path.getmtime)
+        for old_file in files[:-max_files]:
+            os.remove(old_file)
+    return file_path
+
+# Chunks of a csv/parquet file as (X, y, validation mask), rows without target are skipped
+# Validation rows are drawn with one seed per chunk, so they are the same at every pass
+def iter_training_chunks(file_path, target_name, chunksize=OUT_OF_CORE_CHUNK_SIZE,
+                        validation_fraction=OUT_OF_CORE_VALIDATION_FRACTION, random_state=42):
+    for i, chunk in enumerate(iter_chunks(file_path, chunksize)):
+        validation = np.random.default_rng([random_state, i]).random(len(chunk)) < validation_fraction
+        labeled = chunk[target_name].notna().to_numpy()
+        chunk, validation = chunk[labeled], validation[labeled]
+        yield chunk.drop(columns=target_name), chunk[target_name], validation
+
+# Fingerprint of an out-of-core configuration: file content, model params and training options
+def get_out_of_core_fingerprint(model, file_path, target_name, **options):
+    spec = {
+        'file' : get_file_key(file_path)[-1],
+        'model' : get_params_spec(model),
+        'params' : get_params_spec(model.get_params(deep=True)),
+        'settings' : get_params_spec(dict(target_name=target_name, **options)),
+    }
+    return hashlib.md5(repr(spec).encode()).hexdigest()
+
+# Fit a pipeline (IncrementalPreprocessor + partial_fit estimator) on a file that doesn't fit in memory
+def train_out_of_core(model, file_path, target_name, job, epochs=OUT_OF_CORE_EPOCHS, chunksize=OUT_OF_CORE_CHUNK_SIZE,
+                    validation_fraction=OUT_OF_CORE_VALIDATION_FRACTION, validation_rows=OUT_OF_CORE_VALIDATION_ROWS,
+                    random_state=42):
+    '''
+    Train `model` on `file_path` read in chunks, inside a background job (no Streamlit calls here).\n
+    A first pass fits the preprocessing statistics, collects the classes and keeps
+    up to `validation_rows` held out rows in memory (rows held out above this cap are not used).
+    Each epoch fits the estimator with `partial_fit`, chunk by chunk with rows shuffled
+    inside each chunk, then scores it on the validation rows (accuracy or R2) in job['history'].
+    Progress is updated and cancellation is checked after every chunk.
+    '''
+    preprocessor, estimator = model.named_steps['pre_processing'], model.named_steps['estimator']
+    classifier = is_classifier(estimator)
+    chunk_params = {'chunksize' : chunksize, 'validation_fraction' : validation_fraction, 'random_state' : random_state}
+    rng = np.random.default_rng(random_state)
+
+    # First pass: preprocessing statistics, classes and validation rows
+    classes, X_valid, y_valid, n_valid, n_chunks = set(), [], [], 0, 0
+    for X, y, validation in iter_training_chunks(file_path, target_name, **chunk_params):
+        if job['cancel_event'].is_set():
+            raise TrainingCancelled
+        preprocessor.partial_fit(X[~validation])
+        if classifier:
+            classes.update(y[~validation].unique())
+        rows = np.flatnonzero(validation)[:max(validation_rows - n_valid, 0)]
+        X_valid.append(X.iloc[rows])
+        y_valid.append(y.iloc[rows])
+        n_valid += len(rows)
+        n_chunks += 1
+    if n_chunks == 0:
+        raise ValueError(f'No rows with a target value in {file_path}')
+    X_valid, y_valid = pd.concat(X_valid, ignore_index=True), pd.concat(y_valid, ignore_index=True)
+    job['validation'] = (X_valid, y_valid)
+    X_valid_features = preprocessor.transform(X_valid)
+    fit_params = {'classes' : np.array(sorted(classes))} if classifier else {}
+    score_name = 'validation_accuracy' if classifier else 'validation_r2'
+
+    # Epochs of partial_fit over the training rows
+    for epoch in range(epochs):
+        start_time, n_rows = time.perf_counter(), 0
+        for i, (X, y, validation) in enumerate(iter_training_chunks(file_path, target_name, **chunk_params)):
+            if (~validation).any():
+                features = preprocessor.transform(X[~validation])
+                target = y[~validation].to_numpy()
+                order = rng.permutation(len(target))
+                estimator.partial_fit(features[order], target[order], **fit_params)
+                n_rows += len(target)
+            job['progress'] = (epoch * n_chunks + i + 1) / (epochs * n_chunks)
+            if job['cancel_event'].is_set():
+                raise TrainingCancelled
+        job['history'].append({
+            'epoch' : epoch + 1,
+            score_name : estimator.score(X_valid_features, y_valid) if len(y_valid) else np.nan,
+            'rows' : n_rows,
+            'seconds' : time.perf_counter() - start_time,
+        })
+    return model
+
+# Start out-of-core training of a file in the background, returns the job id (options of train_out_of_core)
+def submit_out_of_core_job(model, file_path, target_name, fingerprint=None, **options):
+    job = create_training_job(fingerprint)
+    if job['status'] == 'pending':
+        job['future'] = get_training_executor().submit(run_training_job, job, train_out_of_core,
+                                                    model, file_path, target_name, **options)
+    return job['id']
 
-    except NotFittedError:
-        not_fitted_error()
-    except (ValueError, TypeError, AttributeError) as error:
-        collapsed_expander_bug()
 
 ######################################################
 #               Rendering Functions
@@ -707,13 +2369,21 @@ def options_summary(target_name, test_size, train_size, stratify, fc_check, cols
         st.markdown(f'**Numerical Transformers**: {", ".join([str(transformer[-1]) for  transformer in numeric_pipeline])}')
         st.markdown(f'**Categorical Transformers**: {", ".join([str(transformer[-1]) for  transformer in categorical_pipeline])}')
 
+# Number of joblib workers: -1 uses all cores, -2 all but one, 0 is rejected by joblib
+def n_jobs_input(key=None):
+    n_jobs = int(st.number_input('n_jobs', value=-1, step=1, help='-1 uses all cores, -2 all but one', key=key))
+    if n_jobs == 0:
+        st.error('n_jobs must not be 0, use -1 for all cores')
+        st.stop()
+    return n_jobs
+
 # Show estimator parameters to choose in Sidebar
 def configure_estimator_params(estimator):
 
     model_params = {}
 
     with st.sidebar.expander('Configure parameters'):
-        for key, value in get_default_params(estimator).items():
+        for key, value in get_param_schema(estimator).items():
             # True or False params
             if isinstance(value, bool):
                 model_params[key] = st.checkbox(label=key, value=value)
@@ -734,14 +2404,95 @@ def configure_estimator_params(estimator):
     
     return model_params
 
-# Create full pipeline for uploaded file
+# Show ranges/options to search for each estimator parameter in Sidebar
+def configure_search_space(estimator):
+
+    search_space = {}
+
+    with st.sidebar.expander('Configure search space'):
+        for key, value in get_param_schema(estimator).items():
+            # True or False params
+            if isinstance(value, bool):
+                search_space[key] = st.multiselect(label=key, options=[True, False], default=[value])
+            # float or int params, range to sample from
+            elif isinstance(value, (int,float)):
+                col1, col2 = st.columns(2)
+                low = col1.number_input(label=f'{key} min', value=value)
+                high = col2.number_input(label=f'{key} max', value=value)
+                if low == high:
+                    search_space[key] = [low]
+                elif isinstance(value, int):
+                    search_space[key] = ('int', int(min(low, high)), int(max(low, high)))
+                else:
+                    log = st.checkbox(f'{key} log scale', value=min(low, high) > 0, disabled=min(low, high) <= 0)
+                    search_space[key] = ('float', float(min(low, high)), float(max(low, high)), log)
+            # multiple options params
+            elif isinstance(value, list):
+                search_space[key] = st.multiselect(label=key, options=value, default=value[:1])
+            # skip random state, value will be fixed when creating object
+            elif key=='random_state':
+                    pass
+            # text params, comma separated options
+            else:
+                options = st.text_input(label=key, value=value, help='Comma separated options')
+                search_space[key] = [None if option.strip()=='None' else option.strip() for option in str(options).split(',')]
+            # nothing selected, keep default value
+            if key in search_space and not len(search_space[key]):
+                search_space[key] = [value[0] if isinstance(value, list) else value]
+
+    return search_space
+
+# Run hyperparameter search, showing a live leaderboard. Returns the best params
+def display_hyperparameter_search(model, search_space, X, y, **search_params):
+
+    st.subheader('Hyperparameter search')
+    leaderboard_placeholder = st.empty()
+    best_params = {}
+    start_time = datetime.now()
+    for leaderboard, best_params in search_hyperparameters(model, search_space, X, y, **search_params):
+        leaderboard_placeholder.dataframe(leaderboard)
+    st.sidebar.success(f'Time to search: {str(datetime.now() - start_time).split(".")[0]}')
+    st.session_state['leaderboard'] = leaderboard
+
+    return best_params
+
+# Show status of a background training job in Sidebar, rerunning the script until it finishes
+# Returns the job once it is done, failed or cancelled
+def display_training_job(job_id):
+
+    job = get_training_job(job_id)
+    if job is None or job['status'] not in ('pending', 'running'):
+        return job
+
+    st.sidebar.progress(float(job['progress']))
+    st.sidebar.text(f'Training ({job["status"]}): ' + str(job['elapsed']).split(".")[0])
+    if job['history']:
+        display_epoch_history(job['history'])
+    if st.sidebar.button('Cancel training'):
+        cancel_training_job(job_id)
+    # poll job status
+    time.sleep(TRAINING_POLL_INTERVAL)
+    rerun = getattr(st, 'rerun', None) or st.experimental_rerun
+    rerun()
+
+# Validation score per epoch of an out-of-core training job
+def display_epoch_history(history):
+
+    history = pd.DataFrame(history)
+    score_name = next(column for column in history.columns if column.startswith('validation_'))
+    fig = px.line(history, x='epoch', y=score_name, markers=True, title='Validation score per epoch')
+    fig.update_xaxes(dtick=1)
+    st.plotly_chart(fig, use_container_width=True)
+    st.dataframe(history, hide_index=True)
+
+# Create full (unfitted) pipeline for uploaded file
 def build_pipeline(df:str, target_name:str, estimator:Any,
 			numeric_pipeline:list[Tuple[str, Any]], categorical_pipeline:list[Tuple[str, Any]], 
 
 			train_size:float=0.8, test_size:float=0.2, target_encode=False,
 			hyper_params:dict={}, stratify:bool=False, multi_class=False,
 			features_creator:Optional[Any]=None, cols_to_drop:Optional[list[str]]=None, 
-			random_state=42, **kwargs):
+			random_state=42, memmap=False, fused_preprocessing:bool=False, sparse_output:bool=False, **kwargs):
 
     # Set Features
     X = df.drop(columns=target_name) 
@@ -756,11 +2507,24 @@ def build_pipeline(df:str, target_name:str, estimator:Any,
     target_labels = dict( enumerate(y.astype('category').cat.categories ) )
 
     # Create split
-    X_train, X_test, y_train, y_test = train_test_split(X, y, 
+    # Numeric features can be memory-mapped, train/test are views over one matrix
+    if memmap and X.select_dtypes(exclude=np.number).empty:
+        train_index, test_index = train_test_split(np.arange(len(X)), 
                                                     train_size=train_size, 
                                                     test_size=test_size, 
                                                     stratify=stratify, 
                                                     random_state=random_state)
+        X, X_train, X_test = memmap_train_test(X, train_index, test_index)
+        y_train, y_test = y.iloc[train_index], y.iloc[test_index]
+        # X rows are in train + test order, y and df follow the same order
+        order = np.concatenate([train_index, test_index])
+        y, df = y.iloc[order], df.iloc[order]
+    else:
+        X_train, X_test, y_train, y_test = train_test_split(X, y, 
+                                                        train_size=train_size, 
+                                                        test_size=test_size, 
+                                                        stratify=stratify, 
+                                                        random_state=random_state)
     print(f'Train dataset size: {X_train.shape}')
     print(f'Test dataset size: {X_test.shape}')
 
@@ -772,10 +2536,11 @@ def build_pipeline(df:str, target_name:str, estimator:Any,
     # Create Pre-processing Pipeline
     pre_processing_pipeline = create_preprocess_pipeline(X_train=X_train,
                                                     numeric_params=numeric_pipeline,
-                                                    categorical_params=categorical_pipeline)
-    # Make pipeline
-    pipeline = create_pipeline(X=X_train, y=y_train, 
-                            pp_pipeline=pre_processing_pipeline, 
+                                                    categorical_params=categorical_pipeline,
+                                                    fused=fused_preprocessing,
+                                                    sparse_output=sparse_output)
+    # Make pipeline, not fitted: submit_training_job is called when the form is submitted
+    pipeline = create_pipeline(pp_pipeline=pre_processing_pipeline, 
                             estimator=estimator, default_params=hyper_params,
                             multi_class=multi_class)
 
@@ -789,7 +2554,7 @@ def build_pipeline(df:str, target_name:str, estimator:Any,
 
 # Display Metrics summary and plot confusion matrix/roc auc curve
 # This is functions is called to display it's values in a st.column
-def plot_metrics(roc_auc_score_, f1_score_, cf_matrix_fig, roc_curve_fig, **kwargs):
+def plot_metrics(roc_auc_score_, f1_score_, cf_matrix_fig, roc_curve_fig, pr_curve_fig=None, **kwargs):
 
     # Write metrics
     st.text(f'ROC AUC Score = {roc_auc_score_:.3f}')
@@ -797,14 +2562,67 @@ def plot_metrics(roc_auc_score_, f1_score_, cf_matrix_fig, roc_curve_fig, **kwar
     # Plot figures
     st.plotly_chart(cf_matrix_fig, use_container_width=True)
     st.plotly_chart(roc_curve_fig, use_container_width=True)
+    if pr_curve_fig is not None:
+        st.plotly_chart(pr_curve_fig, use_container_width=True)
+
+# Run cross-validation and display the scores of each fold as they finish, with mean and std
+def display_cv_metrics(model, X, y, n_splits=5, n_jobs=-1, backend='loky', fingerprint=None):
+
+    key = (fingerprint, n_splits, backend)
+    scores = lru_get(_cv_cache, key) if fingerprint else None
+
+    table_placeholder = st.empty()
+    # Stream folds into the table
+    if scores is None:
+        scores = []
+        progress_bar = st.progress(0)
+        for fold_scores in cross_validate_folds(model, X, y, n_splits=n_splits, n_jobs=n_jobs, backend=backend):
+            scores.append(fold_scores)
+            progress_bar.progress(len(scores) / n_splits)
+            table_placeholder.dataframe(pd.DataFrame(scores).sort_values('fold').set_index('fold'))
+        progress_bar.empty()
+        if fingerprint:
+            lru_put(_cv_cache, key, scores, maxsize=MODEL_CACHE_SIZE)
+
+    # Summary of all folds
+    scores = pd.DataFrame(scores).sort_values('fold').set_index('fold')
+    table_placeholder.dataframe(scores)
+    for metric in scores.columns.drop('fit_time'):
+        st.text(f'{metric}: {scores[metric].mean():.3f} ± {scores[metric].std():.3f}')
+
+# Plot permutation importances as horizontal bars with confidence intervals
+def plot_permutation_importance(importances, top=10):
+    importances = importances.head(top).iloc[::-1]
+    fig = go.Figure(go.Bar(
+        x=importances['weight'], y=importances['feature'], orientation='h',
+        error_x=dict(type='data', symmetric=False,
+                    array=importances['ci_high'] - importances['weight'],
+                    arrayminus=importances['weight'] - importances['ci_low']),
+    ))
+    fig.update_layout(
+        title='Permutation importance',
+        xaxis_title='Score decrease', yaxis_title='Feature',
+        width=700, height=max(300, 30 * len(importances))
+    )
+    return fig
 
-# Main function to calculate and display metrics
-def display_metrics(model, X_train, X_test, y_train, y_test, target_labels,**kwargs):
+# Compute (cached) and display permutation importance of the model
+def display_permutation_importance(model, X, y, fingerprint=None, split=None, top=10, **importance_params):
+    with st.spinner('Computing permutation importance...'):
+        importances = get_permutation_importance(model, X, y, fingerprint, split, **importance_params)
+    st.plotly_chart(plot_permutation_importance(importances, top), use_container_width=True)
+    return importances
 
-    # Calculate metrics for Train dataset
-    train_metrics = calculate_metrics(X_train, y_train, model, target_labels, split_type='Train')
-    # Calculate metrics for Train dataset
-    test_metrics = calculate_metrics(X_test, y_test, model, target_labels, split_type='Test')
+# Main function to calculate and display metrics
+# If cv_folds is set, a k-fold cross-validation on the train dataset is displayed below
+# If importance_params is set, permutation importance on the test dataset is displayed below
+def display_metrics(model, X_train, X_test, y_train, y_test, target_labels,
+                    cv_folds=None, n_jobs=-1, backend='loky', fingerprint=None, max_points=CURVE_MAX_POINTS,
+                    importance_params=None, **kwargs):
+
+    # Calculate metrics for Train and Test datasets (cached, reruns don't predict again)
+    train_metrics, test_metrics = compute_metrics(model, X_train, X_test, y_train, y_test, target_labels,
+                                                fingerprint, max_points)
     # Display results
     col1, col2 = st.columns(2)
     # Train column
@@ -815,6 +2633,14 @@ def display_metrics(model, X_train, X_test, y_train, y_test, target_labels,**kwa
     with col2:
         st.markdown('**Test metrics:**')
         plot_metrics(**test_metrics)
+    # Cross-validation
+    if cv_folds:
+        st.markdown(f'**{cv_folds}-fold cross-validation (train dataset):**')
+        display_cv_metrics(model, X_train, y_train, n_splits=cv_folds, n_jobs=n_jobs, backend=backend, fingerprint=fingerprint)
+    # Permutation importance
+    if importance_params:
+        st.markdown('**Permutation importance (test dataset):**')
+        display_permutation_importance(model, X_test, y_test, fingerprint, split='Test', **importance_params)
 
 
 ######################################################
@@ -0,0 +1,271 @@
+######################################################
+#                Libraries and APIs
+######################################################
+
+# Custom functions for this app
+# (data, sklearn estimators and metrics, plotly figures)
+from functions import *
+
+# Web rendering API
+import streamlit as st
+
+
+######################################################
+#                   Configuration
+######################################################
+
+st.set_page_config(page_title='ML Visualizer', page_icon='📈',layout='wide')
+
+#st.session_state
+
+if 'file_upload' not in st.session_state:
+    st.session_state['file_upload'] = False
+if 'data' not in st.session_state:
+    st.session_state['data'] = False
+if 'model' not in st.session_state:
+    st.session_state['model'] = False
+if 'model_fingerprint' not in st.session_state:
+    st.session_state['model_fingerprint'] = None
+if 'training_job' not in st.session_state:
+    st.session_state['training_job'] = None
+
+# materialize sample data in a columnar format (only new or changed files)
+convert_sample_data()
+# get files from sample_data folder
+dataset_options = list_sample_datasets()
+
+# installed classifiers with predict_proba (for ROC/PR curves) that accept any class labels
+estimator_options = list_estimators('Classification', proba=True, encoded_labels=False, non_negative=False)
+
+# precompute parameter schemas, sidebar reruns don't parse docstrings
+# (only sklearn estimators, other backends are imported when selected)
+for option in estimator_options:
+    if ESTIMATORS[option]['path'].startswith('sklearn.'):
+        get_param_schema(get_estimator(option))
+
+######################################################
+#                       Main
+######################################################
+
+
+home_placeholder = st.empty()
+show_home_page(home_placeholder)
+
+# clear home section when data is loaded
+if st.session_state['file_upload']:
+    home_placeholder.empty()
+
+# Sidebar Settings
+st.sidebar.header('Settings')
+## Select dataset
+with st.sidebar.expander('Select a dataset'):
+    choice = st.radio('Options:', options=('Sample data','Upload file'))
+    # Share one on-disk copy of the numeric feature matrix between train/test and sessions
+    memmap = st.checkbox('Memory-mapped features', help='Store the numeric feature matrix in a memory-mapped file')
+
+    # Sample dataset choice
+    if choice == 'Sample data':
+        # Select a dataset
+        sample_data = st.selectbox('Select a sample dataframe:', options=dataset_options)
+        # Select features, only these columns are read from disk
+        feature_options = [column for column in get_sample_columns(sample_data) if column != SAMPLE_DATA_TARGETS[sample_data]]
+        features = st.multiselect('Features:', options=feature_options, default=feature_options)
+        # One-hot encoding: sparse columns and a cap of levels per categorical column
+        sparse = st.checkbox('Sparse one-hot', help='Sparse feature columns, passed to estimators as a CSR matrix (not memory-mapped)')
+        max_categories = st.number_input('Max categories per column (0 = no cap)', min_value=0, value=0,
+                                        help=f'Rarer levels are grouped into "{ONEHOT_OTHER_LABEL}", '
+                                        f'e.g. {ONEHOT_MAX_CATEGORIES} for ID-like columns')
+        # Read data and store information on session state
+        st.session_state['data'] = read_sample_data(sample_data, columns=features, memmap=memmap, sparse=sparse,
+                                                    max_categories=max_categories or None)
+        memory = st.session_state['data']['memory']
+        st.caption(f'Features memory usage: {format_bytes(memory["before"])} before encoding, '
+                f'{format_bytes(memory["after"])} after')
+
+    # Upload a file choice
+    elif choice == 'Upload file':
+        st.session_state['file_upload'] = st.file_uploader(label='Or upload a csv file.', type='csv')
+        # Run if file is uploaded
+        if st.session_state['file_upload']:
+            if st.session_state['file_upload'].size > OUT_OF_CORE_THRESHOLD:
+                st.info(f'Large file ({format_bytes(st.session_state["file_upload"].size)}): read a sample with Max rows, '
+                        'or train on every row with the Out-of-core Training page (use a file path on the server for files above the upload limit)')
+            # Limit rows read from large files
+            max_rows = st.number_input('Max rows (0 = all rows)', min_value=0, value=0, step=10_000)
+            random_sample = st.checkbox('Random sample', help='Sample rows from the whole file instead of reading the first rows')
+            max_rows = max_rows or None
+            # Return dataframe and a list to choose target/id columns
+            df, column_selector = read_upload_file(st.session_state['file_upload'],
+                                                max_rows=None if random_sample else max_rows,
+                                                sample_size=max_rows if random_sample else None)
+            st.caption(f'Memory usage: {format_bytes(get_memory_usage(df))} ({len(df):,} rows)')
+            # Store dataframe information on session state
+            st.session_state['data']['df'] = df
+            st.session_state['data']['memmap'] = memmap
+
+## Options to show dataframe preview
+if st.sidebar.checkbox('Dataframe preview'):
+    st.subheader('Dataframe preview')
+    st.dataframe(st.session_state['data']['df'], height=195)
+    home_placeholder.empty()
+
+# Settings for Uploaded File
+if st.session_state['file_upload']:
+
+    # target and features settings
+    settings = target_features_settings(column_selector)
+    st.session_state['data'].update(settings)
+
+    # split data into train/test
+    settings = test_train_split()
+    st.session_state['data'].update(settings)
+
+    # numeric data settings
+    settings = numerical_transformer()
+    st.session_state['data'].update(settings)
+
+    # categorical data settings
+    settings = categorical_transformer()
+    st.session_state['data'].update(settings)
+
+    # info summary
+    options_summary(**st.session_state['data'])
+
+
+# Select estimator
+estimator = st.sidebar.selectbox('Select your model', options=estimator_options)
+# Sparse one-hot features are densified for estimators that need dense input
+if is_sparse_frame(st.session_state['data'].get('X_train')) and ESTIMATORS[estimator].get('dense_only'):
+    st.sidebar.caption(f'{estimator} needs dense input, sparse features are densified')
+    st.session_state['data'] = densify_data(st.session_state['data'])
+# Hyperparameter search settings
+with st.sidebar.expander('Hyperparameter search'):
+    search_mode = st.checkbox('Search mode', help='Search ranges/options of parameters instead of setting one value')
+    if search_mode:
+        search_method = st.radio('Method', options=('Successive halving', 'Randomized'))
+        search_params = {
+            'method' : 'halving' if search_method == 'Successive halving' else 'random',
+            'n_candidates' : st.slider('Candidates', min_value=2, max_value=64, value=16),
+            'cv' : st.slider('Folds', min_value=2, max_value=10, value=3, key='search_cv'),
+            'n_jobs' : n_jobs_input(key='search_n_jobs'),
+        }
+# Open sidebar with estimator params, or search space in search mode
+if search_mode:
+    search_space = configure_search_space(get_estimator(estimator))
+    model_params = {}
+else:
+    model_params = configure_estimator_params(get_estimator(estimator))
+
+# Create model
+# For uploaed file
+if st.session_state['file_upload']:
+    st.session_state['data'].update(build_pipeline(estimator=get_estimator(estimator), 
+                                                        hyper_params=get_estimator_params(estimator, model_params), 
+                                                        **st.session_state['data']))
+    model = st.session_state['data']['pipeline']
+    split_settings = {key : st.session_state['data'].get(key) for key in ('target_name', 'train_size', 'test_size', 'stratify')}
+# For sample data
+else:
+    model = make_estimator(estimator, model_params, random_state=42)
+    split_settings = {'target_name' : st.session_state['data']['target_name']}
+
+# Search settings are part of the configuration
+if search_mode:
+    split_settings.update(search_space=search_space, **search_params)
+
+# Fingerprint of the current configuration, used to reuse fitted models
+fingerprint = get_model_fingerprint(model,
+                                    X=st.session_state['data']['X_train'],
+                                    y=st.session_state['data']['y_train'],
+                                    **split_settings)
+
+# Cross-validation settings
+with st.sidebar.expander('Cross-validation'):
+    cv_params = {'cv_folds' : None}
+    if st.checkbox('K-fold evaluation', help='Score the model on k folds of the train dataset, in parallel'):
+        cv_params['cv_folds'] = st.slider('Folds', min_value=3, max_value=10, value=5)
+        cv_params['n_jobs'] = n_jobs_input()
+        # results are streamed as folds finish, the multiprocessing backend can't return a generator
+        cv_params['backend'] = st.selectbox('Backend', options=('loky', 'threading'))
+
+# Permutation importance settings
+with st.sidebar.expander('Feature importance'):
+    importance_params = None
+    if st.checkbox('Permutation importance', help='Score decrease when each feature is shuffled, features are evaluated in parallel'):
+        importance_params = {
+            'sample_size' : int(st.number_input('Sample size', min_value=100, value=IMPORTANCE_SAMPLE_SIZE, step=100,
+                                                help='Rows of the test dataset used, stratified by target')),
+            'n_repeats' : st.slider('Repeats', min_value=2, max_value=20, value=IMPORTANCE_REPEATS),
+            'n_jobs' : n_jobs_input(key='importance_n_jobs'),
+        }
+
+# Number of points of each ROC/PR curve
+with st.sidebar.expander('Display options'):
+    max_points = st.slider('Curve points', min_value=50, max_value=2000, value=CURVE_MAX_POINTS, step=50,
+                        help='Curves are simplified to this number of points, scores use the full curves')
+
+# Button to fit model
+with st.sidebar.form(key='run_model'):
+    submitted = st.form_submit_button('Run model')
+    if submitted:
+        # Search hyperparameters, then fit best candidate on the full train dataset
+        # (the fingerprint includes the search settings, a searched configuration is reused from cache)
+        if search_mode and get_cached_model(fingerprint) is None:
+            best_params = display_hyperparameter_search(model, search_space,
+                                                        X=st.session_state['data']['X_train'],
+                                                        y=st.session_state['data']['y_train'],
+                                                        **search_params)
+            st.session_state['leaderboard_fingerprint'] = fingerprint
+            model = clone(model).set_params(**best_params)
+        # Run model in the background, status is polled below
+        st.session_state['training_job'] = submit_training_job(model,
+                                                X=st.session_state['data']['X_train'], 
+                                                y=st.session_state['data']['y_train'],
+                                                fingerprint=fingerprint)
+        # Clean homepage after model is fitted
+        home_placeholder.empty()
+
+# Poll background training job
+if st.session_state['training_job']:
+    job = display_training_job(st.session_state['training_job'])
+    st.session_state['training_job'] = None
+    if job is None:
+        pass
+    elif job['status'] == 'done':
+        st.session_state['model'] = job['model']
+        st.session_state['model_fingerprint'] = job['fingerprint']
+        st.sidebar.success(f'Time to fit: {str(job["elapsed"]).split(".")[0]}')
+    elif job['status'] == 'cancelled':
+        st.sidebar.warning('Training cancelled')
+    else:
+        st.sidebar.error(f'Training failed: {job["error"]}')
+    if job is not None:
+        remove_training_job(job['id'])
+          
+# Display metrics
+if st.session_state['model']:
+    
+    try:
+        # Settings changed after the model was fitted
+        if st.session_state['model_fingerprint'] != fingerprint:
+            raise NotFittedError
+        # Leaderboard of the last search
+        if search_mode and st.session_state.get('leaderboard_fingerprint') == fingerprint:
+            with st.expander('Hyperparameter search leaderboard'):
+                st.dataframe(st.session_state['leaderboard'])
+        st.subheader(f'{estimator} Metrics')
+        display_metrics(st.session_state['model'], fingerprint=fingerprint, max_points=max_points,
+                        importance_params=importance_params,
+                        **cv_params, **st.session_state['data'])
+
+    except NotFittedError:
+        not_fitted_error()
+    # except (ValueError, TypeError, AttributeError) as error:
+    #     collapsed_expander_bug()
+
+
+
+#st.session_state
+
+#st.button('Whatever', help='Visit [Scikit-Learn User Guide](https://scikit-learn.org/stable/user_guide.html) for parameter details')
+
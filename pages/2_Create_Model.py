@@ -1,23 +1,16 @@
-from collections import namedtuple
-from faulthandler import disable
-import altair as alt
-import math
-from isort import file
-
 from typing import Union, Optional, Tuple, Any
 from datetime import datetime
 import time
 import pickle
-import base64
 
-from requests_cache import disabled
 from functions import *
+# NumPy-only model artifact
+from compiled_model import compile_model
 
 import numpy as np
 import pandas as pd
 import seaborn as sns
 import streamlit as st
-import plotly.express as px
 
 # Machine Learning - Scikit-Learn
 import sklearn
@@ -29,18 +22,16 @@ from sklearn.impute import SimpleImputer
 from sklearn.preprocessing import StandardScaler, MinMaxScaler, PolynomialFeatures, OneHotEncoder, OrdinalEncoder
 from sklearn.compose import ColumnTransformer, make_column_transformer
 from sklearn.base import BaseEstimator, TransformerMixin
-# Models
+# Models (estimators of the app are resolved from the registry in functions.py)
 from sklearn.linear_model import LogisticRegression, SGDClassifier, LinearRegression
 from sklearn.ensemble import AdaBoostClassifier, RandomForestClassifier, GradientBoostingClassifier, \
                             RandomForestRegressor, GradientBoostingRegressor
 from sklearn.svm import SVC, SVR
 from sklearn.neighbors import KNeighborsClassifier
-from sklearn.gaussian_process import GaussianProcessClassifier
 from sklearn.naive_bayes import MultinomialNB, CategoricalNB
 # Metrics
 from sklearn.metrics import r2_score, mean_absolute_error, mean_squared_error,\
-	ConfusionMatrixDisplay, classification_report, roc_auc_score, f1_score, roc_curve, plot_roc_curve, precision_recall_curve
-from xgboost import XGBClassifier, XGBRegressor
+	classification_report, roc_auc_score, f1_score, roc_curve, precision_recall_curve
 
 ######################################################
 #                Page Configuration
@@ -175,22 +166,21 @@ if file_upload:
             categorical_pipeline.append( ('onehot', OneHotEncoder(handle_unknown='ignore')) )
         elif encoder == 'OrdinalEncoder':
             categorical_pipeline.append( ('ordinal', OrdinalEncoder()) )
+
+    # Preprocessing mode
+    with st.sidebar.expander('Preprocessing mode'):
+        fused_preprocessing = st.checkbox('Fused preprocessing', key='fused_preprocessing',
+                                        help='After fit, imputers/scalers/encoders are computed in one pass into a single output array')
+        sparse_output = st.checkbox('Sparse output (CSR)', key='sparse_output', disabled=not fused_preprocessing,
+                                    help='Keep one-hot encoded features sparse up to the estimator')
         
     # Estimator
     with st.sidebar.expander('Select Estimator'):
         learning_type = st.radio('Problem type', options=('Regression', 'Classification'))
         if learning_type == 'Regression':
-            estimator = st.selectbox('Options', options=('LinearRegression',
-                                                'RandomForestRegressor',
-                                                'SVR', 
-                                                'XGBRegressor')
-                                    )
+            estimator = st.selectbox('Options', options=list_estimators('Regression'))
         elif learning_type == 'Classification':
-            estimator = st.selectbox('Options', options=('LogisticRegression',
-                                                'RandomForestClassifier',
-                                                'SVC',
-                                                'XGBClassifier')
-                                        )
+            estimator = st.selectbox('Options', options=list_estimators('Classification'))
 
     # Summary
     with st.sidebar.expander('Parameters summary'):
@@ -202,6 +192,7 @@ if file_upload:
         st.markdown(f'**Drop columns**: {", ".join(cols_to_drop)}')
         st.markdown(f'**Numerical Transformers**: {", ".join([str(transformer[-1]) for  transformer in numeric_pipeline])}')
         st.markdown(f'**Categorical Transformers**: {", ".join([str(transformer[-1]) for  transformer in categorical_pipeline])}')
+        st.markdown(f'**Fused preprocessing**: {fused_preprocessing} (sparse: {fused_preprocessing and sparse_output})')
         st.markdown(f'**Estimator**: {estimator}')
     
     # Button to run model
@@ -210,17 +201,18 @@ if file_upload:
         if submitted:
             model_results = run_model(df=df, 
                         target_name=target, 
-                        estimator=eval(estimator), # convert to object
+                        estimator=get_estimator(estimator), # class, imported on first use
                         metric_type=learning_type,
                         numeric_pipeline=numeric_pipeline, 
                         categorical_pipeline=categorical_pipeline, 
                         train_size=train_size, 
                         test_size=test_size,
-                        estimator_params={}, 
+                        estimator_params=get_estimator_params(estimator), 
                         stratify=stratify, 
                         features_creator=feature_creator, 
                         cols_to_drop=cols_to_drop, 
-                        plot_metrics=False, save_model=False, submit_file=False, random_state=42)
+                        plot_metrics=False, save_model=False, submit_file=False, random_state=42,
+                        fused_preprocessing=fused_preprocessing, sparse_output=fused_preprocessing and sparse_output)
             st.success('Fit complete!!')
             time.sleep(2)
                 
@@ -229,11 +221,11 @@ if file_upload:
 # Display model performance after run
 if model_results:
     # Extract results
-    X_train, X_test, y_train, y_test = model_results['train_test_split']
+    X_train, X_test, y_train, y_test = [model_results[key] for key in ('X_train', 'X_test', 'y_train', 'y_test')]
     model = model_results['pipeline']
-    # Make predictions
-    y_train_pred = model.predict(X_train)
-    y_test_pred = model.predict(X_test)
+    # Make predictions, once per split
+    y_train_pred = get_predictions(model, X_train, model_results['fingerprint'], split='Train')['y_pred']
+    y_test_pred = get_predictions(model, X_test, model_results['fingerprint'], split='Test')['y_pred']
 
     st.header(f'{estimator} Performance')
     
@@ -247,6 +239,13 @@ if model_results:
     c2.download_button('Download model', 
                         data=pickle.dumps(model), 
                         file_name=f'{estimator}_model_{datetime.now().strftime("%H_%M_%S")}.pkl')
+    # Compiled artifact: loaded with numpy only, no code runs when loading it
+    try:
+        c2.download_button('Download compiled model',
+                            data=compile_model(model).to_bytes(),
+                            file_name=f'{estimator}_model_{datetime.now().strftime("%H_%M_%S")}.npz')
+    except ValueError as error:
+        c2.caption(f'Compiled model not available: {error}')
     c2.download_button('Download metrics', 
                         data=pickle.dumps(model), 
                         file_name=f'{estimator}_metrics_{datetime.now().strftime("%H_%M_%S")}.pkl')
@@ -2,27 +2,50 @@ from sklearn.linear_model import LogisticRegression
 import streamlit as st
 import numpy as np
 import pandas as pd
-import re
 
 # ml
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import LabelEncoder
 from sklearn.metrics import classification_report, confusion_matrix
-import lightgbm as lgb
-import xgboost as xgb
-from xgboost import DMatrix
+# lightgbm, xgboost, shap and eli5 are imported on first use
 
 # plotting
 import matplotlib.pyplot as plt
 import seaborn as sns
 import altair as alt
 
-# interpretation
-import eli5
-from eli5.sklearn import PermutationImportance
-from pdpbox import pdp
-import shap
+# data loading and caching
+import hashlib
+from functions import read_csv_optimized, get_memory_usage, format_bytes
+
+# one-hot encoding (sparse columns, cap of levels per column)
+from functions import encode_onehot, ONEHOT_MAX_CATEGORIES, ONEHOT_OTHER_LABEL
+from functions import get_data_hash, get_cached_model, cache_model
+
+# native booster data (cached DMatrix per split, categorical codes)
+from functions import (
+    encode_categorical_codes,
+    get_xgb_data,
+    get_booster_predictions,
+    get_predictions,
+    XGB_TREE_METHOD,
+    BOOSTER_MAX_BIN,
+    BOOSTER_THREADS,
+)
+
+# SHAP explainers and values, cached across reruns
+from functions import get_shap_explainer, get_shap_values
+
+# global importance
+from functions import (
+    get_permutation_importance,
+    stratified_sample,
+    IMPORTANCE_SAMPLE_SIZE,
+    IMPORTANCE_REPEATS,
+)
+
+# partial dependence
+from functions import get_partial_dependence, precompute_partial_dependence
 
 # Title and Subheader
 st.title("ML Interpreter")
@@ -43,8 +66,10 @@ st.button('Whatever', help='Visit [Scikit-Learn User Guide](https://scikit-learn
 
 def upload_data(uploaded_file, dim_data):
     if uploaded_file is not None:
-        st.sidebar.success("File uploaded!")
-        df = pd.read_csv(uploaded_file, encoding="utf8")
+        df = read_csv_optimized(uploaded_file, encoding="utf8")
+        st.sidebar.success(
+            "File uploaded! Memory usage: " + format_bytes(get_memory_usage(df))
+        )
         # replace all non alphanumeric column names to avoid lgbm issue
         df.columns = [
             "".join(c if c.isalnum() else "_" for c in str(x)) for x in df.columns
@@ -54,34 +79,43 @@ def upload_data(uploaded_file, dim_data):
         target_col = st.sidebar.selectbox(
             "Then choose the target variable", col_arranged
         )
-        X, y, features, target_labels = encode_data(df, target_col)
     elif dim_data == "iris":
         df = sns.load_dataset("iris")
         target_col = "species"
-        X, y, features, target_labels = encode_data(df, target_col)
     elif dim_data == "titanic":
         df = sns.load_dataset("titanic").drop(
             columns=["class", "who", "adult_male", "deck", "alive", "alone"]
         )
         target_col = "survived"
-        X, y, features, target_labels = encode_data(df, target_col)
     elif dim_data == "census income":
+        import shap
+
         X, y = shap.datasets.adult()
-        features = X.columns
-        target_labels = pd.Series(y).unique()
-        df = pd.concat([X, pd.DataFrame(y, columns=["Outcome"])], axis=1)
-    return df, X, y, features, target_labels
+        target_col = "Outcome"
+        df = pd.concat([X, pd.DataFrame(y, columns=[target_col])], axis=1)
+    return df, target_col
 
 
-def encode_data(data, targetcol):
-    """preprocess categorical value"""
-    X = pd.get_dummies(data.drop(targetcol, axis=1)).fillna(0)
+def encode_data(
+    data, targetcol, native_categorical=False, sparse=False, max_categories=None
+):
+    """preprocess categorical value: one-hot columns, or integer codes split natively by the boosters"""
+    if native_categorical:
+        X, categorical_features = encode_categorical_codes(data.drop(targetcol, axis=1))
+    else:
+        X = encode_onehot(
+            data.drop(targetcol, axis=1), sparse=sparse, max_categories=max_categories
+        )
+        categorical_features = []
     X.columns = ["".join(c if c.isalnum() else "_" for c in str(x)) for x in X.columns]
+    categorical_features = [
+        "".join(c if c.isalnum() else "_" for c in str(x)) for x in categorical_features
+    ]
     features = X.columns
     data[targetcol] = data[targetcol].astype("object")
     target_labels = data[targetcol].unique()
     y = pd.factorize(data[targetcol])[0]
-    return X, y, features, target_labels
+    return X, y, features, target_labels, categorical_features
 
 
 def splitdata(X, y):
@@ -92,46 +126,210 @@ def splitdata(X, y):
     return X_train, X_test, y_train, y_test
 
 
-def make_pred(dim_model, X_test, clf):
-    """get y_pred using the classifier"""
-    if dim_model == "XGBoost":
-        pred = clf.predict(DMatrix(X_test))
+def select_booster_params(dim_model):
+    """sidebar settings of the boosters: native categorical features, tree method, bins and threads"""
+    if dim_model == "randomforest":
+        return {"native_categorical": False}
+    with st.sidebar.expander("Booster settings"):
+        booster_params = {
+            "native_categorical": st.checkbox(
+                "Native categorical features",
+                value=True,
+                help="Split on category codes instead of one-hot columns",
+            )
+        }
+        if dim_model == "XGBoost":
+            # exact does not support categorical features
+            tree_methods = ["hist", "approx"]
+            if not booster_params["native_categorical"]:
+                tree_methods.append("exact")
+            booster_params["tree_method"] = st.selectbox(
+                "Tree method",
+                tree_methods,
+                index=tree_methods.index(XGB_TREE_METHOD),
+                help="hist bins the features once and builds trees from histograms",
+            )
+        booster_params["max_bin"] = int(
+            st.number_input("Max bins", min_value=2, value=BOOSTER_MAX_BIN, step=16)
+        )
+        booster_params["n_threads"] = int(
+            st.number_input(
+                "Threads", min_value=-1, value=BOOSTER_THREADS, help="-1 uses all cores"
+            )
+        )
+    return booster_params
+
+
+def select_onehot_params(booster_params):
+    """sidebar settings of the one-hot encoding, when categorical features are not native"""
+    if booster_params["native_categorical"]:
+        return {}
+    with st.sidebar.expander("One-hot encoding"):
+        sparse = st.checkbox(
+            "Sparse columns", help="Passed to the models as a sparse (CSR) matrix"
+        )
+        max_categories = st.number_input(
+            "Max categories per column (0 = no cap)",
+            min_value=0,
+            value=0,
+            help=f'Rarer levels are grouped into "{ONEHOT_OTHER_LABEL}", '
+            f"e.g. {ONEHOT_MAX_CATEGORIES} for ID-like columns",
+        )
+    return {"sparse": sparse, "max_categories": max_categories or None}
+
+
+def get_data_params(booster_params, categorical_features):
+    """arguments of get_xgb_data for a split"""
+    return {
+        "categorical_features": categorical_features,
+        "tree_method": booster_params["tree_method"],
+        "max_bin": booster_params["max_bin"],
+        "n_threads": booster_params["n_threads"],
+    }
+
+
+def fit_classifier(
+    dim_model, X_train, y_train, target_labels, categorical_features, booster_params
+):
+    """train the selected model, reusing the fitted model of an identical configuration"""
+    # the thread count does not change the model
+    model_params = {
+        key: value for key, value in booster_params.items() if key != "n_threads"
+    }
+    fingerprint = hashlib.md5(
+        repr(
+            (
+                dim_model,
+                len(target_labels),
+                get_data_hash(X_train, y_train),
+                categorical_features,
+                sorted(model_params.items()),
+            )
+        ).encode()
+    ).hexdigest()
+    clf = get_cached_model(fingerprint)
+    if clf is not None:
+        return clf, fingerprint
+
+    if dim_model == "randomforest":
+        clf = RandomForestClassifier(n_estimators=500, random_state=0, n_jobs=-1)
+        clf.fit(X_train, y_train)
     elif dim_model == "lightGBM":
-        pred = clf.predict(X_test)
+        import lightgbm as lgb
+
+        lgb_params = {
+            "n_jobs": booster_params["n_threads"],
+            "max_bin": booster_params["max_bin"],
+            "verbose": -1,
+        }
+        if len(target_labels) > 2:
+            clf = lgb.LGBMClassifier(
+                class_weight="balanced", objective="multiclass", **lgb_params
+            )
+        else:
+            clf = lgb.LGBMClassifier(objective="binary", **lgb_params)
+        # the sklearn wrapper is kept for permutation importance, PDP and ELI5
+        clf.fit(X_train, y_train, categorical_feature=categorical_features or "auto")
+    elif dim_model == "XGBoost":
+        import xgboost as xgb
+
+        params = {
+            "max_depth": 5,
+            "seed": 2,
+            "objective": "multi:softmax",
+            "num_class": len(target_labels),
+            "tree_method": booster_params["tree_method"],
+            "max_bin": booster_params["max_bin"],
+            "nthread": booster_params["n_threads"],
+        }
+        dtrain = get_xgb_data(
+            X_train,
+            y_train,
+            "train",
+            **get_data_params(booster_params, categorical_features),
+        )
+        clf = xgb.train(params=params, dtrain=dtrain)
+    cache_model(fingerprint, clf)
+    return clf, fingerprint
+
+
+def make_pred(
+    dim_model,
+    X_train,
+    y_train,
+    X_test,
+    clf,
+    fingerprint,
+    categorical_features,
+    booster_params,
+):
+    """get y_pred using the classifier, computed once per model"""
+    if dim_model == "XGBoost":
+        data_params = get_data_params(booster_params, categorical_features)
+        # the test split is binned with the quantiles of the train split
+        reference = get_xgb_data(X_train, y_train, "train", **data_params)
+        pred = get_booster_predictions(
+            clf, X_test, fingerprint, "test", reference=reference, **data_params
+        )["y_pred"].astype(int)
     else:
-        pred = clf.predict(X_test)
+        pred = get_predictions(clf, X_test, fingerprint, "test")["y_pred"]
     return pred
 
 
-def show_global_interpretation_eli5(X_train, y_train, features, clf, dim_model):
+def show_global_interpretation_eli5(
+    X_train, y_train, features, clf, dim_model, fingerprint, sample_size
+):
     """show most important features via permutation importance in ELI5"""
+    import eli5
+
     if dim_model == "XGBoost":
+        # booster has no score method, use eli5 feature weights (gain)
         df_global_explain = eli5.explain_weights_df(
             clf, feature_names=features.values, top=5
         ).round(2)
     else:
-        perm = PermutationImportance(clf, n_iter=2, random_state=1).fit(
-            X_train, y_train
+        # features are shuffled in parallel, on a stratified sample of rows
+        df_global_explain = (
+            get_permutation_importance(
+                clf,
+                X_train,
+                y_train,
+                fingerprint,
+                "train",
+                sample_size=sample_size,
+                n_repeats=IMPORTANCE_REPEATS,
+                random_state=1,
+            )
+            .head(5)
+            .round(2)
         )
-        df_global_explain = eli5.explain_weights_df(
-            perm, feature_names=features.values, top=5
-        ).round(2)
     bar = (
         alt.Chart(df_global_explain)
         .mark_bar(color="red", opacity=0.6, size=16)
         .encode(x="weight", y=alt.Y("feature", sort="-x"), tooltip=["weight"])
         .properties(height=160)
     )
+    if "ci_low" in df_global_explain:
+        bar = bar.encode(tooltip=["weight", "ci_low", "ci_high"])
+        error = (
+            alt.Chart(df_global_explain)
+            .mark_rule()
+            .encode(x="ci_low", x2="ci_high", y=alt.Y("feature", sort="-x"))
+        )
+        bar = bar + error
     st.write(bar)
 
 
-def show_global_interpretation_shap(X_train, clf):
+def show_global_interpretation_shap(X_train, y_train, clf, fingerprint, sample_size):
     """show most important features via permutation importance in SHAP"""
-    explainer = shap.TreeExplainer(clf)
-    shap_values = explainer.shap_values(X_train)
+    import shap
+
+    # summary of a stratified sample of rows
+    X_sample, _ = stratified_sample(X_train, y_train, sample_size, random_state=1)
+    shap_values = get_shap_values(clf, fingerprint, X_sample, "train")
     shap.summary_plot(
         shap_values,
-        X_train,
+        X_sample,
         plot_type="bar",
         max_display=5,
         plot_size=(12, 5),
@@ -170,6 +368,8 @@ def show_local_interpretation_eli5(
         """
         )
 
+    import eli5
+
     if dim_model == "XGBoost":
         local_interpretation = eli5.show_prediction(
             clf, doc=dataset.iloc[slider_idx, :], show_feature_values=True, top=5
@@ -188,7 +388,7 @@ def show_local_interpretation_eli5(
     )
 
 
-def show_local_interpretation_shap(clf, X_test, pred, slider_idx):
+def show_local_interpretation_shap(clf, fingerprint, X_test, pred, slider_idx):
     """show the interpretation of individual decision points"""
     info_local = st.button("How this works")
     if info_local:
@@ -199,14 +399,17 @@ def show_local_interpretation_shap(clf, X_test, pred, slider_idx):
         Please note that the explanation here is always based on the predicted class rather than the positive class (i.e. if predicted class is 0, to the right means more likely to be 0) to cater for multi-class senaiors.
         """
         )
-    explainer = shap.TreeExplainer(clf)
-    shap_values = explainer.shap_values(X_test)
+    import shap
+
+    explainer = get_shap_explainer(clf, fingerprint)
+    # only the block with the selected row is computed, once
+    shap_values = get_shap_values(clf, fingerprint, X_test, "test", rows=slider_idx)
     # the predicted class for the selected instance
     pred_i = int(pred[slider_idx])
     # this illustrates why the model predict this particular outcome
     shap.force_plot(
         explainer.expected_value[pred_i],
-        shap_values[pred_i][slider_idx, :],
+        shap_values[pred_i][0, :],
         X_test.iloc[slider_idx, :],
         matplotlib=True,
     )
@@ -214,7 +417,15 @@ def show_local_interpretation_shap(clf, X_test, pred, slider_idx):
 
 
 def show_local_interpretation(
-    X_test, y_test, clf, pred, target_labels, features, dim_model, dim_framework
+    X_test,
+    y_test,
+    clf,
+    fingerprint,
+    pred,
+    target_labels,
+    features,
+    dim_model,
+    dim_framework,
 ):
     """show the interpretation based on the selected framework"""
     n_data = X_test.shape[0]
@@ -228,7 +439,7 @@ def show_local_interpretation(
     )
 
     if dim_framework == "SHAP":
-        show_local_interpretation_shap(clf, X_test, pred, slider_idx)
+        show_local_interpretation_shap(clf, fingerprint, X_test, pred, slider_idx)
     elif dim_framework == "ELI5":
         show_local_interpretation_eli5(
             X_test, clf, pred, target_labels, features, dim_model, slider_idx
@@ -252,10 +463,37 @@ def show_perf_metrics(y_test, pred):
     st.sidebar.pyplot()
 
 
-def draw_pdp(clf, dataset, features, target_labels, dim_model):
+def plot_pdp(pdp_result, target_labels, ncol):
+    """plot centered partial dependence and ICE lines, one subplot per class"""
+    grid = pdp_result["grid"]
+    # centered at the first grid point, like pdpbox
+    average = pdp_result["average"] - pdp_result["average"][:1]
+    ice = pdp_result["ice"] - pdp_result["ice"][:1]
+    n_outputs = average.shape[1]
+    # binary classification: only the positive class
+    outputs = [1] if n_outputs == 2 else range(n_outputs)
+    ncol = min(ncol, len(outputs))
+    nrow = int(np.ceil(len(outputs) / ncol))
+    fig, axes = plt.subplots(
+        nrow, ncol, figsize=(12, 5 * nrow), squeeze=False, sharey=True
+    )
+    for ax, output in zip(axes.ravel(), outputs):
+        ax.plot(grid, ice[:, :, output], color="#66C2D7", alpha=0.2, linewidth=0.5)
+        ax.plot(grid, average[:, output], color="#1A4E5D", linewidth=2)
+        ax.axhline(0, color="#E75438", linestyle="--", linewidth=1)
+        ax.set_title(str(target_labels[output]) if output < len(target_labels) else "")
+        ax.set_xlabel(pdp_result["feature"])
+    for ax in axes.ravel()[len(outputs) :]:
+        ax.axis("off")
+    return fig
+
+
+def draw_pdp(clf, dataset, features, target_labels, dim_model, fingerprint):
     """draw pdpplot given a model, data, all the features and the selected feature to plot"""
 
     if dim_model != "XGBoost":
+        if st.checkbox("Precompute all features in the background"):
+            precompute_partial_dependence(clf, dataset, list(features), fingerprint)
         selected_col = st.selectbox("Select a feature", features)
         st.info(
             """**To read the chart:** The curves describe how a feature marginally varies with the likelihood of outcome. Each subplot belong to a class outcome.
@@ -263,15 +501,13 @@ def draw_pdp(clf, dataset, features, target_labels, dim_model):
         [Read more] ("https://christophm.github.io/interpretable-ml-book/pdp.html") """
         )
 
-        pdp_dist = pdp.pdp_isolate(
-            model=clf, dataset=dataset, model_features=features, feature=selected_col
-        )
+        # one batched prediction per grid, cached per model and feature
+        pdp_result = get_partial_dependence(clf, dataset, selected_col, fingerprint)
         if len(target_labels) <= 5:
             ncol = len(target_labels)
         else:
             ncol = 5
-        pdp.pdp_plot(pdp_dist, selected_col, ncols=ncol, figsize=(12, 5))
-        st.pyplot()
+        st.pyplot(plot_pdp(pdp_result, target_labels, ncol))
 
 
 def main():
@@ -283,49 +519,62 @@ def main():
     )
     uploaded_file = st.sidebar.file_uploader("Or upload a CSV file", type="csv")
 
-    df, X, y, features, target_labels = upload_data(uploaded_file, dim_data)
+    df, target_col = upload_data(uploaded_file, dim_data)
+
+    dim_model = st.sidebar.selectbox(
+        "Choose a model", ("XGBoost", "lightGBM", "randomforest")
+    )
+    booster_params = select_booster_params(dim_model)
+    onehot_params = select_onehot_params(booster_params)
 
     ################################################
     # process data
     ################################################
-
+    X, y, features, target_labels, categorical_features = encode_data(
+        df, target_col, booster_params["native_categorical"], **onehot_params
+    )
+    st.sidebar.caption(
+        "Features memory usage: "
+        + format_bytes(get_memory_usage(df.drop(columns=target_col)))
+        + " before encoding, "
+        + format_bytes(get_memory_usage(X))
+        + " after"
+    )
     X_train, X_test, y_train, y_test = splitdata(X, y)
 
     ################################################
     # apply model
     ################################################
-    dim_model = st.sidebar.selectbox(
-        "Choose a model", ("XGBoost", "lightGBM", "randomforest")
+    clf, fingerprint = fit_classifier(
+        dim_model, X_train, y_train, target_labels, categorical_features, booster_params
     )
-    if dim_model == "randomforest":
-        clf = RandomForestClassifier(n_estimators=500, random_state=0, n_jobs=-1)
-        clf.fit(X_train, y_train)
-    elif dim_model == "lightGBM":
-        if len(target_labels) > 2:
-            clf = lgb.LGBMClassifier(
-                class_weight="balanced", objective="multiclass", n_jobs=-1, verbose=-1
-            )
-        else:
-            clf = lgb.LGBMClassifier(objective="binary", n_jobs=-1, verbose=-1)
-        clf.fit(X_train, y_train)
-    elif dim_model == "XGBoost":
-        params = {
-            "max_depth": 5,
-            "silent": 1,
-            "random_state": 2,
-            "num_class": len(target_labels),
-        }
-        dmatrix = DMatrix(data=X_train, label=y_train)
-        clf = xgb.train(params=params, dtrain=dmatrix)
 
     ################################################
     # Predict
     ################################################
-    pred = make_pred(dim_model, X_test, clf)
+    pred = make_pred(
+        dim_model,
+        X_train,
+        y_train,
+        X_test,
+        clf,
+        fingerprint,
+        categorical_features,
+        booster_params,
+    )
 
     dim_framework = st.sidebar.radio(
         "Choose interpretation framework", ["SHAP", "ELI5"]
     )
+    importance_sample_size = int(
+        st.sidebar.number_input(
+            "Rows used for global interpretation",
+            min_value=100,
+            value=IMPORTANCE_SAMPLE_SIZE,
+            step=100,
+            help="Stratified sample of the training data",
+        )
+    )
 
     ################################################
     # Model output
@@ -353,9 +602,19 @@ def main():
     # This only works if removing newline from html
     # Refactor this once added more models
     if dim_framework == "SHAP":
-        show_global_interpretation_shap(X_train, clf)
+        show_global_interpretation_shap(
+            X_train, y_train, clf, fingerprint, importance_sample_size
+        )
     elif dim_framework == "ELI5":
-        show_global_interpretation_eli5(X_train, y_train, features, clf, dim_model)
+        show_global_interpretation_eli5(
+            X_train,
+            y_train,
+            features,
+            clf,
+            dim_model,
+            fingerprint,
+            importance_sample_size,
+        )
 
     if st.sidebar.button("About the app"):
         st.sidebar.markdown(
@@ -387,6 +646,7 @@ def main():
                 X_test,
                 y_test,
                 clf,
+                fingerprint,
                 pred,
                 target_labels,
                 features,
@@ -395,14 +655,22 @@ def main():
             )
     else:
         show_local_interpretation(
-            X_test, y_test, clf, pred, target_labels, features, dim_model, dim_framework
+            X_test,
+            y_test,
+            clf,
+            fingerprint,
+            pred,
+            target_labels,
+            features,
+            dim_model,
+            dim_framework,
         )
 
     ################################################
     # PDP plot
     ################################################
     if dim_model != "XGBoost" and st.checkbox("Show how features vary with outcome"):
-        draw_pdp(clf, X_train, features, target_labels, dim_model)
+        draw_pdp(clf, X_train, features, target_labels, dim_model, fingerprint)
 
 
 if __name__ == "__main__":
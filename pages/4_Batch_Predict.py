@@ -0,0 +1,74 @@
+######################################################
+#                Libraries and APIs
+######################################################
+
+import os
+import tempfile
+
+# Chunked, parallel scoring of large files
+from batch_predict import batch_predict, iter_chunks, format_stats, resolve_data_path, BATCH_CHUNK_SIZE, DATA_DIR
+
+# Web rendering API
+import streamlit as st
+
+
+######################################################
+#                   Configuration
+######################################################
+
+st.set_page_config(page_title='Batch Prediction', page_icon='📦', layout='wide')
+
+st.title('> Batch Prediction')
+st.caption('''Score a large CSV/Parquet file with a model downloaded from **Create Model**.
+The file is read from disk in chunks (it is never loaded in memory at once) and predictions are written as they are ready.
+Input and output paths are relative to the data folder of the server (`DATA_DIR`), other files can't be read or written.''')
+
+######################################################
+#                       Main
+######################################################
+
+model_file = st.sidebar.file_uploader('Model (.pkl)', type='pkl', help='Only load models from trusted sources')
+input_path = st.sidebar.text_input('Input file path', help=f'CSV or Parquet file in {DATA_DIR}')
+output_path = st.sidebar.text_input('Output file path', value='predictions.csv', help=f'.csv or .parquet, written in {DATA_DIR}')
+
+# Both paths are kept inside the data folder
+try:
+    input_path = resolve_data_path(input_path) if input_path else ''
+    output_path = resolve_data_path(output_path)
+except ValueError as error:
+    st.error(str(error))
+    st.stop()
+
+with st.sidebar.expander('Settings'):
+    chunksize = int(st.number_input('Rows per chunk', min_value=1000, value=BATCH_CHUNK_SIZE, step=1000))
+    workers = int(st.number_input('Worker processes', min_value=0, value=(os.cpu_count() or 1) - 1, step=1,
+                                help='0 predicts in the app process'))
+    proba = st.checkbox('Write class probabilities', value=True)
+    keep_columns = []
+    if input_path and os.path.isfile(input_path):
+        # Header only
+        columns = next(iter_chunks(input_path, chunksize=5)).columns
+        keep_columns = st.multiselect('Input columns copied to the output', options=list(columns))
+
+if st.sidebar.button('Run batch prediction'):
+    if model_file is None or not os.path.isfile(input_path):
+        st.error('Select a model and an existing input file')
+    else:
+        # Workers load the model from disk, once each
+        with tempfile.NamedTemporaryFile(suffix='.pkl', delete=False) as file:
+            file.write(model_file.getbuffer())
+            model_path = file.name
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        status = st.empty()
+        try:
+            # Workers are spawned: forking the threaded Streamlit server is unsafe
+            stats = batch_predict(model_path, input_path, output_path, chunksize=chunksize, workers=workers,
+                                proba=proba, keep_columns=keep_columns, start_method='spawn',
+                                progress=lambda n_rows: status.text(f'{n_rows:,} rows written'))
+        finally:
+            os.remove(model_path)
+        status.empty()
+        # Peak memory of the Streamlit process isn't this job's, it is only reported by the CLI
+        st.success(format_stats(stats, peak_memory=False))
+        st.markdown(f'**Predictions preview** (`{os.path.relpath(output_path, os.path.realpath(DATA_DIR))}`):')
+        st.dataframe(next(iter_chunks(output_path, chunksize=100)))
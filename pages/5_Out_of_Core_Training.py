@@ -0,0 +1,139 @@
+######################################################
+#                Libraries and APIs
+######################################################
+
+import pickle
+from datetime import datetime
+
+# Custom functions for this app
+# (out-of-core training jobs, estimator registry)
+from functions import *
+
+# Web rendering API
+import streamlit as st
+
+
+######################################################
+#                   Configuration
+######################################################
+
+st.set_page_config(page_title='Out-of-core Training', page_icon='🧱', layout='wide')
+
+if 'ooc_job' not in st.session_state:
+    st.session_state['ooc_job'] = None
+if 'ooc_result' not in st.session_state:
+    st.session_state['ooc_result'] = None
+
+st.title('> Out-of-core Training')
+st.caption(f'''Train on a CSV/Parquet file that doesn't fit in memory (uploads above {format_bytes(OUT_OF_CORE_THRESHOLD)}).
+The file is read from disk in chunks: scalers and encoders are fitted incrementally,
+then the estimator is trained with `partial_fit` over several epochs.
+Uploads are limited to 200MB and buffered in memory by Streamlit: for larger files use a file path in the data folder of the server (`DATA_DIR`).''')
+
+######################################################
+#                       Main
+######################################################
+
+# Data source
+with st.sidebar.expander('Select a file', expanded=True):
+    choice = st.radio('Options:', options=('Upload file', 'File path on the server'))
+    file_path = None
+    if choice == 'Upload file':
+        file_upload = st.file_uploader('Upload a csv/parquet file', type=['csv', 'parquet'])
+        if file_upload:
+            # Written to disk once, then read in chunks
+            file_path = save_upload_file(file_upload)
+            if file_upload.size < OUT_OF_CORE_THRESHOLD:
+                st.caption(f'{format_bytes(file_upload.size)}: this file fits in memory, Model Test can train on it too')
+    else:
+        file_path = st.text_input('Input file path', help=f'CSV or Parquet file in {DATA_DIR} on the server, '
+                                'read from disk without uploading it') or None
+        if file_path:
+            # Only files inside the data folder can be read
+            try:
+                file_path = resolve_data_path(file_path)
+            except ValueError as error:
+                st.error(str(error))
+                file_path = None
+        if file_path and not os.path.isfile(file_path):
+            st.error('File not found')
+            file_path = None
+
+if file_path is None:
+    st.stop()
+
+# Header and dtypes from the first rows only
+head = next(iter_chunks(file_path, chunksize=1000))
+if st.sidebar.checkbox('Dataframe preview'):
+    st.subheader('Dataframe preview')
+    st.dataframe(head.head(10))
+
+with st.sidebar.expander('Target and estimator'):
+    target_name = st.selectbox('Target', options=list(head.columns[::-1]))
+    learning_type = st.radio('Problem type', options=('Classification', 'Regression'))
+    estimator = st.selectbox('Estimator', options=list_estimators(learning_type, partial_fit=True))
+model_params = configure_estimator_params(get_estimator(estimator))
+
+with st.sidebar.expander('Preprocessing'):
+    if ESTIMATORS[estimator].get('non_negative'):
+        scaler = 'MinMaxScaler'
+        st.caption(f'{estimator} needs non-negative features: numbers are scaled with MinMaxScaler')
+    else:
+        scaler = st.radio('Scale transformer', options=('StandardScaler', 'MinMaxScaler', None))
+    encoder = st.radio('Encoder', options=('OneHotEncoder', 'OrdinalEncoder'))
+    fill_value = st.text_input('Missing categories fill value', value='unknow')
+    sparse_output = st.checkbox('Sparse output (CSR)', value=True, help='Keep one-hot encoded features sparse')
+
+with st.sidebar.expander('Training'):
+    training_options = {
+        'epochs' : st.slider('Epochs', min_value=1, max_value=50, value=OUT_OF_CORE_EPOCHS),
+        'chunksize' : int(st.number_input('Rows per chunk', min_value=1000, value=OUT_OF_CORE_CHUNK_SIZE, step=1000)),
+        'validation_fraction' : st.slider('Validation fraction', min_value=0.01, max_value=0.5,
+                                        value=OUT_OF_CORE_VALIDATION_FRACTION),
+        'validation_rows' : int(st.number_input('Max validation rows', min_value=100, value=OUT_OF_CORE_VALIDATION_ROWS,
+                                                step=1000, help='Held out rows kept in memory')),
+    }
+
+model = Pipeline([
+    ('pre_processing', IncrementalPreprocessor(scaler={'StandardScaler' : 'standard', 'MinMaxScaler' : 'minmax'}.get(scaler),
+                                            encoder='onehot' if encoder == 'OneHotEncoder' else 'ordinal',
+                                            fill_value=fill_value, sparse_output=sparse_output)),
+    ('estimator', make_estimator(estimator, model_params)),
+])
+
+# Button to fit model
+with st.sidebar.form(key='run_model'):
+    submitted = st.form_submit_button('Run model')
+    if submitted:
+        fingerprint = get_out_of_core_fingerprint(model, file_path, target_name, **training_options)
+        st.session_state['ooc_job'] = submit_out_of_core_job(model, file_path, target_name,
+                                                            fingerprint=fingerprint, **training_options)
+        st.session_state['ooc_result'] = None
+
+# Poll background training job, validation scores are shown while it runs
+if st.session_state['ooc_job']:
+    job = display_training_job(st.session_state['ooc_job'])
+    st.session_state['ooc_job'] = None
+    if job is None:
+        pass
+    elif job['status'] == 'done':
+        st.session_state['ooc_result'] = {'model' : job['model'], 'history' : job['history'], 'estimator' : estimator}
+        st.sidebar.success(f'Time to fit: {str(job["elapsed"]).split(".")[0]}')
+    elif job['status'] == 'cancelled':
+        st.sidebar.warning('Training cancelled')
+    else:
+        st.sidebar.error(f'Training failed: {job["error"]}')
+    if job is not None:
+        remove_training_job(job['id'])
+
+# Display results
+if st.session_state['ooc_result']:
+    result = st.session_state['ooc_result']
+    st.subheader(f'{result["estimator"]} Training')
+    if result['history']:
+        display_epoch_history(result['history'])
+    else:
+        st.caption('Model loaded from cache, it was already trained with these settings')
+    # Score files with the Batch Prediction page
+    st.download_button('Download model', data=pickle.dumps(result['model']),
+                    file_name=f'{result["estimator"]}_model_{datetime.now().strftime("%H_%M_%S")}.pkl')
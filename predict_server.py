@@ -0,0 +1,250 @@
+######################################################
+#                 Prediction Server
+######################################################
+# Local HTTP service scoring rows with a saved (pickled) pipeline, standard library only
+# Concurrent requests are micro-batched: rows received within max_latency are predicted
+# together, with one vectorized predict_proba call
+#
+# Usage: python predict_server.py model.pkl [--port 8000] [--max-latency-ms 5] [--max-batch-size 512]
+#   POST /predict   JSON ([{...}, ...], {"rows": [...]} or {"columns": [...], "data": [[...]]}) or CSV (text/csv)
+#   GET  /metrics   latency percentiles (p50/p99), throughput and batch counters
+#   GET  /health
+# Only load pickled models from trusted sources
+
+import io
+import sys
+import json
+import time
+import queue
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import Future
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import numpy as np
+import pandas as pd
+
+# Same model loading and prediction columns as batch prediction
+from batch_predict import load_model, predict_chunk
+
+# Maximum time a request waits for other requests to join its batch, in seconds
+SERVER_MAX_LATENCY = 0.005
+# Maximum number of rows predicted in one call
+SERVER_MAX_BATCH_SIZE = 512
+# Number of recent requests used for latency percentiles
+SERVER_LATENCY_WINDOW = 10_000
+
+# Latency and throughput counters, shared by the request threads
+class ServerStats:
+
+    def __init__(self, window=SERVER_LATENCY_WINDOW):
+
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=window)
+        self.start_time = time.perf_counter()
+        self.requests = 0
+        self.errors = 0
+        self.rows = 0
+        self.batches = 0
+        self.batch_rows = 0
+
+    def add_request(self, latency, n_rows):
+
+        with self.lock:
+            self.latencies.append(latency)
+            self.requests += 1
+            self.rows += n_rows
+
+    def add_error(self):
+
+        with self.lock:
+            self.errors += 1
+
+    def add_batch(self, n_rows):
+
+        with self.lock:
+            self.batches += 1
+            self.batch_rows += n_rows
+
+    def summary(self):
+
+        with self.lock:
+            latencies = np.array(self.latencies) * 1000
+            uptime = time.perf_counter() - self.start_time
+            return {
+                'requests' : self.requests,
+                'errors' : self.errors,
+                'rows' : self.rows,
+                'uptime_s' : uptime,
+                'requests_per_s' : self.requests / uptime,
+                'rows_per_s' : self.rows / uptime,
+                'latency_p50_ms' : float(np.percentile(latencies, 50)) if len(latencies) else None,
+                'latency_p99_ms' : float(np.percentile(latencies, 99)) if len(latencies) else None,
+                'batches' : self.batches,
+                'mean_batch_rows' : self.batch_rows / self.batches if self.batches else None,
+            }
+
+# Collect rows of concurrent requests and predict them in one call
+# Each request waits at most max_latency for other requests, then the batch is predicted
+class MicroBatcher:
+
+    def __init__(self, model, max_latency=SERVER_MAX_LATENCY, max_batch_size=SERVER_MAX_BATCH_SIZE, stats=None):
+
+        self.model = model
+        self.max_latency = max_latency
+        self.max_batch_size = max_batch_size
+        self.stats = stats
+        self.requests = queue.Queue()
+        self.thread = threading.Thread(target=self.run, name='micro-batcher', daemon=True)
+        self.thread.start()
+
+    # Called by request threads with rows from select_model_columns, blocks until the rows are predicted
+    def predict(self, rows):
+
+        future = Future()
+        self.requests.put((rows, future))
+        return future.result()
+
+    # Next batch of requests: the first waiting one, plus the ones arriving before its deadline
+    def next_batch(self):
+
+        rows, future = self.requests.get()
+        batch = [(rows, future)]
+        n_rows = len(rows)
+        deadline = time.perf_counter() + self.max_latency
+        while n_rows < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            try:
+                rows, future = self.requests.get(timeout=timeout) if timeout > 0 else self.requests.get_nowait()
+            except queue.Empty:
+                break
+            batch.append((rows, future))
+            n_rows += len(rows)
+        return batch
+
+    # Batching loop, in its own thread
+    def run(self):
+
+        while True:
+            batch = self.next_batch()
+            try:
+                predictions = predict_chunk(self.model, pd.concat([rows for rows, _ in batch], ignore_index=True))
+            except Exception:
+                # Predict requests one by one, so a bad request doesn't fail the others
+                for rows, future in batch:
+                    try:
+                        future.set_result(predict_chunk(self.model, rows.reset_index(drop=True)))
+                    except Exception as error:
+                        future.set_exception(error)
+                continue
+            if self.stats:
+                self.stats.add_batch(len(predictions))
+            start = 0
+            for rows, future in batch:
+                future.set_result(predictions.iloc[start:start + len(rows)])
+                start += len(rows)
+
+# Parse the body of a /predict request into a DataFrame
+def parse_rows(body, content_type):
+    if content_type.startswith('text/csv'):
+        return pd.read_csv(io.StringIO(body.decode()))
+    payload = json.loads(body)
+    if isinstance(payload, dict) and 'columns' in payload:
+        return pd.DataFrame(payload['data'], columns=payload['columns'])
+    if isinstance(payload, dict):
+        payload = payload.get('rows', [payload])
+    return pd.DataFrame(payload)
+
+# Columns the model was fitted on, in its order, checked per request before it is batched
+# (concatenating requests with different columns would fill the missing ones with NaN)
+def select_model_columns(rows, model):
+    if not hasattr(model, 'feature_names_in_'):
+        return rows
+    missing = [column for column in model.feature_names_in_ if column not in rows.columns]
+    if missing:
+        raise ValueError(f'Missing columns: {missing}')
+    return rows[list(model.feature_names_in_)]
+
+# HTTP endpoints, the batcher and stats are attributes of the server
+class PredictionHandler(BaseHTTPRequestHandler):
+
+    # Keep-alive connections
+    protocol_version = 'HTTP/1.1'
+
+    def send_json(self, status, data):
+
+        body = data.encode() if isinstance(data, str) else json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+
+        if self.path == '/health':
+            self.send_json(200, {'status' : 'ok'})
+        elif self.path == '/metrics':
+            self.send_json(200, self.server.stats.summary())
+        else:
+            self.send_json(404, {'error' : f'Unknown path: {self.path}'})
+
+    def do_POST(self):
+
+        if self.path != '/predict':
+            self.send_json(404, {'error' : f'Unknown path: {self.path}'})
+            return
+        start_time = time.perf_counter()
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        try:
+            rows = parse_rows(body, self.headers.get('Content-Type', 'application/json'))
+            rows = select_model_columns(rows, self.server.batcher.model)
+        except (ValueError, KeyError, TypeError) as error:
+            self.server.stats.add_error()
+            self.send_json(400, {'error' : f'Invalid rows: {error}'})
+            return
+        try:
+            predictions = self.server.batcher.predict(rows)
+        except Exception as error:
+            self.server.stats.add_error()
+            self.send_json(500, {'error' : f'{type(error).__name__}: {error}'})
+            return
+        self.send_json(200, predictions.to_json(orient='records'))
+        self.server.stats.add_request(time.perf_counter() - start_time, len(rows))
+
+    def log_message(self, format, *args):
+
+        # Access logs would dominate latency
+        pass
+
+# Create a server for a fitted model (not started), port 0 picks a free port
+def create_server(model, host='127.0.0.1', port=8000, max_latency=SERVER_MAX_LATENCY,
+                max_batch_size=SERVER_MAX_BATCH_SIZE):
+    server = ThreadingHTTPServer((host, port), PredictionHandler)
+    server.daemon_threads = True
+    server.stats = ServerStats()
+    server.batcher = MicroBatcher(model, max_latency, max_batch_size, server.stats)
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve predictions of a saved pipeline over HTTP')
+    parser.add_argument('model', help='pickled fitted model/pipeline (Create Model > Download model)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--max-latency-ms', type=float, default=SERVER_MAX_LATENCY * 1000,
+                        help='time a request waits for others to join its batch')
+    parser.add_argument('--max-batch-size', type=int, default=SERVER_MAX_BATCH_SIZE, help='rows per predict call')
+    args = parser.parse_args()
+
+    server = create_server(load_model(args.model), args.host, args.port,
+                        args.max_latency_ms / 1000, args.max_batch_size)
+    print(f'Serving {args.model} on http://{args.host}:{server.server_address[1]}', file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()